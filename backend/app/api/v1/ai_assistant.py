@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends
 from app.models import User, RepairOrder, Bill, Property, Complaint, RepairPrice
 from app.core.dependencies import get_current_user
+from app.services import rollup
+from tortoise.transactions import in_transaction
 from typing import Dict, Any
 
 router = APIRouter()
@@ -36,7 +38,7 @@ async def get_user_bills(current_user: User = Depends(get_current_user)):
                                  "停车费" if bill.fee_type.value == "parking" else "其他",
                     "amount": float(bill.amount),
                     "status": bill.status.value,
-                    "status_text": "未缴费" if bill.status.value == "unpaid" else "已缴费",
+                    "status_text": {"unpaid": "未缴费", "overdue": "已逾期"}.get(bill.status.value, "已缴费"),
                     "billing_period": bill.billing_period if hasattr(bill, 'billing_period') else None,
                     "due_date": bill.due_date.isoformat() if bill.due_date else None,
                     "paid_at": bill.paid_at.isoformat() if bill.paid_at else None
@@ -165,15 +167,20 @@ async def create_repair_order(
         order_number = f"WO{datetime.now().strftime('%Y%m%d%H%M%S')}{secrets.token_hex(3).upper()}"
         
         # 创建报修工单
-        repair = await RepairOrder.create(
-            order_number=order_number,
-            owner_id=current_user.id,
-            property_id=property_id,
-            description=description,
-            urgency_level=UrgencyLevel(urgency_level),
-            status=RepairStatus.PENDING,
-            images=[]
-        )
+        async with in_transaction() as conn:
+            repair = await RepairOrder.create(
+                order_number=order_number,
+                owner_id=current_user.id,
+                property_id=property_id,
+                description=description,
+                urgency_level=UrgencyLevel(urgency_level),
+                status=RepairStatus.PENDING,
+                images=[],
+                using_db=conn
+            )
+            await rollup.record_repairs(
+                after=[rollup.repair_snapshot(repair, property.building_id)], using_db=conn
+            )
         
         await repair.fetch_related('property', 'property__building')
         
@@ -308,6 +315,8 @@ async def create_complaint(
             status=ComplaintStatus.PENDING,
             images=[]
         )
+        from app.api.v1.complaint import complaint_stats_cache
+        complaint_stats_cache.invalidate()
         
         # WebSocket通知管理员
         from app.api.v1.websocket import notify_new_complaint
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, HTTPException
+from app.core.notify_bus import bus
+from app.core.ws_manager import manager, ROLE_CHAT
 from app.models import User, RepairOrder, RepairChatMessage
-from typing import Dict, Set, List
 import json
-from datetime import datetime
 
 # WebSocket路由器（不加前缀）
 ws_router = APIRouter()
@@ -10,8 +10,7 @@ ws_router = APIRouter()
 # HTTP API路由器（需要加前缀）
 router = APIRouter()
 
-# 存储聊天WebSocket连接：{repair_order_id: {user_id: websocket}}
-chat_connections: Dict[int, Dict[int, WebSocket]] = {}
+# 聊天连接由 ConnectionManager 按工单ID索引（每个连接有自己的发送队列）
 
 
 @ws_router.websocket("/ws/chat/{repair_order_id}")
@@ -24,6 +23,7 @@ async def chat_websocket(
     await websocket.accept()
     
     user_id = None
+    conn = None
     
     try:
         # 简单的token验证（实际应该用JWT）
@@ -64,24 +64,22 @@ async def chat_websocket(
             await websocket.close()
             return
         
-        # 添加连接到管理器
-        if repair_order_id not in chat_connections:
-            chat_connections[repair_order_id] = {}
-        chat_connections[repair_order_id][user_id] = websocket
-        
         # 发送连接成功消息
         await websocket.send_json({
             "type": "connected",
             "message": "聊天连接成功"
         })
         
+        # 添加连接到管理器，之后的消息都通过发送队列发出
+        conn = manager.connect(websocket, ROLE_CHAT, repair_order_id, user_id)
+        
         try:
             while True:
                 # 接收消息
                 data = await websocket.receive_text()
                 
                 if data == "ping":
-                    await websocket.send_text("pong")
+                    manager.enqueue(conn, "pong")
                     continue
                 
                 try:
@@ -115,30 +113,25 @@ async def chat_websocket(
                         "is_owner": user_id == repair_order.owner_id
                     }
                     
-                    # 广播消息给该工单的所有在线用户
-                    if repair_order_id in chat_connections:
-                        for uid, ws in chat_connections[repair_order_id].items():
-                            try:
-                                await ws.send_json(chat_message)
-                            except:
-                                # 如果发送失败，移除这个连接
-                                pass
+                    # 广播消息给该工单的所有在线用户（经总线到达各 worker，放入连接的发送队列）
+                    await bus.publish(ROLE_CHAT, repair_order_id, chat_message)
                     
                 except json.JSONDecodeError:
                     continue
                     
         except WebSocketDisconnect:
-            # 移除连接
-            if repair_order_id in chat_connections and user_id in chat_connections[repair_order_id]:
-                del chat_connections[repair_order_id][user_id]
-                if not chat_connections[repair_order_id]:
-                    del chat_connections[repair_order_id]
+            pass
                     
     except Exception as e:
         print(f"Chat WebSocket error: {e}")
-        if repair_order_id in chat_connections and user_id and user_id in chat_connections[repair_order_id]:
-            del chat_connections[repair_order_id][user_id]
-        await websocket.close()
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+    finally:
+        # 移除连接
+        if conn is not None:
+            manager.disconnect(conn)
 
 
 @router.get("/chat/history/{repair_order_id}")
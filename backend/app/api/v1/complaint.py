@@ -3,14 +3,20 @@
 """
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, date
+from tortoise.functions import Count
 from app.models import User, Complaint, ComplaintType, ComplaintStatus
 from app.core.dependencies import get_current_user, get_current_manager
+from app.core.cache import TTLCache
 from app.api.v1.websocket import notify_new_complaint, notify_complaint_update, notify_complaint_rated
-from pydantic import BaseModel
+from pydantic import BaseModel, computed_field
+from app.services.thumbnails import thumbnail_urls
 
 router = APIRouter()
 
+# 投诉统计缓存（按日期范围缓存，投诉写操作后整体失效）
+complaint_stats_cache = TTLCache(ttl=30, maxsize=64)
+
 
 # ==================== Schemas ====================
 
@@ -45,6 +51,12 @@ class ComplaintResponse(BaseModel):
     owner_name: str
     owner_id: int
     handler_name: Optional[str] = None
+    
+    # 列表卡片用的缩略图，与原图一一对应
+    @computed_field
+    @property
+    def image_thumbnails(self) -> List[str]:
+        return thumbnail_urls(self.images)
 
 
 class ComplaintListResponse(BaseModel):
@@ -68,6 +80,7 @@ async def create_complaint(
         contact_phone=current_user.phone,
         status=ComplaintStatus.PENDING
     )
+    complaint_stats_cache.invalidate()
     
     await complaint.fetch_related('owner', 'handler')
     
@@ -180,6 +193,7 @@ async def cancel_complaint(
         raise HTTPException(status_code=400, detail="只能撤销待处理的投诉")
     
     await complaint.delete()
+    complaint_stats_cache.invalidate()
     
     return {"message": "已撤销投诉"}
 
@@ -335,6 +349,7 @@ async def update_complaint(
         complaint.handler_id = update_data.handler_id
     
     await complaint.save()
+    complaint_stats_cache.invalidate()
     await complaint.fetch_related('owner', 'handler')
     
     result = {
@@ -362,27 +377,42 @@ async def update_complaint(
 
 @router.get("/manager/complaints/stats/summary")
 async def get_complaints_stats(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
     current_user: User = Depends(get_current_manager)
 ):
-    """获取投诉统计"""
-    total = await Complaint.all().count()
-    pending = await Complaint.filter(status=ComplaintStatus.PENDING).count()
-    processing = await Complaint.filter(status=ComplaintStatus.PROCESSING).count()
-    completed = await Complaint.filter(status=ComplaintStatus.COMPLETED).count()
-    
-    # 按类型统计
-    type_stats = {}
-    for complaint_type in ComplaintType:
-        count = await Complaint.filter(type=complaint_type).count()
-        type_stats[complaint_type.value] = count
+    """获取投诉统计（按 状态×类型 一次 GROUP BY，短时缓存）"""
+    cache_key = (start_date, end_date)
+    cached = complaint_stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
-    return {
-        "total": total,
-        "pending": pending,
-        "processing": processing,
-        "completed": completed,
+    query = Complaint.all()
+    if start_date:
+        query = query.filter(created_at__gte=start_date)
+    if end_date:
+        query = query.filter(created_at__lte=end_date)
+    
+    # 显式按分组列排序，覆盖模型默认的 -created_at 排序
+    rows = await query.annotate(count=Count("id")).group_by("status", "type").order_by(
+        "status", "type"
+    ).values("status", "type", "count")
+    
+    status_stats = {complaint_status.value: 0 for complaint_status in ComplaintStatus}
+    type_stats = {complaint_type.value: 0 for complaint_type in ComplaintType}
+    for row in rows:
+        status_stats[ComplaintStatus(row["status"]).value] += row["count"]
+        type_stats[ComplaintType(row["type"]).value] += row["count"]
+    
+    result = {
+        "total": sum(status_stats.values()),
+        "pending": status_stats[ComplaintStatus.PENDING.value],
+        "processing": status_stats[ComplaintStatus.PROCESSING.value],
+        "completed": status_stats[ComplaintStatus.COMPLETED.value],
         "by_type": type_stats
     }
+    complaint_stats_cache.set(cache_key, result)
+    return result
 
 
 @router.delete("/manager/complaints/{complaint_id}")
@@ -417,5 +447,6 @@ async def delete_complaint(
     
     # 删除投诉
     await complaint.delete()
+    complaint_stats_cache.invalidate()
     
     return {"message": "删除成功"}
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import APIRouter, HTTPException, Depends, Response, status, UploadFile, File
 from app.core.dependencies import get_current_maintenance, save_upload_file
+from app.core.pagination import paginate, set_next_cursor
 from app.models import User, RepairOrder, RepairStatus
 from app.schemas import RepairOrderWithDetails, MessageResponse
+from app.services import rollup
+from tortoise.transactions import in_transaction
 from typing import List, Optional
 from datetime import datetime
 from pydantic import BaseModel
@@ -69,12 +72,14 @@ async def update_profile(
 
 @router.get("/orders", response_model=List[RepairOrderWithDetails])
 async def get_my_orders(
+    response: Response,
     status: str = None,
     skip: int = 0,
     limit: int = 20,
+    cursor: str = None,
     current_user: User = Depends(get_current_maintenance)
 ):
-    """查看分配给自己的维修工单"""
+    """查看分配给自己的维修工单（传 cursor 走游标分页，下一页游标见响应头 X-Next-Cursor）"""
     query = RepairOrder.filter(maintenance_worker_id=current_user.id)
     
     if status and status != 'all':
@@ -85,9 +90,10 @@ async def get_my_orders(
         elif status == 'completed':
             query = query.filter(status=RepairStatus.COMPLETED)
     
-    orders = await query.order_by("-created_at").offset(skip).limit(limit).prefetch_related(
+    orders = await paginate(query, cursor, skip, limit).prefetch_related(
         "owner", "property", "property__building"
     )
+    set_next_cursor(response, orders, limit)
     
     result = []
     for order in orders:
@@ -183,9 +189,14 @@ async def start_repair(
     if order.status not in [RepairStatus.ASSIGNED, RepairStatus.PENDING]:
         raise HTTPException(status_code=400, detail="工单状态不允许开始维修")
     
+    before = rollup.repair_snapshot(order, order.property.building_id)
     order.status = RepairStatus.IN_PROGRESS
     order.started_at = datetime.now()
-    await order.save()
+    async with in_transaction() as conn:
+        await order.save(using_db=conn)
+        await rollup.record_repairs(
+            before=[before], after=[rollup.repair_snapshot(order, order.property.building_id)], using_db=conn
+        )
     
     # 通过WebSocket通知业主
     from app.api.v1.websocket import notify_repair_status_update, notify_manager_repair_update
@@ -235,6 +246,7 @@ async def complete_repair(
     if order.status != RepairStatus.IN_PROGRESS:
         raise HTTPException(status_code=400, detail="工单未在维修中")
     
+    before = rollup.repair_snapshot(order, order.property.building_id)
     order.completed_at = datetime.now()
     
     # 保存维修完成照片
@@ -255,7 +267,11 @@ async def complete_repair(
         order.status = RepairStatus.PENDING_EVALUATION  # ✅ 待评价
         print(f"✅ 免费维修，状态: 待评价")
     
-    await order.save()
+    async with in_transaction() as conn:
+        await order.save(using_db=conn)
+        await rollup.record_repairs(
+            before=[before], after=[rollup.repair_snapshot(order, order.property.building_id)], using_db=conn
+        )
     
     # 通过WebSocket通知业主
     from app.api.v1.websocket import notify_repair_status_update, notify_manager_repair_update
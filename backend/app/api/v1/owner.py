@@ -1,6 +1,13 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.responses import FileResponse, HTMLResponse
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, status
+from fastapi.responses import FileResponse, HTMLResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from app.core.dependencies import get_current_owner, get_current_owner_optional_token, generate_order_number
+from app.core.pagination import paginate, set_next_cursor
+from app.core.http_cache import (
+    make_etag, is_not_modified, validator_headers, not_modified_response,
+    content_disposition, iter_bytes
+)
+from app.core.render_pool import render_pool, RenderPoolBusy
 from app.core.security import verify_password, get_password_hash
 from pydantic import BaseModel
 from app.models import User, Property, Bill, RepairOrder, Building, BillStatus, RepairStatus
@@ -9,16 +16,22 @@ from app.schemas import (
     RepairOrderCreate, RepairOrderWithDetails, RepairEvaluation,
     ChatRequest, ChatResponse, MessageResponse
 )
+from tortoise.transactions import in_transaction
 from typing import List
 from datetime import datetime
-import hashlib
-import uuid
 import os
+import time
 import io
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
 from app.core.config import settings
+from app.services import rollup
+from app.core.storage import storage_response
+from app.services.invoice import (
+    ensure_verification_code, build_verify_url, build_invoice_data, invoice_digest, invoice_key,
+    get_cached_invoice, render_invoice_pdf, store_invoice
+)
+from app.services.invoice_page import (
+    verify_page_cache, render_not_found_page, render_verified_page, with_verified_at
+)
 #from reportlab.lib.pagesizes import letter
 #from reportlab.pdfgen import canvas
 #from reportlab.pdfbase import pdfmetrics
@@ -135,12 +148,14 @@ async def get_my_properties(current_user: User = Depends(get_current_owner)):
 
 @router.get("/bills", response_model=List[BillWithDetails])
 async def get_my_bills(
+    response: Response,
     status: str = None,
     skip: int = 0,
     limit: int = 20,
+    cursor: str = None,
     current_user: User = Depends(get_current_owner)
 ):
-    """获取个人缴费记录和账单"""
+    """获取个人缴费记录和账单（传 cursor 走游标分页，下一页游标见响应头 X-Next-Cursor）"""
     query = Bill.filter(owner_id=current_user.id)
     
     # ✅ 添加调试日志
@@ -151,7 +166,11 @@ async def get_my_bills(
         # 将字符串转换为BillStatus枚举
         try:
             bill_status = BillStatus(status)
-            query = query.filter(status=bill_status)
+            if bill_status == BillStatus.UNPAID:
+                # 逾期账单同样属于待缴费
+                query = query.filter(status__in=[BillStatus.UNPAID, BillStatus.OVERDUE])
+            else:
+                query = query.filter(status=bill_status)
             print(f"✅ 已过滤状态: {bill_status}")
         except ValueError:
             # 如果传入的status不合法，忽略过滤条件
@@ -160,7 +179,8 @@ async def get_my_bills(
     else:
         print("ℹ️ 未传status参数，返回全部账单")
     
-    bills = await query.order_by("-created_at").offset(skip).limit(limit).prefetch_related("property", "property__building")
+    bills = await paginate(query, cursor, skip, limit).prefetch_related("property", "property__building")
+    set_next_cursor(response, bills, limit)
     
     # ✅ 日志：显示查询结果
     print(f"✅ 查询到 {len(bills)} 条账单")
@@ -196,18 +216,24 @@ async def pay_bill(
     current_user: User = Depends(get_current_owner)
 ):
     """在线支付物业费用"""
-    bill = await Bill.get_or_none(id=bill_id, owner_id=current_user.id)
-    
-    if not bill:
-        raise HTTPException(status_code=404, detail="账单不存在")
-    
-    if bill.status == BillStatus.PAID:
-        raise HTTPException(status_code=400, detail="账单已支付")
-    
-    # 这里应该集成第三方支付，简化处理直接标记为已支付
-    bill.status = BillStatus.PAID
-    bill.paid_at = datetime.now()
-    await bill.save()
+    async with in_transaction() as conn:
+        # 加锁读取：与逾期扫描互斥，汇总按提交时的真实状态（未支付/逾期）计算
+        bill = await Bill.filter(id=bill_id, owner_id=current_user.id).select_for_update().using_db(conn).first()
+        
+        if not bill:
+            raise HTTPException(status_code=404, detail="账单不存在")
+        
+        if bill.status == BillStatus.PAID:
+            raise HTTPException(status_code=400, detail="账单已支付")
+        
+        building_id = await rollup.building_of(bill.property_id)
+        before = rollup.bill_snapshot(bill, building_id)
+        
+        # 这里应该集成第三方支付，简化处理直接标记为已支付
+        bill.status = BillStatus.PAID
+        bill.paid_at = datetime.now()
+        await bill.save(using_db=conn)
+        await rollup.record_bills(before=[before], after=[rollup.bill_snapshot(bill, building_id)], using_db=conn)
     
     return BillResponse(
         id=bill.id,
@@ -227,9 +253,10 @@ async def pay_bill(
 @router.get("/bills/{bill_id}/invoice")
 async def download_invoice(
     bill_id: int,
+    request: Request,
     current_user: User = Depends(get_current_owner_optional_token)
 ):
-    """下载个人缴费发票（PDF + 二维码）"""
+    """下载个人缴费发票（PDF + 二维码），内容未变化时返回 304"""
     bill = await Bill.get_or_none(id=bill_id, owner_id=current_user.id)
     if not bill:
         raise HTTPException(status_code=404, detail="账单不存在")
@@ -240,406 +267,78 @@ async def download_invoice(
         raise HTTPException(status_code=400, detail="账单未支付，无法下载发票")
     
     # 生成或获取验证码
-    if not bill.invoice_url:
-        verification_data = f"{bill.id}-{bill.paid_at.isoformat()}-{uuid.uuid4().hex[:8]}"
-        verification_code = hashlib.md5(verification_data.encode()).hexdigest()[:16]
-        bill.invoice_url = verification_code
-        await bill.save()
-    else:
-        verification_code = bill.invoice_url
-    
-    # 生成验证URL（使用配置的后端地址，支持局域网访问）
-    # 修改 .env 中的 BACKEND_HOST 可切换局域网IP（如：192.168.64.24:8088）
-    verify_url = f"http://{settings.BACKEND_HOST}/api/v1/owner/bills/verify/{verification_code}"
+    verification_code = await ensure_verification_code(bill)
+    verify_url = build_verify_url(verification_code)
+    
+    # ETag 由发票内容哈希得出，客户端已有同一版本时无需读盘或重新生成
+    data = build_invoice_data(bill, current_user, verification_code, verify_url)
+    digest = invoice_digest(data)
+    etag = make_etag(digest)
+    if is_not_modified(request, etag):
+        return not_modified_response(validator_headers(etag))
+    
+    filename = f"invoice_{bill.id}_{bill.billing_period.replace(' ', '_')}.pdf"
+    
+    # 命中缓存时直接复用；否则交给进程池生成，不阻塞事件循环
+    last_modified = await get_cached_invoice(bill.id, digest)
+    if last_modified is None:
+        pdf_bytes = await _render_invoice(render_invoice_pdf, data)
+    
+    if last_modified is None and settings.INVOICE_IN_MEMORY:
+        # 内存模式：PDF 在内存中生成后直接返回，响应发送完后再按配置回写缓存
+        headers = validator_headers(etag, time.time())
+        headers["Content-Disposition"] = content_disposition(filename)
+        headers["Content-Length"] = str(len(pdf_bytes))
+        background = None
+        if settings.INVOICE_CACHE_WRITE_THROUGH:
+            background = BackgroundTask(store_invoice, bill.id, digest, pdf_bytes)
+        return StreamingResponse(
+            iter_bytes(pdf_bytes),
+            media_type="application/pdf",
+            headers=headers,
+            background=background
+        )
+    if last_modified is None:
+        await store_invoice(bill.id, digest, pdf_bytes)
+        last_modified = time.time()
     
-    # 生成PDF发票
-    pdf_path = generate_invoice_pdf(bill, current_user, verification_code, verify_url)
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return not_modified_response(headers)
     
     # 返回PDF文件
-    return FileResponse(
-        pdf_path,
-        media_type="application/pdf",
-        filename=f"invoice_{bill.id}_{bill.billing_period.replace(' ', '_')}.pdf"
-    )
+    return await storage_response(invoice_key(bill.id, digest), "application/pdf", headers, filename=filename)
 
 
-def generate_invoice_pdf(bill, owner, verification_code, verify_url):
-    """生成PDF发票（带二维码）"""
-    # 延迟导入qrcode，避免模块初始化时报错
+async def _render_invoice(func, *args):
+    """在进程池中生成发票，繁忙或缺少依赖时转为对应的 HTTP 错误"""
     try:
-        import qrcode
-    except ImportError:
-        raise HTTPException(status_code=500, detail="qrcode库未安装，请运行: pip install qrcode[pil]")
-    
-    # 确保发票目录存在
-    invoice_dir = os.path.join(settings.UPLOAD_DIR, "invoices")
-    os.makedirs(invoice_dir, exist_ok=True)
-    
-    pdf_filename = f"invoice_{bill.id}.pdf"
-    pdf_path = os.path.join(invoice_dir, pdf_filename)
-    
-    # 生成二维码图片
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(verify_url)
-    qr.make(fit=True)
-    qr_img = qr.make_image(fill_color="black", back_color="white")
-    
-    # 保存二维码图片
-    qr_path = os.path.join(invoice_dir, f"qr_{bill.id}.png")
-    qr_img.save(qr_path)
-    
-    # 创建PDF
-    c = canvas.Canvas(pdf_path, pagesize=A4)
-    width, height = A4
-    
-    # 设置颜色
-    primary_color = (0.4, 0.49, 0.92)  # #667eea
-    
-    # 标题区域（渐变背景）
-    c.setFillColorRGB(*primary_color)
-    c.rect(0, height - 120*mm, width, 120*mm, fill=True, stroke=False)
-    
-    # 标题
-    c.setFillColorRGB(1, 1, 1)  # 白色
-    c.setFont("Helvetica-Bold", 32)
-    c.drawCentredString(width/2, height - 40*mm, "PAYMENT INVOICE")
-    
-    c.setFont("Helvetica", 18)
-    c.drawCentredString(width/2, height - 55*mm, "Payment Receipt")  # 使用英文替代
-    
-    # 发票编号
-    c.setFont("Helvetica-Bold", 14)
-    c.drawCentredString(width/2, height - 75*mm, f"Invoice No: INV-{bill.id:06d}")
-    
-    # 信息区域
-    y = height - 140*mm
-    x_left = 40*mm
-    x_right = width - 40*mm
-    
-    c.setFillColorRGB(0, 0, 0)
-    
-    # 左侧：业主信息
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(x_left, y, "Bill To:")
-    y -= 15
-    c.setFont("Helvetica", 10)
-    c.drawString(x_left, y, f"Name: {owner.name}")
-    y -= 12
-    c.drawString(x_left, y, f"Phone: {owner.phone}")
-    y -= 12
-    property_info = f"{bill.property.building.name} {bill.property.unit}-{bill.property.room_number}"
-    c.drawString(x_left, y, f"Property: {property_info}")
-    
-    # 右侧：物业信息
-    y = height - 140*mm
-    c.setFont("Helvetica-Bold", 12)
-    c.drawRightString(x_right, y, "Property Management:")
-    y -= 15
-    c.setFont("Helvetica", 10)
-    c.drawRightString(x_right, y, "XX Property Management Co.")
-    y -= 12
-    c.drawRightString(x_right, y, "Tel: 400-123-4567")
-    y -= 12
-    c.drawRightString(x_right, y, f"Date: {bill.paid_at.strftime('%Y-%m-%d')}")
-    
-    # 分隔线
-    y -= 20
-    c.setStrokeColorRGB(0.9, 0.9, 0.9)
-    c.line(x_left, y, x_right, y)
-    
-    # 账单详情表格
-    y -= 30
-    table_y = y
-    
-    # 表头
-    c.setFillColorRGB(0.95, 0.95, 0.95)
-    c.rect(x_left, table_y - 20, x_right - x_left, 20, fill=True, stroke=False)
-    
-    c.setFillColorRGB(0, 0, 0)
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(x_left + 5, table_y - 13, "Fee Type")
-    c.drawString(x_left + 80, table_y - 13, "Billing Period")
-    c.drawString(x_left + 160, table_y - 13, "Due Date")
-    c.drawString(x_left + 240, table_y - 13, "Amount (CNY)")
-    
-    # 表格数据
-    table_y -= 20
-    c.setFont("Helvetica", 10)
-    
-    fee_type_map = {
-        "property": "Property Fee",
-        "parking": "Parking Fee",
-        "water": "Water",
-        "electricity": "Electricity"
-    }
-    fee_type_text = fee_type_map.get(bill.fee_type.value, bill.fee_type.value)
-    
-    c.drawString(x_left + 5, table_y - 13, fee_type_text)
-    c.drawString(x_left + 80, table_y - 13, bill.billing_period)
-    c.drawString(x_left + 160, table_y - 13, str(bill.due_date))
-    c.drawString(x_left + 240, table_y - 13, f"CNY {float(bill.amount):.2f}")
-    
-    # 底部分隔线
-    table_y -= 20
-    c.setStrokeColorRGB(0.9, 0.9, 0.9)
-    c.line(x_left, table_y, x_right, table_y)
-    
-    # 总计
-    table_y -= 30
-    c.setFont("Helvetica-Bold", 14)
-    c.drawRightString(x_right - 120, table_y, "Total Amount:")
-    c.setFillColorRGB(*primary_color)
-    c.setFont("Helvetica-Bold", 20)
-    c.drawRightString(x_right, table_y, f"CNY {float(bill.amount):.2f}")
-    
-    # 二维码区域
-    qr_y = table_y - 100
-    
-    # 二维码标题
-    c.setFillColorRGB(0, 0, 0)
-    c.setFont("Helvetica-Bold", 12)
-    c.drawCentredString(width/2, qr_y + 20, "Scan QR Code to Verify Invoice")
-    
-    # 插入二维码图片
-    qr_size = 80
-    c.drawImage(qr_path, width/2 - qr_size/2, qr_y - qr_size - 20, qr_size, qr_size)
-    
-    # 验证码
-    c.setFont("Helvetica", 8)
-    c.setFillColorRGB(0.5, 0.5, 0.5)
-    c.drawCentredString(width/2, qr_y - qr_size - 35, f"Verification Code: {verification_code}")
-    
-    # 页脚
-    c.setFont("Helvetica", 8)
-    c.drawCentredString(width/2, 30, "Thank you for your payment!")
-    c.drawCentredString(width/2, 20, f"Generated at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    
-    # 保存PDF
-    c.save()
-    
-    # 删除临时二维码图片
-    try:
-        os.remove(qr_path)
-    except:
-        pass
-    
-    return pdf_path
+        return await render_pool.run(func, *args)
+    except RenderPoolBusy:
+        raise HTTPException(status_code=503, detail="发票生成繁忙，请稍后重试")
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/bills/verify/{verification_code}", response_class=HTMLResponse)
 async def verify_invoice(verification_code: str):
     """验证发票真伪（扫码后跳转的页面）"""
-    # 查找对应的账单
-    bill = await Bill.get_or_none(invoice_url=verification_code)
+    page = verify_page_cache.get(verification_code)
+    if page is None:
+        # 查找对应的账单（invoice_url 上有唯一索引）
+        bill = await Bill.get_or_none(invoice_url=verification_code).prefetch_related(
+            "owner", "property", "property__building"
+        )
+        if not bill:
+            # 发票不存在
+            page = render_not_found_page(verification_code)
+        else:
+            # 发票存在，显示验证结果
+            page = render_verified_page(bill)
+        verify_page_cache.set(verification_code, page)
     
-    if not bill:
-        # 发票不存在
-        html_content = f"""
-        <!DOCTYPE html>
-        <html lang="zh-CN">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>发票验证</title>
-            <style>
-                body {{
-                    font-family: "Microsoft YaHei", Arial, sans-serif;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    min-height: 100vh;
-                    display: flex;
-                    align-items: center;
-                    justify-content: center;
-                    padding: 20px;
-                }}
-                .result-card {{
-                    background: white;
-                    padding: 40px;
-                    border-radius: 12px;
-                    box-shadow: 0 10px 40px rgba(0,0,0,0.2);
-                    text-align: center;
-                    max-width: 500px;
-                }}
-                .icon {{
-                    font-size: 64px;
-                    margin-bottom: 20px;
-                }}
-                h1 {{
-                    color: #f56c6c;
-                    margin-bottom: 10px;
-                }}
-                p {{
-                    color: #666;
-                    line-height: 1.8;
-                }}
-                .code {{
-                    background: #f5f5f5;
-                    padding: 10px;
-                    border-radius: 4px;
-                    margin-top: 20px;
-                    color: #999;
-                    font-family: monospace;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="result-card">
-                <div class="icon">❌</div>
-                <h1>发票不存在</h1>
-                <p>抱歉，未找到对应的发票记录。</p>
-                <p>请检查验证码是否正确，或联系物业客服。</p>
-                <div class="code">验证码：{verification_code}</div>
-            </div>
-        </body>
-        </html>
-        """
-    else:
-        # 发票存在，显示验证结果
-        await bill.fetch_related("owner", "property", "property__building")
-        
-        fee_type_map = {
-            "property": "物业费",
-            "parking": "停车费",
-            "water": "水费",
-            "electricity": "电费"
-        }
-        fee_type_text = fee_type_map.get(bill.fee_type.value, bill.fee_type.value)
-        
-        html_content = f"""
-        <!DOCTYPE html>
-        <html lang="zh-CN">
-        <head>
-            <meta charset="UTF-8">
-            <meta name="viewport" content="width=device-width, initial-scale=1.0">
-            <title>发票验证结果</title>
-            <style>
-                body {{
-                    font-family: "Microsoft YaHei", Arial, sans-serif;
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    min-height: 100vh;
-                    padding: 20px;
-                }}
-                .result-card {{
-                    background: white;
-                    max-width: 600px;
-                    margin: 0 auto;
-                    border-radius: 12px;
-                    box-shadow: 0 10px 40px rgba(0,0,0,0.2);
-                    overflow: hidden;
-                }}
-                .header {{
-                    background: linear-gradient(135deg, #52c41a 0%, #73d13d 100%);
-                    color: white;
-                    padding: 30px;
-                    text-align: center;
-                }}
-                .icon {{
-                    font-size: 64px;
-                    margin-bottom: 10px;
-                }}
-                h1 {{
-                    font-size: 28px;
-                    margin: 0;
-                }}
-                .body {{
-                    padding: 30px;
-                }}
-                .info-row {{
-                    display: flex;
-                    justify-content: space-between;
-                    padding: 12px 0;
-                    border-bottom: 1px solid #f0f0f0;
-                }}
-                .info-row:last-child {{
-                    border-bottom: none;
-                }}
-                .label {{
-                    color: #999;
-                    font-size: 14px;
-                }}
-                .value {{
-                    color: #333;
-                    font-weight: 500;
-                    font-size: 14px;
-                }}
-                .amount-row {{
-                    background: #f5f5f5;
-                    padding: 20px;
-                    border-radius: 8px;
-                    margin: 20px 0;
-                    text-align: center;
-                }}
-                .amount {{
-                    font-size: 32px;
-                    color: #52c41a;
-                    font-weight: bold;
-                }}
-                .footer {{
-                    text-align: center;
-                    padding: 20px;
-                    background: #f9f9f9;
-                    color: #999;
-                    font-size: 12px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="result-card">
-                <div class="header">
-                    <div class="icon">✅</div>
-                    <h1>发票验证成功</h1>
-                    <p style="margin-top: 10px; opacity: 0.9;">该发票真实有效</p>
-                </div>
-                <div class="body">
-                    <div class="info-row">
-                        <span class="label">发票编号</span>
-                        <span class="value">INV-{bill.id:06d}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="label">业主姓名</span>
-                        <span class="value">{bill.owner.name}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="label">房产地址</span>
-                        <span class="value">{bill.property.building.name} {bill.property.unit}单元{bill.property.room_number}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="label">费用类型</span>
-                        <span class="value">{fee_type_text}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="label">账期</span>
-                        <span class="value">{bill.billing_period}</span>
-                    </div>
-                    <div class="info-row">
-                        <span class="label">支付时间</span>
-                        <span class="value">{bill.paid_at.strftime('%Y年%m月%d日 %H:%M')}</span>
-                    </div>
-                    
-                    <div class="amount-row">
-                        <div class="label">支付金额</div>
-                        <div class="amount">￥{float(bill.amount):.2f}</div>
-                    </div>
-                    
-                    <div class="info-row">
-                        <span class="label">验证码</span>
-                        <span class="value">{verification_code}</span>
-                    </div>
-                </div>
-                <div class="footer">
-                    <p>此发票由XX物业管理有限公司开具</p>
-                    <p style="margin-top: 5px;">验证时间：{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-    
-    return HTMLResponse(content=html_content)
+    return HTMLResponse(content=with_verified_at(page))
+
 
 @router.post("/repairs", response_model=RepairOrderWithDetails)
 async def create_repair_order(
@@ -653,15 +352,18 @@ async def create_repair_order(
         raise HTTPException(status_code=404, detail="房产不存在或不属于您")
     
     # 创建报修工单
-    order = await RepairOrder.create(
-        order_number=generate_order_number(),
-        owner_id=current_user.id,
-        property_id=order_data.property_id,
-        description=order_data.description,
-        images=order_data.images,
-        urgency_level=order_data.urgency_level,
-        status=RepairStatus.PENDING
-    )
+    async with in_transaction() as conn:
+        order = await RepairOrder.create(
+            order_number=generate_order_number(),
+            owner_id=current_user.id,
+            property_id=order_data.property_id,
+            description=order_data.description,
+            images=order_data.images,
+            urgency_level=order_data.urgency_level,
+            status=RepairStatus.PENDING,
+            using_db=conn
+        )
+        await rollup.record_repairs(after=[rollup.repair_snapshot(order, property_obj.building_id)], using_db=conn)
     
     await order.fetch_related("property", "property__building")
     
@@ -710,20 +412,23 @@ async def create_repair_order(
 
 @router.get("/repairs", response_model=List[RepairOrderWithDetails])
 async def get_my_repair_orders(
+    response: Response,
     status: str = None,
     skip: int = 0,
     limit: int = 20,
+    cursor: str = None,
     current_user: User = Depends(get_current_owner)
 ):
-    """查看报修进度和维修人员信息"""
+    """查看报修进度和维修人员信息（传 cursor 走游标分页，下一页游标见响应头 X-Next-Cursor）"""
     query = RepairOrder.filter(owner_id=current_user.id)
     
     if status:
         query = query.filter(status=status)
     
-    orders = await query.order_by("-created_at").offset(skip).limit(limit).prefetch_related(
+    orders = await paginate(query, cursor, skip, limit).prefetch_related(
         "property", "property__building", "maintenance_worker"
     )
+    set_next_cursor(response, orders, limit)
     
     result = []
     for order in orders:
@@ -834,10 +539,15 @@ async def evaluate_repair_order(
     if evaluation.rating < 1 or evaluation.rating > 5:
         raise HTTPException(status_code=400, detail="评分必须在1-5之间")
     
+    before = rollup.repair_snapshot(order, order.property.building_id)
     order.rating = evaluation.rating
     order.comment = evaluation.comment
     order.status = RepairStatus.FINISHED  # ✅ 评价后自动改为已完结
-    await order.save()
+    async with in_transaction() as conn:
+        await order.save(using_db=conn)
+        await rollup.record_repairs(
+            before=[before], after=[rollup.repair_snapshot(order, order.property.building_id)], using_db=conn
+        )
     
     print(f"✅ 业主 {current_user.name} 评价工单: {evaluation.rating}分，状态改为已完结")
     
@@ -890,11 +600,16 @@ async def pay_repair_cost(
     if order.cost_paid:
         raise HTTPException(status_code=400, detail="费用已支付")
     
+    building_id = await rollup.building_of(order.property_id)
+    before = rollup.repair_snapshot(order, building_id)
+    
     # ✅ 模拟支付成功（实际应该集成支付宝/微信支付）
     order.cost_paid = True
     order.paid_at = datetime.now()
     order.status = RepairStatus.PENDING_EVALUATION  # ✅ 支付后自动改为待评价
-    await order.save()
+    async with in_transaction() as conn:
+        await order.save(using_db=conn)
+        await rollup.record_repairs(before=[before], after=[rollup.repair_snapshot(order, building_id)], using_db=conn)
     
     print(f"✅ 业主 {current_user.name} 支付维修费用: ￥{order.repair_cost}，状态改为待评价")
     
@@ -1,9 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Response, status
+from fastapi.responses import StreamingResponse
 from app.core.dependencies import get_current_manager
+from app.core.pagination import paginate, set_next_cursor
 from app.core.security import get_password_hash
 from app.models import (
     User, Property, Bill, RepairOrder, Announcement, FeeStandard, Building, RepairPrice,
-    UserRole, BillStatus, RepairStatus
+    BillDailyRollup, RepairDailyRollup,
+    UserRole, BillStatus, RepairStatus, UrgencyLevel, FeeType
 )
 from app.schemas import (
     UserCreate, UserResponse, PropertyCreate, PropertyWithOwner,
@@ -12,19 +15,44 @@ from app.schemas import (
     RepairOrderWithDetails, RepairOrderUpdate,
     AnnouncementCreate, AnnouncementUpdate, AnnouncementWithPublisher,
     FeeStandardCreate, FeeStandardUpdate, FeeStandardResponse,
-    BuildingCreate, BuildingResponse,
-    RevenueStatistics, RepairStatistics, OwnerStatistics,
+    BuildingCreate, BuildingResponse, BuildingPreview, BuildingLayoutUnit, BuildingLayoutFloor,
+    RevenueStatistics, RevenueBreakdown, RepairStatistics, DurationPercentiles, OwnerStatistics,
     MessageResponse, OwnerCreate, MaintenanceCreate, OwnerUpdate, MaintenanceUpdate,
-    RepairPriceCreate, RepairPriceUpdate, RepairPriceResponse
+    RepairPriceCreate, RepairPriceUpdate, RepairPriceResponse,
+    BEIJING_TZ
 )
 from typing import List
-from datetime import datetime, date, timedelta
+from collections import deque
+import asyncio
+import math
+import time
+import zipfile
+from datetime import datetime, date, timedelta, timezone
 from decimal import Decimal
 from tortoise.functions import Count, Sum
 from tortoise.expressions import Q
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
+from app.core.config import settings
+from app.core.scheduler import scheduler
+from app.core.render_pool import render_pool
+from app.core.ws_manager import manager as ws_manager
+from app.core.notify_bus import bus as notify_bus
+from app.core.http_cache import content_disposition
+from app.services import rollup
+from app.services.invoice_page import verify_page_cache
+from app.services.invoice import (
+    ensure_verification_code, build_verify_url, build_invoice_data, invoice_digest, load_invoice_pdf
+)
 
 router = APIRouter()
 
+# 批量插入时每条 INSERT 的行数
+BILL_BULK_CHUNK_SIZE = 500
+PROPERTY_BULK_CHUNK_SIZE = 500
+# 批量导出发票时每次从数据库读取的账单数
+INVOICE_EXPORT_CHUNK_SIZE = 200
+
 
 # ============= 业主管理 =============
 @router.get("/owners", response_model=List[UserResponse])
@@ -143,16 +171,19 @@ async def delete_owner(
         )
     
     # 如果强制删除，先解绑所有房产、删除账单和报修工单
-    if force:
-        if property_count > 0:
-            await Property.filter(owner_id=owner_id).update(owner_id=None)
-        if bill_count > 0:
-            await Bill.filter(owner_id=owner_id).delete()
-        if repair_count > 0:
-            await RepairOrder.filter(owner_id=owner_id).delete()
-    
-    # 真删除
-    await owner.delete()
+    async with in_transaction() as conn:
+        if force:
+            if property_count > 0:
+                await Property.filter(owner_id=owner_id).using_db(conn).update(owner_id=None)
+            if bill_count > 0:
+                await rollup.record_bills_removed(Bill.filter(owner_id=owner_id), using_db=conn)
+                await Bill.filter(owner_id=owner_id).using_db(conn).delete()
+            if repair_count > 0:
+                await rollup.record_repairs_removed(RepairOrder.filter(owner_id=owner_id), using_db=conn)
+                await RepairOrder.filter(owner_id=owner_id).using_db(conn).delete()
+        
+        # 真删除
+        await owner.delete(using_db=conn)
     return MessageResponse(message="业主账户已删除")
 
 
@@ -196,33 +227,77 @@ async def get_buildings(
     return buildings
 
 
+def _generate_rooms(units: int, floors: int, rooms_per_floor: int):
+    """按 单元 -> 楼层 -> 房间 顺序生成 (单元号, 楼层, 房间号)"""
+    for unit in range(1, units + 1):
+        for floor in range(1, floors + 1):
+            for room in range(1, rooms_per_floor + 1):
+                yield str(unit), floor, f"{floor * 100 + room}"
+
+
+def _validate_building(building_data: BuildingCreate):
+    if min(building_data.units, building_data.floors, building_data.rooms_per_floor) < 1:
+        raise HTTPException(status_code=400, detail="单元数、楼层数、每层房间数必须大于0")
+
+
+@router.post("/buildings/preview", response_model=BuildingPreview)
+async def preview_building(
+    building_data: BuildingCreate,
+    current_user: User = Depends(get_current_manager)
+):
+    """预览楼栋将生成的房间布局（不写库）"""
+    _validate_building(building_data)
+    
+    layout = {}
+    for unit, floor, room_number in _generate_rooms(
+        building_data.units, building_data.floors, building_data.rooms_per_floor
+    ):
+        layout.setdefault(unit, {}).setdefault(floor, []).append(room_number)
+    
+    return BuildingPreview(
+        **building_data.model_dump(),
+        total_properties=building_data.units * building_data.floors * building_data.rooms_per_floor,
+        layout=[
+            BuildingLayoutUnit(
+                unit=unit,
+                floors=[BuildingLayoutFloor(floor=floor, rooms=rooms) for floor, rooms in floors.items()]
+            )
+            for unit, floors in layout.items()
+        ]
+    )
+
+
 @router.post("/buildings", response_model=BuildingResponse)
 async def create_building(
     building_data: BuildingCreate,
     current_user: User = Depends(get_current_manager)
 ):
-    """创建楼栋并自动生成房产"""
-    # 创建楼栋
-    building = await Building.create(**building_data.model_dump())
+    """创建楼栋并自动生成房产（单事务，房产分块批量插入）"""
+    _validate_building(building_data)
     
-    # 自动生成房产
-    properties_created = 0
     try:
-        for unit in range(1, building.units + 1):
-            for floor in range(1, building.floors + 1):
-                for room in range(1, building.rooms_per_floor + 1):
-                    room_number = f"{floor * 100 + room}"
-                    await Property.create(
-                        building=building,
-                        unit=str(unit),
-                        floor=floor,
-                        room_number=room_number,
-                        area=None,
-                        owner=None
-                    )
-                    properties_created += 1
-        print(f"[创建楼栋] 成功生成 {properties_created} 套房产")
+        async with in_transaction() as conn:
+            # 创建楼栋
+            building = await Building.create(**building_data.model_dump(), using_db=conn)
+            
+            # 在内存中生成全部房产后批量写入
+            properties = [
+                Property(
+                    building_id=building.id,
+                    unit=unit,
+                    floor=floor,
+                    room_number=room_number,
+                    area=None,
+                    owner_id=None
+                )
+                for unit, floor, room_number in _generate_rooms(
+                    building.units, building.floors, building.rooms_per_floor
+                )
+            ]
+            await Property.bulk_create(properties, batch_size=PROPERTY_BULK_CHUNK_SIZE, using_db=conn)
+        print(f"[创建楼栋] 成功生成 {len(properties)} 套房产")
     except Exception as e:
+        # 事务已回滚，不会留下只生成了一半房产的楼栋
         print(f"[创建楼栋] 生成房产失败: {e}")
         raise HTTPException(status_code=500, detail=f"生成房产失败: {str(e)}")
     
@@ -431,7 +506,12 @@ async def create_bill(
     if not property_obj:
         raise HTTPException(status_code=404, detail="房产不存在或不属于该业主")
     
-    bill = await Bill.create(**bill_data.model_dump())
+    try:
+        async with in_transaction() as conn:
+            bill = await Bill.create(**bill_data.model_dump(), using_db=conn)
+            await rollup.record_bills(after=[rollup.bill_snapshot(bill, property_obj.building_id)], using_db=conn)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="该房产此账期的同类账单已存在")
     
     return BillResponse(
         id=bill.id,
@@ -453,7 +533,9 @@ async def create_bills_batch(
     request: BillBatchCreateRequest,
     current_user: User = Depends(get_current_manager)
 ):
-    """批量生成账单（按收费标准）"""
+    """批量生成账单（按收费标准，单事务分块批量插入）"""
+    started = time.perf_counter()
+    
     # 获取收费标准
     standard = await FeeStandard.get_or_none(fee_type=request.fee_type, is_active=True)
     if not standard:
@@ -466,46 +548,61 @@ async def create_bills_batch(
     if request.owner_ids:
         query = query.filter(owner_id__in=request.owner_ids)
     
-    properties = await query.prefetch_related("owner")
+    properties = await query.values_list("id", "owner_id", "building_id", "area")
     
-    created_count = 0
-    skipped_count = 0
+    # 一次查出该账期已存在账单的房产
+    existing_property_ids = set(await Bill.filter(
+        fee_type=request.fee_type,
+        billing_period=request.billing_period
+    ).values_list("property_id", flat=True))
     
-    for property_obj in properties:
+    new_bills = []
+    building_ids = []
+    skipped_no_area = 0
+    skipped_existing = 0
+    
+    for property_id, owner_id, building_id, area in properties:
         # 跳过没有面积的房产
-        if property_obj.area is None:
-            skipped_count += 1
+        if area is None:
+            skipped_no_area += 1
             continue
         
-        # 计算金额（根据面积）
-        amount = property_obj.area * standard.unit_price
+        # 跳过已存在相同账期账单的房产
+        if property_id in existing_property_ids:
+            skipped_existing += 1
+            continue
         
-        # 检查是否已存在相同账期的账单
-        existing_bill = await Bill.get_or_none(
-            owner_id=property_obj.owner_id,
-            property_id=property_obj.id,
+        new_bills.append(Bill(
+            owner_id=owner_id,
+            property_id=property_id,
             fee_type=request.fee_type,
-            billing_period=request.billing_period
-        )
-        
-        if not existing_bill:
-            await Bill.create(
-                owner_id=property_obj.owner_id,
-                property_id=property_obj.id,
-                fee_type=request.fee_type,
-                amount=amount,
-                billing_period=request.billing_period,
-                due_date=request.due_date
-            )
-            created_count += 1
-        else:
-            skipped_count += 1
+            amount=area * standard.unit_price,  # 计算金额（根据面积）
+            billing_period=request.billing_period,
+            due_date=request.due_date
+        ))
+        building_ids.append(building_id)
+    
+    try:
+        async with in_transaction() as conn:
+            await Bill.bulk_create(new_bills, batch_size=BILL_BULK_CHUNK_SIZE, using_db=conn)
+            await rollup.record_bills(after=[
+                rollup.bill_snapshot(bill, building_id) for bill, building_id in zip(new_bills, building_ids)
+            ], using_db=conn)
+    except IntegrityError:
+        # 唯一约束冲突：同一账期正在被并发生成，整批已回滚
+        raise HTTPException(status_code=409, detail="该账期账单已被其他操作生成，请刷新后重试")
+    
+    created_count = len(new_bills)
+    skipped_count = skipped_no_area + skipped_existing
     
     return {
         "message": f"成功生成 {created_count} 条账单",
         "created": created_count,
         "skipped": skipped_count,
-        "total": created_count + skipped_count
+        "skipped_no_area": skipped_no_area,
+        "skipped_existing": skipped_existing,
+        "total": created_count + skipped_count,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
     }
 
 
@@ -520,42 +617,67 @@ async def create_bills_for_owner(
     if not owner:
         raise HTTPException(status_code=404, detail="业主不存在")
     
-    created_count = 0
+    property_ids = {bill_data.property_id for bill_data in request.bills}
+    
+    # 一次查询验证所有房产存在且属于该业主
+    owned_properties = dict(await Property.filter(
+        id__in=property_ids,
+        owner_id=request.owner_id
+    ).values_list("id", "building_id"))
+    
+    # 一次查询取出这些房产在请求账期内已有的 (房产, 费用类型, 账期)
+    existing_keys = {
+        (property_id, FeeType(fee_type).value, billing_period)
+        for property_id, fee_type, billing_period in await Bill.filter(
+            property_id__in=property_ids,
+            billing_period__in={bill_data.billing_period for bill_data in request.bills}
+        ).values_list("property_id", "fee_type", "billing_period")
+    }
+    
     errors = []
+    new_bills = []
+    building_ids = []
     
     for bill_data in request.bills:
         # 验证房产存在且属于该业主
-        property_obj = await Property.get_or_none(
-            id=bill_data.property_id, 
-            owner_id=request.owner_id
-        )
-        if not property_obj:
+        if bill_data.property_id not in owned_properties:
             errors.append(f"房产ID {bill_data.property_id} 不存在或不属于该业主")
             continue
         
-        # 检查是否已存在
-        existing_bill = await Bill.get_or_none(
-            owner_id=request.owner_id,
-            property_id=bill_data.property_id,
-            fee_type=bill_data.fee_type,
-            billing_period=bill_data.billing_period
-        )
+        try:
+            fee_type = FeeType(bill_data.fee_type).value
+        except ValueError:
+            errors.append(f"房产ID {bill_data.property_id} 的费用类型 {bill_data.fee_type} 无效")
+            continue
         
-        if existing_bill:
+        # 检查是否已存在（含本次请求中的重复行）
+        key = (bill_data.property_id, fee_type, bill_data.billing_period)
+        if key in existing_keys:
             errors.append(f"房产ID {bill_data.property_id} 的 {bill_data.fee_type} 账单已存在")
             continue
+        existing_keys.add(key)
         
-        # 创建账单
-        await Bill.create(
+        new_bills.append(Bill(
             owner_id=request.owner_id,
             property_id=bill_data.property_id,
-            fee_type=bill_data.fee_type,
+            fee_type=fee_type,
             amount=bill_data.amount,
             billing_period=bill_data.billing_period,
             due_date=bill_data.due_date
-        )
-        created_count += 1
+        ))
+        building_ids.append(owned_properties[bill_data.property_id])
     
+    # 所有有效账单一次批量插入
+    try:
+        async with in_transaction() as conn:
+            await Bill.bulk_create(new_bills, batch_size=BILL_BULK_CHUNK_SIZE, using_db=conn)
+            await rollup.record_bills(after=[
+                rollup.bill_snapshot(bill, building_id) for bill, building_id in zip(new_bills, building_ids)
+            ], using_db=conn)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="部分账单已被其他操作生成，请刷新后重试")
+    
+    created_count = len(new_bills)
     result = {
         "message": f"成功创建 {created_count} 条账单",
         "created": created_count,
@@ -570,15 +692,17 @@ async def create_bills_for_owner(
 
 @router.get("/bills", response_model=List[BillWithDetails])
 async def get_all_bills(
+    response: Response,
     status: str = None,
     fee_type: str = None,
     building_id: int = None,
     property_id: int = None,
     skip: int = 0,
     limit: int = 50,
+    cursor: str = None,
     current_user: User = Depends(get_current_manager)
 ):
-    """查看所有账单"""
+    """查看所有账单（传 cursor 走游标分页，下一页游标见响应头 X-Next-Cursor）"""
     query = Bill.all()
     
     if status:
@@ -595,9 +719,10 @@ async def get_all_bills(
     if property_id:
         query = query.filter(property_id=property_id)
     
-    bills = await query.order_by("-created_at").offset(skip).limit(limit).prefetch_related(
+    bills = await paginate(query, cursor, skip, limit).prefetch_related(
         "owner", "property", "property__building"
     )
+    set_next_cursor(response, bills, limit)
     
     result = []
     for bill in bills:
@@ -621,6 +746,140 @@ async def get_all_bills(
     return result
 
 
+@router.get("/bills/invoices/export")
+async def export_invoices(
+    billing_period: str = None,
+    building_id: int = None,
+    fee_type: str = None,
+    current_user: User = Depends(get_current_manager)
+):
+    """批量导出已支付账单的发票（ZIP，边生成边返回）"""
+    if not (billing_period or building_id or fee_type):
+        raise HTTPException(status_code=400, detail="请至少指定账期、楼栋或费用类型")
+    
+    query = Bill.filter(status=BillStatus.PAID)
+    if billing_period:
+        query = query.filter(billing_period=billing_period)
+    if building_id:
+        query = query.filter(property__building_id=building_id)
+    if fee_type:
+        query = query.filter(fee_type=fee_type)
+    
+    total = await query.count()
+    if not total:
+        raise HTTPException(status_code=404, detail="没有符合条件的已支付账单")
+    
+    name_parts = [part for part in (billing_period, fee_type) if part]
+    if building_id:
+        name_parts.append(f"building{building_id}")
+    filename = f"invoices_{'_'.join(name_parts)}.zip".replace(" ", "_").replace("/", "-")
+    
+    return StreamingResponse(
+        _stream_invoice_zip(query),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": content_disposition(filename),
+            "X-Total-Count": str(total)
+        }
+    )
+
+
+class _ZipChunkWriter:
+    """只追加的 ZIP 输出：zipfile 写入的数据暂存在这里，每写完一个文件就取走发送"""
+    
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+    
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def flush(self):
+        pass
+    
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _iter_paid_bills(query):
+    """按 id 分批读取账单，避免一次加载全部数据"""
+    last_id = 0
+    while True:
+        bills = await query.filter(id__gt=last_id).order_by("id").limit(INVOICE_EXPORT_CHUNK_SIZE).prefetch_related(
+            "owner", "property", "property__building"
+        )
+        if not bills:
+            return
+        for bill in bills:
+            yield bill
+        last_id = bills[-1].id
+
+
+async def _render_export_entry(bill):
+    """生成单张发票，返回 (ZIP 内文件名, PDF 内容)"""
+    verification_code = await ensure_verification_code(bill)
+    data = build_invoice_data(bill, bill.owner, verification_code, build_verify_url(verification_code))
+    pdf_bytes = await load_invoice_pdf(data, invoice_digest(data))
+    
+    prop = bill.property
+    # 按楼栋分目录；名称中的路径分隔符替换掉，避免产生多余的目录层级
+    folder = prop.building.name.replace("/", "-").replace("\\", "-")
+    filename = (
+        f"{bill.billing_period}_{prop.unit}-{prop.room_number}_{bill.fee_type.value}_INV-{bill.id:06d}.pdf"
+    ).replace("/", "-").replace("\\", "-")
+    return f"{folder}/{filename}", pdf_bytes
+
+
+async def _stream_invoice_zip(query):
+    """并行生成发票并按顺序写入 ZIP；同时在途的发票数有上限，内存占用与导出数量无关"""
+    writer = _ZipChunkWriter()
+    # 比进程数多一倍，保证进程池始终有活干
+    window = max(render_pool.max_workers, 1) * 2
+    pending = deque()
+    errors = []
+    
+    async def write_next(zf):
+        bill, task = pending.popleft()
+        try:
+            name, pdf_bytes = await task
+        except Exception as e:
+            errors.append(f"INV-{bill.id:06d} ({bill.billing_period}): {e}")
+            return
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        # PDF 本身已压缩，直接存储，避免在事件循环中做压缩计算
+        info.compress_type = zipfile.ZIP_STORED
+        zf.writestr(info, pdf_bytes)
+    
+    try:
+        with zipfile.ZipFile(writer, "w") as zf:
+            async for bill in _iter_paid_bills(query):
+                pending.append((bill, asyncio.create_task(_render_export_entry(bill))))
+                if len(pending) >= window:
+                    await write_next(zf)
+                    yield writer.pop()
+            
+            while pending:
+                await write_next(zf)
+                yield writer.pop()
+            
+            if errors:
+                print(f"[Invoice] 批量导出有 {len(errors)} 张发票生成失败")
+                zf.writestr("errors.txt", "\n".join(errors))
+        # 关闭时写入 ZIP 目录
+        yield writer.pop()
+    finally:
+        # 客户端中途断开时取消还未完成的生成任务
+        for _, task in pending:
+            task.cancel()
+
+
 @router.put("/bills/{bill_id}", response_model=BillResponse)
 async def update_bill(
     bill_id: int,
@@ -629,22 +888,34 @@ async def update_bill(
     due_date: date = None,
     current_user: User = Depends(get_current_manager)
 ):
-    """修改账单（仅允许修改未支付的账单）"""
-    bill = await Bill.get_or_none(id=bill_id)
-    if not bill:
-        raise HTTPException(status_code=404, detail="账单不存在")
-    
-    if bill.status != BillStatus.UNPAID:
-        raise HTTPException(status_code=400, detail="只能修改未支付的账单")
-    
-    if amount is not None:
-        bill.amount = amount
-    if billing_period is not None:
-        bill.billing_period = billing_period
-    if due_date is not None:
-        bill.due_date = due_date
-    
-    await bill.save()
+    """修改账单（仅允许修改未支付/逾期的账单）"""
+    try:
+        async with in_transaction() as conn:
+            # 加锁读取：与逾期扫描、业主支付互斥，汇总按提交时的真实状态计算
+            bill = await Bill.filter(id=bill_id).select_for_update().using_db(conn).first()
+            if not bill:
+                raise HTTPException(status_code=404, detail="账单不存在")
+            
+            if bill.status not in (BillStatus.UNPAID, BillStatus.OVERDUE):
+                raise HTTPException(status_code=400, detail="只能修改未支付的账单")
+            
+            building_id = await rollup.building_of(bill.property_id)
+            before = rollup.bill_snapshot(bill, building_id)
+            
+            if amount is not None:
+                bill.amount = amount
+            if billing_period is not None:
+                bill.billing_period = billing_period
+            if due_date is not None:
+                bill.due_date = due_date
+                # 截止日期延后到今天及以后，逾期账单恢复为未支付
+                if bill.status == BillStatus.OVERDUE and due_date >= date.today():
+                    bill.status = BillStatus.UNPAID
+            
+            await bill.save(using_db=conn)
+            await rollup.record_bills(before=[before], after=[rollup.bill_snapshot(bill, building_id)], using_db=conn)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="该房产此账期的同类账单已存在")
     
     return BillResponse(
         id=bill.id,
@@ -672,20 +943,27 @@ async def delete_bill(
         raise HTTPException(status_code=404, detail="账单不存在")
     
     # ✅ 移除限制：允许删除已支付的账单
-    await bill.delete()
+    before = rollup.bill_snapshot(bill, await rollup.building_of(bill.property_id))
+    async with in_transaction() as conn:
+        await bill.delete(using_db=conn)
+        await rollup.record_bills(before=[before], using_db=conn)
+    if bill.invoice_url:
+        verify_page_cache.invalidate(bill.invoice_url)
     return MessageResponse(message="账单已删除")
 
 
 # ============= 报修管理 =============
 @router.get("/repairs", response_model=List[RepairOrderWithDetails])
 async def get_all_repair_orders(
+    response: Response,
     status: str = None,
     urgency_level: str = None,
     skip: int = 0,
     limit: int = 50,
+    cursor: str = None,
     current_user: User = Depends(get_current_manager)
 ):
-    """查看所有报修工单"""
+    """查看所有报修工单（传 cursor 走游标分页，下一页游标见响应头 X-Next-Cursor）"""
     query = RepairOrder.all()
     
     if status:
@@ -694,9 +972,10 @@ async def get_all_repair_orders(
     if urgency_level:
         query = query.filter(urgency_level=urgency_level)
     
-    orders = await query.order_by("-created_at").offset(skip).limit(limit).prefetch_related(
+    orders = await paginate(query, cursor, skip, limit).prefetch_related(
         "owner", "property", "property__building", "maintenance_worker"
     )
+    set_next_cursor(response, orders, limit)
     
     result = []
     for order in orders:
@@ -750,10 +1029,15 @@ async def assign_repair_order(
     if not worker:
         raise HTTPException(status_code=404, detail="维修人员不存在")
     
+    before = rollup.repair_snapshot(order, order.property.building_id)
     order.maintenance_worker_id = maintenance_worker_id
     order.status = RepairStatus.ASSIGNED
     order.assigned_at = datetime.now()
-    await order.save()
+    async with in_transaction() as conn:
+        await order.save(using_db=conn)
+        await rollup.record_repairs(
+            before=[before], after=[rollup.repair_snapshot(order, order.property.building_id)], using_db=conn
+        )
     
     # 通过WebSocket通知维修人员
     from app.api.v1.websocket import notify_new_workorder, notify_repair_status_update
@@ -808,7 +1092,10 @@ async def delete_repair_order(
     maintenance_worker_id = order.maintenance_worker_id
     
     # 删除工单
-    await order.delete()
+    before = rollup.repair_snapshot(order, order.property.building_id)
+    async with in_transaction() as conn:
+        await order.delete(using_db=conn)
+        await rollup.record_repairs(before=[before], using_db=conn)
     
     # 通过WebSocket通知业主（工单被拒绝）
     from app.api.v1.websocket import notify_repair_status_update, notify_repair_deleted
@@ -845,6 +1132,9 @@ async def update_repair_order_status(
     if not order:
         raise HTTPException(status_code=404, detail="工单不存在")
     
+    building_id = await rollup.building_of(order.property_id)
+    before = rollup.repair_snapshot(order, building_id)
+    
     if update_data.status:
         order.status = update_data.status
     
@@ -855,7 +1145,9 @@ async def update_repair_order_status(
         order.maintenance_worker_id = update_data.maintenance_worker_id
         order.assigned_at = datetime.now()
     
-    await order.save()
+    async with in_transaction() as conn:
+        await order.save(using_db=conn)
+        await rollup.record_repairs(before=[before], after=[rollup.repair_snapshot(order, building_id)], using_db=conn)
     return MessageResponse(message="工单已更新")
 
 
@@ -933,14 +1225,20 @@ async def delete_maintenance_worker(
         )
     
     # 如果强制删除，解绑所有关联工单
-    if force and repair_count > 0:
-        await RepairOrder.filter(maintenance_worker_id=worker_id).update(
-            maintenance_worker_id=None,
-            status=RepairStatus.PENDING  # 重置为待分配状态
-        )
-    
-    # 真删除
-    await worker.delete()
+    async with in_transaction() as conn:
+        if force and repair_count > 0:
+            order_ids = await RepairOrder.filter(maintenance_worker_id=worker_id).using_db(conn).values_list(
+                "id", flat=True
+            )
+            await rollup.record_repairs_removed(RepairOrder.filter(id__in=order_ids), using_db=conn)
+            await RepairOrder.filter(id__in=order_ids).using_db(conn).update(
+                maintenance_worker_id=None,
+                status=RepairStatus.PENDING  # 重置为待分配状态
+            )
+            await rollup.record_repairs_added(RepairOrder.filter(id__in=order_ids), using_db=conn)
+        
+        # 真删除
+        await worker.delete(using_db=conn)
     return MessageResponse(message="维修人员已删除")
 
 
@@ -1043,36 +1341,203 @@ async def delete_announcement(
 
 
 # ============= 数据统计 =============
+# 收入统计可选的分组维度 -> 分组字段（账单表 / 日汇总表）
+REVENUE_GROUP_FIELDS = {
+    "fee_type": "fee_type",
+    "building": "property__building_id",
+}
+REVENUE_ROLLUP_GROUP_FIELDS = {
+    "fee_type": "fee_type",
+    "building": "building_id",
+}
+
+
+def _empty_revenue_bucket() -> dict:
+    return {
+        "total_revenue": Decimal("0"),
+        "paid_revenue": Decimal("0"),
+        "unpaid_revenue": Decimal("0"),
+        "overdue_revenue": Decimal("0"),
+        "bill_count": 0,
+        "paid_count": 0,
+        "unpaid_count": 0,
+        "overdue_count": 0,
+    }
+
+
+def _add_revenue_row(bucket: dict, status_value: str, amount: Decimal, count: int):
+    """把一行 (status, SUM, COUNT) 聚合结果累加到统计桶中"""
+    bucket["total_revenue"] += amount
+    bucket["bill_count"] += count
+    if status_value in (BillStatus.PAID.value, BillStatus.UNPAID.value, BillStatus.OVERDUE.value):
+        bucket[f"{status_value}_revenue"] += amount
+        bucket[f"{status_value}_count"] += count
+
+
+def _payment_rate(bucket: dict) -> float:
+    if bucket["total_revenue"] > 0:
+        return round(float(bucket["paid_revenue"] / bucket["total_revenue"] * 100), 2)
+    return 0
+
+
 @router.get("/statistics/revenue", response_model=RevenueStatistics)
 async def get_revenue_statistics(
     start_date: date = None,
     end_date: date = None,
+    group_by: str = None,
     current_user: User = Depends(get_current_manager)
 ):
-    """获取收入统计"""
-    query = Bill.all()
+    """获取收入统计（GROUP BY 聚合，group_by 可选 fee_type / building）"""
+    if group_by and group_by not in REVENUE_GROUP_FIELDS:
+        raise HTTPException(status_code=400, detail="group_by 仅支持 fee_type 或 building")
+    
+    group_fields = ["status"]
+    
+    if settings.STATS_USE_ROLLUPS:
+        # 读日汇总表：(状态[, 分组维度]) -> SUM(amount), SUM(bill_count)
+        query = BillDailyRollup.all()
+        if start_date:
+            query = query.filter(day__gte=start_date)
+        if end_date:
+            query = query.filter(day__lte=end_date)
+        dimension = REVENUE_ROLLUP_GROUP_FIELDS.get(group_by)
+        if dimension:
+            group_fields.append(dimension)
+        query = query.annotate(total=Sum("amount"), count=Sum("bill_count"))
+    else:
+        # 直接聚合账单表：(状态[, 分组维度]) -> SUM(amount), COUNT(id)
+        query = Bill.all()
+        if start_date:
+            query = query.filter(created_at__gte=start_date)
+        if end_date:
+            query = query.filter(created_at__lte=end_date)
+        dimension = REVENUE_GROUP_FIELDS.get(group_by)
+        if dimension:
+            group_fields.append(dimension)
+        query = query.annotate(total=Sum("amount"), count=Count("id"))
+    
+    rows = await query.group_by(*group_fields).values(*group_fields, "total", "count")
+    
+    summary = _empty_revenue_bucket()
+    groups = {}
+    for row in rows:
+        status_value = BillStatus(row["status"]).value
+        amount = Decimal(row["total"] or 0)
+        count = int(row["count"] or 0)
+        _add_revenue_row(summary, status_value, amount, count)
+        
+        if dimension:
+            key = row[dimension]
+            key = key.value if hasattr(key, "value") else str(key)
+            _add_revenue_row(groups.setdefault(key, _empty_revenue_bucket()), status_value, amount, count)
+    
+    # 楼栋分组补充楼栋名称（楼栋数量很少，单次查询）
+    labels = {}
+    if group_by == "building" and groups:
+        buildings = await Building.filter(id__in=[int(k) for k in groups]).values_list("id", "name")
+        labels = {str(building_id): name for building_id, name in buildings}
+    
+    breakdown = [
+        RevenueBreakdown(
+            key=key,
+            label=labels.get(key),
+            total_revenue=bucket["total_revenue"],
+            paid_revenue=bucket["paid_revenue"],
+            unpaid_revenue=bucket["unpaid_revenue"],
+            overdue_revenue=bucket["overdue_revenue"],
+            bill_count=bucket["bill_count"],
+            paid_count=bucket["paid_count"],
+            payment_rate=_payment_rate(bucket)
+        )
+        for key, bucket in sorted(groups.items())
+    ]
     
+    return RevenueStatistics(
+        **summary,
+        payment_rate=_payment_rate(summary),
+        breakdown=breakdown
+    )
+
+
+# 已完成维修的状态（completed 为临时状态，随后转为待支付/待评价/已完结）
+REPAIR_DONE_STATUSES = (
+    RepairStatus.COMPLETED,
+    RepairStatus.PENDING_PAYMENT,
+    RepairStatus.PENDING_EVALUATION,
+    RepairStatus.FINISHED,
+)
+
+
+def _to_beijing_naive(dt: datetime, is_utc: bool) -> datetime:
+    """统一成北京时间的 naive datetime（created_at 是 UTC，其他时间字段已是北京时间）"""
+    if is_utc:
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt.astimezone(BEIJING_TZ).replace(tzinfo=None)
+    return dt.replace(tzinfo=None)
+
+
+def _duration_percentiles(minutes: List[float]) -> DurationPercentiles:
+    """最近秩法计算 p50/p90/p99"""
+    if not minutes:
+        return DurationPercentiles()
+    minutes.sort()
+    
+    def pick(p: int) -> float:
+        index = max(math.ceil(p / 100 * len(minutes)) - 1, 0)
+        return round(minutes[index], 1)
+    
+    return DurationPercentiles(samples=len(minutes), p50=pick(50), p90=pick(90), p99=pick(99))
+
+
+async def _repair_counts_from_orders(query):
+    """一条查询完成所有状态计数：COUNT(CASE WHEN status=... THEN id END)"""
+    status_annotations = {
+        f"count_{repair_status.value}": Count("id", _filter=Q(status=repair_status))
+        for repair_status in RepairStatus
+    }
+    # 不用 Avg("rating")：Tortoise 会把结果按评分字段（整数）转换，4.5 分变成 4 分
+    row = await query.annotate(
+        total=Count("id"),
+        rating_sum=Sum("rating"),
+        rating_count=Count("rating"),
+        **status_annotations
+    ).first().values("total", "rating_sum", "rating_count", *status_annotations.keys())
+    row = row or {}
+    
+    status_counts = {
+        repair_status.value: row.get(f"count_{repair_status.value}") or 0
+        for repair_status in RepairStatus
+    }
+    rating_count = row.get("rating_count") or 0
+    average_rating = (row.get("rating_sum") or 0) / rating_count if rating_count else None
+    return status_counts, row.get("total") or 0, average_rating
+
+
+async def _repair_counts_from_rollup(start_date: date = None, end_date: date = None):
+    """从报修日汇总表按状态汇总计数和评分"""
+    query = RepairDailyRollup.all()
     if start_date:
-        query = query.filter(created_at__gte=start_date)
+        query = query.filter(day__gte=start_date)
     if end_date:
-        query = query.filter(created_at__lte=end_date)
-    
-    bills = await query
+        query = query.filter(day__lte=end_date)
     
-    total_revenue = sum(bill.amount for bill in bills)
-    paid_revenue = sum(bill.amount for bill in bills if bill.status == BillStatus.PAID)
-    unpaid_revenue = sum(bill.amount for bill in bills if bill.status == BillStatus.UNPAID)
-    overdue_revenue = sum(bill.amount for bill in bills if bill.status == BillStatus.OVERDUE)
+    rows = await query.annotate(
+        count=Sum("order_count"),
+        rating_sum=Sum("rating_sum"),
+        rating_count=Sum("rating_count")
+    ).group_by("status").values("status", "count", "rating_sum", "rating_count")
     
-    payment_rate = (paid_revenue / total_revenue * 100) if total_revenue > 0 else 0
+    status_counts = {repair_status.value: 0 for repair_status in RepairStatus}
+    rating_sum = 0
+    rating_count = 0
+    for row in rows:
+        status_counts[RepairStatus(row["status"]).value] = int(row["count"] or 0)
+        rating_sum += int(row["rating_sum"] or 0)
+        rating_count += int(row["rating_count"] or 0)
     
-    return RevenueStatistics(
-        total_revenue=total_revenue,
-        paid_revenue=paid_revenue,
-        unpaid_revenue=unpaid_revenue,
-        overdue_revenue=overdue_revenue,
-        payment_rate=round(payment_rate, 2)
-    )
+    average_rating = rating_sum / rating_count if rating_count else None
+    return status_counts, sum(status_counts.values()), average_rating
 
 
 @router.get("/statistics/repairs", response_model=RepairStatistics)
@@ -1081,7 +1546,7 @@ async def get_repair_statistics(
     end_date: date = None,
     current_user: User = Depends(get_current_manager)
 ):
-    """获取维修统计"""
+    """获取维修统计（状态计数 + SLA 分位数）"""
     query = RepairOrder.all()
     
     if start_date:
@@ -1089,22 +1554,36 @@ async def get_repair_statistics(
     if end_date:
         query = query.filter(created_at__lte=end_date)
     
-    orders = await query
+    if settings.STATS_USE_ROLLUPS:
+        status_counts, total_orders, average_rating = await _repair_counts_from_rollup(start_date, end_date)
+    else:
+        status_counts, total_orders, average_rating = await _repair_counts_from_orders(query)
     
-    total_orders = len(orders)
-    pending_orders = sum(1 for order in orders if order.status == RepairStatus.PENDING)
-    in_progress_orders = sum(1 for order in orders if order.status in [RepairStatus.ASSIGNED, RepairStatus.IN_PROGRESS])
-    completed_orders = sum(1 for order in orders if order.status == RepairStatus.COMPLETED)
-    
-    ratings = [order.rating for order in orders if order.rating is not None]
-    average_rating = sum(ratings) / len(ratings) if ratings else None
+    # SLA：只取三个时间列做一次紧凑查询，在内存中计算分位数
+    timings = await query.filter(assigned_at__not_isnull=True).values_list(
+        "created_at", "assigned_at", "completed_at"
+    )
+    assign_minutes = []
+    complete_minutes = []
+    for created_at, assigned_at, completed_at in timings:
+        created = _to_beijing_naive(created_at, is_utc=True)
+        assign_seconds = (_to_beijing_naive(assigned_at, is_utc=False) - created).total_seconds()
+        if assign_seconds >= 0:
+            assign_minutes.append(assign_seconds / 60)
+        if completed_at:
+            complete_seconds = (_to_beijing_naive(completed_at, is_utc=False) - created).total_seconds()
+            if complete_seconds >= 0:
+                complete_minutes.append(complete_seconds / 60)
     
     return RepairStatistics(
         total_orders=total_orders,
-        pending_orders=pending_orders,
-        in_progress_orders=in_progress_orders,
-        completed_orders=completed_orders,
-        average_rating=round(average_rating, 2) if average_rating else None
+        pending_orders=status_counts[RepairStatus.PENDING.value],
+        in_progress_orders=status_counts[RepairStatus.ASSIGNED.value] + status_counts[RepairStatus.IN_PROGRESS.value],
+        completed_orders=sum(status_counts[s.value] for s in REPAIR_DONE_STATUSES),
+        average_rating=round(float(average_rating), 2) if average_rating else None,
+        status_counts=status_counts,
+        time_to_assign=_duration_percentiles(assign_minutes),
+        time_to_complete=_duration_percentiles(complete_minutes)
     )
 
 
@@ -1124,6 +1603,14 @@ async def get_owner_statistics(
     )
 
 
+async def _rollup_repair_count(**filters) -> int:
+    """从报修日汇总表累加满足条件的工单数"""
+    row = await RepairDailyRollup.filter(**filters).annotate(
+        count=Sum("order_count")
+    ).first().values("count")
+    return int((row or {}).get("count") or 0)
+
+
 @router.get("/alerts")
 async def get_alerts(
     current_user: User = Depends(get_current_manager)
@@ -1131,9 +1618,14 @@ async def get_alerts(
     """查看预警信息"""
     alerts = []
     
-    # 逾期账单预警
-    today = date.today()
-    overdue_bills = await Bill.filter(status=BillStatus.UNPAID, due_date__lt=today).count()
+    # 逾期账单预警（逾期状态由后台定时任务标记）
+    if settings.STATS_USE_ROLLUPS:
+        row = await BillDailyRollup.filter(status=BillStatus.OVERDUE).annotate(
+            count=Sum("bill_count")
+        ).first().values("count")
+        overdue_bills = int((row or {}).get("count") or 0)
+    else:
+        overdue_bills = await Bill.filter(status=BillStatus.OVERDUE).count()
     if overdue_bills > 0:
         alerts.append({
             "type": "overdue_bills",
@@ -1143,7 +1635,10 @@ async def get_alerts(
         })
     
     # 待处理报修预警
-    pending_repairs = await RepairOrder.filter(status=RepairStatus.PENDING).count()
+    if settings.STATS_USE_ROLLUPS:
+        pending_repairs = await _rollup_repair_count(status__in=[RepairStatus.PENDING])
+    else:
+        pending_repairs = await RepairOrder.filter(status=RepairStatus.PENDING).count()
     if pending_repairs > 0:
         alerts.append({
             "type": "pending_repairs",
@@ -1153,10 +1648,16 @@ async def get_alerts(
         })
     
     # 紧急报修预警
-    urgent_repairs = await RepairOrder.filter(
-        urgency_level="urgent",
-        status__in=[RepairStatus.PENDING, RepairStatus.ASSIGNED]
-    ).count()
+    if settings.STATS_USE_ROLLUPS:
+        urgent_repairs = await _rollup_repair_count(
+            urgency_level=UrgencyLevel.URGENT,
+            status__in=[RepairStatus.PENDING, RepairStatus.ASSIGNED]
+        )
+    else:
+        urgent_repairs = await RepairOrder.filter(
+            urgency_level="urgent",
+            status__in=[RepairStatus.PENDING, RepairStatus.ASSIGNED]
+        ).count()
     if urgent_repairs > 0:
         alerts.append({
             "type": "urgent_repairs",
@@ -1168,6 +1669,33 @@ async def get_alerts(
     return {"alerts": alerts}
 
 
+@router.get("/system/scheduler")
+async def get_scheduler_status(
+    current_user: User = Depends(get_current_manager)
+):
+    """查看后台定时任务状态（当前 worker 视角）"""
+    return {
+        "worker_id": scheduler.worker_id,
+        "jobs": scheduler.status()
+    }
+
+
+@router.get("/system/render-pool")
+async def get_render_pool_status(
+    current_user: User = Depends(get_current_manager)
+):
+    """查看发票生成进程池的排队和耗时指标（当前 worker 视角）"""
+    return render_pool.status()
+
+
+@router.get("/system/websockets")
+async def get_websocket_status(
+    current_user: User = Depends(get_current_manager)
+):
+    """查看 WebSocket 连接数、发送队列积压（当前 worker 视角）和通知总线状态"""
+    return {**ws_manager.status(), "bus": notify_bus.status()}
+
+
 # ============= 维修参考价格管理 =============
 @router.get("/repair-prices", response_model=List[RepairPriceResponse])
 async def get_repair_prices(
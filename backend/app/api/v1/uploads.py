@@ -0,0 +1,135 @@
+"""
+上传文件访问（/uploads/{key}）
+
+上传图片按内容哈希命名、发票文件名带内容摘要，同一地址的内容永不变化，
+因此统一返回 Cache-Control: immutable，浏览器和 CDN 重复访问不再回源。
+- 强 ETag：内容寻址文件直接用文件名中的哈希，其它文件用大小 + 修改时间
+- 支持单段 Range（大文件断点续传、PDF 分段加载），If-Range 不匹配时返回完整内容
+- 存在 {文件名}.br / {文件名}.gz 时按 Accept-Encoding 返回预压缩版本
+- 对象存储（STORAGE_BACKEND=s3）重定向到预签名地址
+"""
+import mimetypes
+import os
+import re
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+
+from app.core.config import settings
+from app.core.http_cache import (
+    IMMUTABLE_CACHE_CONTROL, make_etag, is_not_modified, validator_headers,
+    not_modified_response, if_range_matches, parse_range
+)
+from app.core.storage import storage, PRECOMPRESSED_ENCODINGS
+
+router = APIRouter()
+
+# 旧版本 Python 的 mimetypes 不认识 webp
+mimetypes.add_type("image/webp", ".webp")
+
+# 内容寻址文件名：{sha256}.jpg、{sha256}.thumb.webp
+CONTENT_ADDRESSED_NAME = re.compile(r"^([0-9a-f]{64}(?:\.[a-z]+)?)\.[A-Za-z0-9]+$")
+
+
+def _resolve_local(key: str) -> Optional[str]:
+    """key -> 本地文件路径；隐藏文件（上传临时文件等）和越出上传目录的路径返回 None"""
+    if any(part.startswith(".") for part in key.split("/")):
+        return None
+    root = os.path.realpath(storage.root)
+    path = os.path.realpath(storage.local_path(key))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+def _file_etag(path: str, stat_result: os.stat_result) -> str:
+    match = CONTENT_ADDRESSED_NAME.match(os.path.basename(path))
+    if match:
+        return make_etag(match.group(1))
+    return make_etag(f"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}")
+
+
+def _accepted_encodings(request: Request) -> set:
+    accepted = set()
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def _precompressed(request: Request, path: str) -> Tuple[Optional[str], Optional[str], bool]:
+    """返回 (编码, 预压缩文件路径, 是否存在预压缩版本)"""
+    candidates = [(coding, path + suffix) for coding, suffix in PRECOMPRESSED_ENCODINGS
+                  if os.path.isfile(path + suffix)]
+    accepted = _accepted_encodings(request)
+    for coding, candidate in candidates:
+        if coding in accepted:
+            return coding, candidate, True
+    return None, None, bool(candidates)
+
+
+@router.api_route("/uploads/{key:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_upload(key: str, request: Request):
+    """访问上传文件"""
+    if storage.root is None:
+        # 预签名地址有有效期，重定向本身只缓存一半时间
+        return RedirectResponse(
+            await storage.presign(key),
+            status_code=302,
+            headers={"Cache-Control": f"private, max-age={settings.S3_PRESIGN_EXPIRES // 2}"}
+        )
+
+    path = _resolve_local(key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="文件不存在")
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    range_header = request.headers.get("range")
+    coding, encoded_path, has_variants = _precompressed(request, path)
+    if range_header:
+        # 分段请求针对原文件字节，不使用预压缩版本
+        coding = encoded_path = None
+
+    stat_result = os.stat(path)
+    etag = _file_etag(path, stat_result)
+    if coding:
+        stat_result = os.stat(encoded_path)
+        # 不同编码的内容不同，强 ETag 也要区分
+        etag = f'{etag[:-1]}-{coding}"'
+    headers = validator_headers(etag, stat_result.st_mtime, IMMUTABLE_CACHE_CONTROL)
+    headers["Accept-Ranges"] = "bytes"
+    if has_variants:
+        headers["Vary"] = "Accept-Encoding"
+
+    if is_not_modified(request, etag, stat_result.st_mtime):
+        return not_modified_response(headers)
+
+    if coding:
+        headers["Content-Encoding"] = coding
+        return FileResponse(encoded_path, media_type=media_type, headers=headers, stat_result=stat_result)
+
+    size = stat_result.st_size
+    byte_range = None
+    if range_header and if_range_matches(request, etag, stat_result.st_mtime):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat_result)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    if request.method == "HEAD":
+        return Response(status_code=206, media_type=media_type, headers=headers)
+    return StreamingResponse(
+        storage.stream(key, start=start, end=end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers
+    )
@@ -1,329 +1,203 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
-from app.models import User
-from typing import Dict, Set
-import json
+from app.core import notify_log
+from app.core.notify_bus import bus
+from app.core.ws_manager import manager, encode_message, ROLE_MAINTENANCE, ROLE_MANAGER, ROLE_OWNER
 
 router = APIRouter()
 
-# 存储维修人员的WebSocket连接
-maintenance_connections: Dict[int, Set[WebSocket]] = {}
+# 连接统一由 ConnectionManager 管理（按角色、用户ID索引）；
+# 通知先发布到总线（多 worker 时经 Redis 广播），各 worker 放入本进程连接的发送队列，
+# 由连接自己的写任务发送，不会阻塞调用方的 HTTP 请求。
+# 每条消息带通知流序号 seq，客户端重连时带 ?since=<seq> 补发断线期间的消息（见 notify_log）
+ROLE_NAMES = {ROLE_MAINTENANCE: "维修人员", ROLE_MANAGER: "管理员", ROLE_OWNER: "业主"}
 
-# 存储管理员的WebSocket连接（改用字典，支持多个管理员）
-manager_connections: Dict[int, Set[WebSocket]] = {}
+# 状态类消息：队列满时同一对象只保留最新一条
+COALESCE_TYPES = {"repair_status_update", "workorder_update", "complaint_update"}
 
-# 存储业主的WebSocket连接
-owner_connections: Dict[int, Set[WebSocket]] = {}
+
+def _coalesce_key(message: dict):
+    if message["type"] not in COALESCE_TYPES:
+        return None
+    data = message.get("data") or {}
+    object_id = message.get("order_id") or data.get("id")
+    return (message["type"], object_id) if object_id is not None else None
+
+
+def _stream_key(role: str, user_id: int):
+    """管理员共用一条广播流，其他角色每人一条"""
+    return None if role == ROLE_MANAGER else user_id
+
+
+async def _serve_connection(websocket: WebSocket, role: str, user_id: int, since: int = None):
+    """补发断线期间的消息，登记连接并保持，处理客户端心跳，断开后移除"""
+    await websocket.accept()
+    backlog, resync_seq = [], None
+    if since is not None:
+        try:
+            backlog, resync_seq = await notify_log.replay(role, _stream_key(role, user_id), since)
+        except Exception as e:
+            print(f"[WebSocket] 补发查询失败: {e}")
+    # replay 之后不能再 await：之后的新消息全部经正常推送进入发送队列，不会遗漏或重复
+    conn = manager.connect(websocket, role, user_id)
+    for text in backlog:
+        manager.enqueue(conn, text)
+    if resync_seq is not None:
+        manager.enqueue(conn, encode_message({"type": "resync_required", "seq": resync_seq}))
+    print(f"[WebSocket] {ROLE_NAMES[role]} {user_id} 连接成功, 当前连接数: {manager.count(role, user_id)}")
+    try:
+        while True:
+            # 保持连接，接收客户端心跳
+            data = await websocket.receive_text()
+            if data == "ping":
+                # 与推送消息走同一个发送队列，避免并发写同一个连接
+                manager.enqueue(conn, "pong")
+    except WebSocketDisconnect:
+        print(f"[WebSocket] {ROLE_NAMES[role]} {user_id} 断开连接")
+    except Exception as e:
+        print(f"[WebSocket] {ROLE_NAMES[role]} {user_id} 连接异常: {e}")
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+    finally:
+        manager.disconnect(conn)
 
 
 @router.websocket("/ws/maintenance/{user_id}")
 async def maintenance_websocket(
     websocket: WebSocket,
     user_id: int,
-    token: str = Query(...)
+    token: str = Query(...),
+    since: int = Query(None)
 ):
     """维修人员WebSocket连接 - 接收新工单推送"""
-    await websocket.accept()
-    
-    # 验证token (简化版，实际应该用JWT验证)
-    try:
-        # 这里应该验证token并获取用户信息
-        # current_user = await get_current_user_from_token(token)
-        
-        # 添加连接到管理器
-        if user_id not in maintenance_connections:
-            maintenance_connections[user_id] = set()
-        maintenance_connections[user_id].add(websocket)
-        
-        try:
-            while True:
-                # 保持连接，接收客户端心跳
-                data = await websocket.receive_text()
-                # 可以处理心跳或其他消息
-                if data == "ping":
-                    await websocket.send_text("pong")
-        except WebSocketDisconnect:
-            # 移除连接
-            maintenance_connections[user_id].remove(websocket)
-            if not maintenance_connections[user_id]:
-                del maintenance_connections[user_id]
-    except Exception as e:
-        print(f"WebSocket error: {e}")
-        await websocket.close()
-
-
-async def notify_new_workorder(maintenance_worker_id: int, order_data: dict):
-    """通知维修人员有新工单分配"""
-    if maintenance_worker_id in maintenance_connections:
-        # 向该维修人员的所有连接发送消息
-        for websocket in maintenance_connections[maintenance_worker_id].copy():
-            try:
-                await websocket.send_json({
-                    "type": "new_workorder",
-                    "data": order_data
-                })
-            except:
-                # 如果发送失败，移除这个连接
-                maintenance_connections[maintenance_worker_id].discard(websocket)
-
-
-async def notify_workorder_update(maintenance_worker_id: int, order_id: int, update_type: str, data: dict = None):
-    """通知维修人员工单状态更新"""
-    if maintenance_worker_id in maintenance_connections:
-        for websocket in maintenance_connections[maintenance_worker_id].copy():
-            try:
-                await websocket.send_json({
-                    "type": "workorder_update",
-                    "update_type": update_type,
-                    "order_id": order_id,
-                    "data": data
-                })
-            except:
-                maintenance_connections[maintenance_worker_id].discard(websocket)
+    await _serve_connection(websocket, ROLE_MAINTENANCE, user_id, since)
 
 
 @router.websocket("/ws/manager/{user_id}")
 async def manager_websocket(
     websocket: WebSocket,
     user_id: int,
-    token: str = Query(...)
+    token: str = Query(...),
+    since: int = Query(None)
 ):
     """管理员WebSocket连接 - 接收新报修通知"""
-    await websocket.accept()
-    
-    try:
-        # 添加连接到管理器（按用户ID管理）
-        if user_id not in manager_connections:
-            manager_connections[user_id] = set()
-        manager_connections[user_id].add(websocket)
-        print(f"[WebSocket] 管理员 {user_id} 连接成功, 当前连接数: {len(manager_connections[user_id])}")
-        
-        try:
-            while True:
-                # 保持连接，接收客户端心跳
-                data = await websocket.receive_text()
-                if data == "ping":
-                    await websocket.send_text("pong")
-        except WebSocketDisconnect:
-            # 移除连接
-            manager_connections[user_id].discard(websocket)
-            if not manager_connections[user_id]:
-                del manager_connections[user_id]
-            print(f"[WebSocket] 管理员 {user_id} 断开连接")
-    except Exception as e:
-        print(f"Manager WebSocket error: {e}")
-        if user_id in manager_connections:
-            manager_connections[user_id].discard(websocket)
-            if not manager_connections[user_id]:
-                del manager_connections[user_id]
-        await websocket.close()
-
-
-async def notify_new_repair(repair_data: dict):
-    """通知所有管理员有新的报修"""
-    total_connections = sum(len(connections) for connections in manager_connections.values())
-    print(f"[WebSocket] 通知管理员新报修, 当前管理员数: {len(manager_connections)}, 总连接数: {total_connections}")
-    print(f"[WebSocket] 消息: {repair_data}")
-    
-    # 遍历所有管理员的所有连接
-    for user_id, connections in list(manager_connections.items()):
-        for websocket in connections.copy():
-            try:
-                await websocket.send_json({
-                    "type": "new_repair",
-                    "data": repair_data
-                })
-                print(f"[WebSocket] 成功发送消息给管理员 {user_id}")
-            except Exception as e:
-                print(f"[WebSocket] 发送失败: {e}")
-                manager_connections[user_id].discard(websocket)
-                if not manager_connections[user_id]:
-                    del manager_connections[user_id]
+    await _serve_connection(websocket, ROLE_MANAGER, user_id, since)
 
 
 @router.websocket("/ws/owner/{user_id}")
 async def owner_websocket(
     websocket: WebSocket,
     user_id: int,
-    token: str = Query(...)
+    token: str = Query(...),
+    since: int = Query(None)
 ):
     """业主 WebSocket连接 - 接收工单状态更新通知"""
-    await websocket.accept()
-    
+    await _serve_connection(websocket, ROLE_OWNER, user_id, since)
+
+
+async def _publish(role: str, key, message: dict):
+    """分配序号并写入通知记录，再发布到总线；记录失败时仍然推送（不带序号）"""
     try:
-        # 添加连接到管理器
-        if user_id not in owner_connections:
-            owner_connections[user_id] = set()
-        owner_connections[user_id].add(websocket)
-        
-        try:
-            while True:
-                # 保持连接，接收客户端心跳
-                data = await websocket.receive_text()
-                if data == "ping":
-                    await websocket.send_text("pong")
-        except WebSocketDisconnect:
-            # 移除连接
-            owner_connections[user_id].discard(websocket)
-            if not owner_connections[user_id]:
-                del owner_connections[user_id]
+        seq, text = await notify_log.record(role, key, message)
     except Exception as e:
-        print(f"Owner WebSocket error: {e}")
-        if user_id in owner_connections:
-            owner_connections[user_id].discard(websocket)
-        await websocket.close()
+        print(f"[WebSocket] 通知记录失败: {e}")
+        seq, text = None, encode_message(message)
+    await bus.publish_text(role, key, text, _coalesce_key(message), seq)
+    return seq
+
+
+async def _notify_user(role: str, user_id: int, message: dict):
+    if not user_id:
+        return
+    seq = await _publish(role, user_id, message)
+    print(f"[WebSocket] {message['type']} -> {ROLE_NAMES[role]} {user_id}, seq: {seq}")
+
+
+async def _notify_managers(message: dict):
+    seq = await _publish(ROLE_MANAGER, None, message)
+    print(f"[WebSocket] {message['type']} -> 管理员, seq: {seq}")
+
+
+async def notify_new_workorder(maintenance_worker_id: int, order_data: dict):
+    """通知维修人员有新工单分配"""
+    await _notify_user(ROLE_MAINTENANCE, maintenance_worker_id, {
+        "type": "new_workorder",
+        "data": order_data
+    })
+
+
+async def notify_workorder_update(maintenance_worker_id: int, order_id: int, update_type: str, data: dict = None):
+    """通知维修人员工单状态更新"""
+    await _notify_user(ROLE_MAINTENANCE, maintenance_worker_id, {
+        "type": "workorder_update",
+        "update_type": update_type,
+        "order_id": order_id,
+        "data": data
+    })
+
+
+async def notify_new_repair(repair_data: dict):
+    """通知所有管理员有新的报修"""
+    await _notify_managers({
+        "type": "new_repair",
+        "data": repair_data
+    })
 
 
 async def notify_repair_status_update(owner_id: int, repair_data: dict):
     """通知业主工单状态更新"""
-    print(f"[WebSocket] 通知业主 {owner_id}, 当前连接数: {len(owner_connections.get(owner_id, []))}")
-    print(f"[WebSocket] 消息: {repair_data}")
-    if owner_id in owner_connections:
-        for websocket in owner_connections[owner_id].copy():
-            try:
-                await websocket.send_json({
-                    "type": "repair_status_update",
-                    "data": repair_data
-                })
-                print(f"[WebSocket] 成功发送消息给业主 {owner_id}")
-            except Exception as e:
-                print(f"[WebSocket] 发送失败: {e}")
-                owner_connections[owner_id].discard(websocket)
-    else:
-        print(f"[WebSocket] 业主 {owner_id} 未连接")
+    await _notify_user(ROLE_OWNER, owner_id, {
+        "type": "repair_status_update",
+        "data": repair_data
+    })
 
 
 async def notify_repair_deleted(maintenance_worker_id: int, repair_data: dict):
     """通知维修人员工单被删除/撤销"""
-    print(f"[WebSocket] 通知维修人员 {maintenance_worker_id}, 当前连接数: {len(maintenance_connections.get(maintenance_worker_id, []))}")
-    print(f"[WebSocket] 消息: {repair_data}")
-    if maintenance_worker_id in maintenance_connections:
-        for websocket in maintenance_connections[maintenance_worker_id].copy():
-            try:
-                await websocket.send_json({
-                    "type": "workorder_deleted",
-                    "data": repair_data
-                })
-                print(f"[WebSocket] 成功发送消息给维修人员 {maintenance_worker_id}")
-            except Exception as e:
-                print(f"[WebSocket] 发送失败: {e}")
-                maintenance_connections[maintenance_worker_id].discard(websocket)
-    else:
-        print(f"[WebSocket] 维修人员 {maintenance_worker_id} 未连接")
+    await _notify_user(ROLE_MAINTENANCE, maintenance_worker_id, {
+        "type": "workorder_deleted",
+        "data": repair_data
+    })
 
 
 async def notify_manager_repair_update(repair_data: dict):
     """通知所有管理员工单状态更新（维修人员开始/完成维修）"""
-    total_connections = sum(len(connections) for connections in manager_connections.values())
-    print(f"[WebSocket] 通知管理员工单状态更新, 当前管理员数: {len(manager_connections)}, 总连接数: {total_connections}")
-    print(f"[WebSocket] 消息: {repair_data}")
-    
-    # 遍历所有管理员的所有连接
-    for user_id, connections in list(manager_connections.items()):
-        for websocket in connections.copy():
-            try:
-                await websocket.send_json({
-                    "type": "repair_status_update",  # 复用类型，前端统一处理
-                    "data": repair_data
-                })
-                print(f"[WebSocket] 成功发送消息给管理员 {user_id}")
-            except Exception as e:
-                print(f"[WebSocket] 发送失败: {e}")
-                manager_connections[user_id].discard(websocket)
-                if not manager_connections[user_id]:
-                    del manager_connections[user_id]
+    await _notify_managers({
+        "type": "repair_status_update",  # 复用类型，前端统一处理
+        "data": repair_data
+    })
 
 
 async def notify_repair_evaluation(order_id: int, maintenance_worker_id: int, evaluation_data: dict):
     """通知维修人员和管理员：业主已评价"""
-    print(f"[WebSocket] 发送评价通知, 工单ID: {order_id}, 维修人员ID: {maintenance_worker_id}")
-    
-    # 1. 通知维修人员
-    if maintenance_worker_id and maintenance_worker_id in maintenance_connections:
-        for websocket in maintenance_connections[maintenance_worker_id].copy():
-            try:
-                await websocket.send_json({
-                    "type": "repair_evaluated",  # 新的消息类型
-                    "data": evaluation_data
-                })
-                print(f"[WebSocket] 已通知维修人员 {maintenance_worker_id}")
-            except Exception as e:
-                print(f"[WebSocket] 通知维修人员失败: {e}")
-                maintenance_connections[maintenance_worker_id].discard(websocket)
-    
-    # 2. 通知所有管理员
-    total_managers = len(manager_connections)
-    for user_id, connections in list(manager_connections.items()):
-        for websocket in connections.copy():
-            try:
-                await websocket.send_json({
-                    "type": "repair_evaluated",  # 同样的消息类型
-                    "data": evaluation_data
-                })
-            except Exception as e:
-                print(f"[WebSocket] 通知管理员失败: {e}")
-                manager_connections[user_id].discard(websocket)
-                if not manager_connections[user_id]:
-                    del manager_connections[user_id]
-    
-    print(f"[WebSocket] 评价通知完成, 已通知 {total_managers} 个管理员")
+    message = {
+        "type": "repair_evaluated",
+        "data": evaluation_data
+    }
+    await _notify_user(ROLE_MAINTENANCE, maintenance_worker_id, message)
+    await _notify_managers(message)
 
 
 async def notify_new_complaint(complaint_data: dict):
     """通知所有管理员有新的投诉"""
-    total_connections = sum(len(connections) for connections in manager_connections.values())
-    print(f"[WebSocket] 通知管理员新投诉, 当前管理员数: {len(manager_connections)}, 总连接数: {total_connections}")
-    print(f"[WebSocket] 消息: {complaint_data}")
-    
-    # 遍历所有管理员的所有连接
-    for user_id, connections in list(manager_connections.items()):
-        for websocket in connections.copy():
-            try:
-                await websocket.send_json({
-                    "type": "new_complaint",
-                    "data": complaint_data
-                })
-                print(f"[WebSocket] 成功发送消息给管理员 {user_id}")
-            except Exception as e:
-                print(f"[WebSocket] 发送失败: {e}")
-                manager_connections[user_id].discard(websocket)
-                if not manager_connections[user_id]:
-                    del manager_connections[user_id]
+    await _notify_managers({
+        "type": "new_complaint",
+        "data": complaint_data
+    })
 
 
 async def notify_complaint_update(owner_id: int, complaint_data: dict):
     """通知业主投诉状态更新"""
-    print(f"[WebSocket] 通知业主 {owner_id} 投诉更新, 当前连接数: {len(owner_connections.get(owner_id, []))}")
-    print(f"[WebSocket] 消息: {complaint_data}")
-    if owner_id in owner_connections:
-        for websocket in owner_connections[owner_id].copy():
-            try:
-                await websocket.send_json({
-                    "type": "complaint_update",
-                    "data": complaint_data
-                })
-                print(f"[WebSocket] 成功发送消息给业主 {owner_id}")
-            except Exception as e:
-                print(f"[WebSocket] 发送失败: {e}")
-                owner_connections[owner_id].discard(websocket)
-    else:
-        print(f"[WebSocket] 业主 {owner_id} 未连接")
+    await _notify_user(ROLE_OWNER, owner_id, {
+        "type": "complaint_update",
+        "data": complaint_data
+    })
 
 
 async def notify_complaint_rated(complaint_data: dict):
     """通知所有管理员有新的投诉评价"""
-    total_connections = sum(len(connections) for connections in manager_connections.values())
-    print(f"[WebSocket] 通知管理员投诉被评价, 当前管理员数: {len(manager_connections)}, 总连接数: {total_connections}")
-    
-    for user_id, connections in list(manager_connections.items()):
-        for websocket in connections.copy():
-            try:
-                await websocket.send_json({
-                    "type": "complaint_rated",
-                    "data": complaint_data
-                })
-                print(f"[WebSocket] 成功发送评价通知给管理员 {user_id}")
-            except Exception as e:
-                print(f"[WebSocket] 发送失败: {e}")
-                manager_connections[user_id].discard(websocket)
-                if not manager_connections[user_id]:
-                    del manager_connections[user_id]
+    await _notify_managers({
+        "type": "complaint_rated",
+        "data": complaint_data
+    })
@@ -30,10 +30,54 @@ class Settings(BaseSettings):
     # 文件上传配置
     UPLOAD_DIR: str = "uploads"
     MAX_UPLOAD_SIZE: int = 10 * 1024 * 1024  # 10MB
+    # 文件存储后端：local（UPLOAD_DIR）或 s3（S3 协议对象存储，如 MinIO，需要 pip install boto3）
+    STORAGE_BACKEND: str = "local"
+    S3_ENDPOINT_URL: str = ""  # 如 http://localhost:9000；为空则使用 AWS
+    S3_BUCKET: str = "property-uploads"
+    S3_ACCESS_KEY: str = ""
+    S3_SECRET_KEY: str = ""
+    S3_REGION: str = ""
+    S3_PRESIGN_EXPIRES: int = 3600  # 预签名地址有效期（秒）
+    # 上传文件回收（gc_uploads.py）时，最近多少小时内上传的未引用文件暂不删除
+    UPLOAD_GC_GRACE_HOURS: int = 24
+    
+    # 发票 PDF 磁盘缓存上限（uploads/invoices，超出后按最近访问时间淘汰）
+    INVOICE_CACHE_MAX_MB: int = 200
+    # 内存模式：发票在内存中生成后直接返回；WRITE_THROUGH 控制是否同时写入磁盘缓存
+    INVOICE_IN_MEMORY: bool = True
+    INVOICE_CACHE_WRITE_THROUGH: bool = True
+    
+    # 发票生成进程池：进程数（0 表示在线程中执行）和最大排队数（超出返回 503）
+    RENDER_POOL_WORKERS: int = 2
+    RENDER_POOL_MAX_QUEUE: int = 100
+    
+    # WebSocket 推送：每个连接的发送队列长度、队列满时的策略（drop_oldest / drop_newest）、
+    # 单次发送超时和最大积压时间（秒），超时或积压过久的连接会被断开
+    WS_QUEUE_SIZE: int = 100
+    WS_QUEUE_OVERFLOW: str = "drop_oldest"
+    WS_SEND_TIMEOUT_SECONDS: float = 5
+    WS_MAX_LAG_SECONDS: float = 30
+    # WebSocket 通知总线：local（单进程）或 redis（多 worker，需要 pip install redis）
+    NOTIFY_BUS: str = "local"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    NOTIFY_CHANNEL: str = "property:notify"
+    # 断线补发：每条通知流在内存中保留的条数、内存中最多保留的流数、
+    # 单次补发上限（应小于 WS_QUEUE_SIZE，超出则让客户端重新拉取）和数据库保留时间（小时）
+    NOTIFY_RING_SIZE: int = 200
+    NOTIFY_RING_STREAMS: int = 10000
+    NOTIFY_REPLAY_LIMIT: int = 50
+    NOTIFY_LOG_RETENTION_HOURS: int = 72
     
     # 后端服务地址配置（用于二维码验证URL）
     BACKEND_HOST: str = "localhost:8088"
     
+    # 定时任务（逾期账单扫描等），多 worker 部署时通过数据库租约选出一个进程执行
+    SCHEDULER_ENABLED: bool = True
+    OVERDUE_SWEEP_INTERVAL_SECONDS: int = 3600
+    
+    # 统计看板是否读取日汇总表（首次启用前需运行 python backfill_rollups.py）
+    STATS_USE_ROLLUPS: bool = True
+    
     # AI客服配置（可选，后续集成）
     AI_SERVICE_URL: str = ""
     AI_SERVICE_KEY: str = ""
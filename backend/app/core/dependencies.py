@@ -3,10 +3,13 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.core.security import decode_token
 from app.models import User, UserRole
 from typing import Optional
+import hashlib
 import uuid
 import os
 import aiofiles
 from app.core.config import settings
+from app.services.thumbnails import schedule_image_variants
+from app.services import upload_store
 
 security = HTTPBearer()
 
@@ -155,39 +158,86 @@ async def get_current_maintenance(current_user: User = Depends(get_current_user)
     return current_user
 
 
+# 上传文件每次读取 / 写入的块大小，单个上传占用的内存不超过这个值
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# 按文件类型确定扩展名，相同内容的上传得到同一个文件名
+CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+}
+
+
 async def save_upload_file(file: UploadFile, folder: str = "images") -> str:
-    """保存上传的文件"""
+    """保存上传的文件（分块写入临时文件，按内容哈希去重后原子改名）"""
     # 验证文件类型
-    allowed_types = ["image/jpeg", "image/png", "image/jpg", "image/webp"]
-    if file.content_type not in allowed_types:
+    if file.content_type not in CONTENT_TYPE_EXTENSIONS:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="不支持的文件类型，仅支持 JPEG、PNG、WebP 格式"
         )
     
-    # 验证文件大小
-    contents = await file.read()
-    if len(contents) > settings.MAX_UPLOAD_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"文件大小超过限制（最大 {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB）"
-        )
+    # 已知大小时直接拒绝，不必读取内容
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+        raise _upload_too_large()
+    
+    # 临时目录与本地存储在同一文件系统，保存时只需改名
+    tmp_dir = os.path.join(settings.UPLOAD_DIR, ".tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
     
-    # 生成唯一文件名
-    file_ext = file.filename.split(".")[-1]
-    filename = f"{uuid.uuid4()}.{file_ext}"
+    # 分块写入临时文件，边写边统计大小和计算哈希，超限立即中止
+    tmp_path = os.path.join(tmp_dir, f"{uuid.uuid4().hex}.part")
+    size, digest = await _stream_to_file(file, tmp_path)
     
-    # 确保目录存在
-    upload_path = os.path.join(settings.UPLOAD_DIR, folder)
-    os.makedirs(upload_path, exist_ok=True)
+    # 按哈希放入存储（本地存储改名是原子的，静态文件服务不会读到写了一半的文件）
+    try:
+        url, key, created = await upload_store.commit_upload(
+            tmp_path, folder, digest, size, CONTENT_TYPE_EXTENSIONS[file.content_type], file.content_type
+        )
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print(f"[Upload] {url} {size} bytes{'' if created else '（内容重复，复用已有文件）'}")
     
-    # 保存文件
-    file_path = os.path.join(upload_path, filename)
-    async with aiofiles.open(file_path, "wb") as f:
-        await f.write(contents)
+    # 新文件才需要后台生成缩略图 / 中等尺寸图
+    if created:
+        schedule_image_variants(key)
     
     # 返回访问URL
-    return f"/uploads/{folder}/{filename}"
+    return url
+
+
+async def _stream_to_file(file: UploadFile, path: str):
+    """把上传内容分块写入 path，返回 (字节数, sha256)；失败时删除 path"""
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_SIZE:
+                    raise _upload_too_large()
+                hasher.update(chunk)
+                await f.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return size, hasher.hexdigest()
+
+
+def _upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail=f"文件大小超过限制（最大 {settings.MAX_UPLOAD_SIZE / 1024 / 1024}MB）"
+    )
 
 
 def generate_order_number() -> str:
@@ -0,0 +1,106 @@
+"""
+HTTP 条件请求（ETag / Last-Modified / 304）
+
+客户端带 If-None-Match / If-Modified-Since 重复请求时，
+内容未变化直接返回 304，不再传输文件内容。
+"""
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request, Response
+
+
+# 文件名唯一（内容哈希）的静态资源：内容永不变化，浏览器和 CDN 可以一直缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def make_etag(digest: str) -> str:
+    """强 ETag（内容哈希）"""
+    return f'"{digest}"'
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+    """判断客户端缓存是否仍然有效；If-None-Match 优先于 If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        # If-None-Match 使用弱比较，忽略 W/ 前缀
+        return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP 日期精确到秒
+        return int(last_modified) <= since
+    return False
+
+
+def validator_headers(etag: str, last_modified: Optional[float] = None, cache_control: str = "private, no-cache") -> dict:
+    """响应中的缓存校验头"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    return headers
+
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+
+def if_range_matches(request: Request, etag: str, last_modified: Optional[float] = None) -> bool:
+    """If-Range 校验（强比较）；不匹配时应忽略 Range 返回完整内容"""
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == etag
+    return last_modified is not None and if_range == formatdate(last_modified, usegmt=True)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析 Range 请求头，返回 (起始, 结束) 字节位置（结束位置含在内）
+    没有 Range、格式不支持或请求多段时返回 None（按完整内容返回）；
+    范围超出文件大小时抛出 ValueError（应返回 416）
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+    first, last = (part.strip() for part in spec.split("-", 1))
+    if not (first or last) or (first and not first.isdigit()) or (last and not last.isdigit()):
+        return None
+    if first:
+        start = int(first)
+        end = int(last) if last else max(start, size - 1)
+        if end < start:
+            return None
+    else:
+        # bytes=-N：最后 N 个字节
+        length = int(last)
+        if length == 0:
+            raise ValueError("empty suffix range")
+        start, end = max(size - length, 0), size - 1
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def content_disposition(filename: str) -> str:
+    """下载文件名，非 ASCII 文件名按 RFC 5987 编码"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def iter_bytes(data: bytes, chunk_size: int = 64 * 1024):
+    """按块返回内存中的内容，用于 StreamingResponse"""
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
@@ -0,0 +1,171 @@
+"""
+WebSocket 通知总线
+
+所有 notify_* 和聊天消息都先发布到总线，再由每个 worker 投递给自己进程内的连接：
+- LocalBus：单进程部署，发布即投递（默认）
+- RedisBus：多 worker / 多台机器部署（uvicorn --workers 4），通过 Redis PUBLISH/SUBSCRIBE 广播，
+  需要安装 redis（pip install redis）；每个 worker 订阅同一频道，只投递给本进程的连接
+
+消息在发布方序列化一次，订阅方直接把文本帧放入连接的发送队列；
+带序号的消息同时放入本进程的补发缓冲区（见 notify_log）。
+本地验证 RedisBus 可以启动一个 Redis 容器（docker run -p 6379:6379 redis），
+或把 fakeredis.aioredis.FakeRedis() 作为 client 传给 RedisBus。
+"""
+import asyncio
+import json
+from typing import Hashable, Optional
+
+from app.core.config import settings
+from app.core.notify_log import ring, stream_name
+from app.core.ws_manager import manager, encode_message
+
+# 订阅中断后的重连间隔（秒）
+RESUBSCRIBE_DELAY_SECONDS = 1
+
+
+def _deliver(role: str, key: Optional[int], text: str, coalesce_key: Optional[Hashable],
+             seq: Optional[int] = None) -> int:
+    """投递给当前 worker 的连接"""
+    if seq is not None:
+        ring.remember(stream_name(role, key), seq, text)
+    return manager.publish_text(role, key, text, coalesce_key)
+
+
+class NotifyBus:
+    """通知总线接口"""
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, role: str, key: Optional[int], message: dict,
+                      coalesce_key: Optional[Hashable] = None):
+        """发布给某个角色下某个键（用户ID / 聊天工单ID）的连接；key 为 None 表示该角色所有连接"""
+        await self.publish_text(role, key, encode_message(message), coalesce_key)
+
+    async def publish_text(self, role: str, key: Optional[int], text: str,
+                           coalesce_key: Optional[Hashable] = None, seq: Optional[int] = None):
+        """发布已序列化的文本帧；seq 为通知流序号（用于断线补发）"""
+        raise NotImplementedError
+
+    def status(self) -> dict:
+        return {"type": "local"}
+
+
+class LocalBus(NotifyBus):
+    """进程内总线"""
+
+    async def publish_text(self, role: str, key: Optional[int], text: str,
+                           coalesce_key: Optional[Hashable] = None, seq: Optional[int] = None):
+        _deliver(role, key, text, coalesce_key, seq)
+
+
+class RedisBus(NotifyBus):
+    """基于 Redis 发布订阅的跨 worker 总线（redis 为可选依赖，启动时才导入）"""
+
+    def __init__(self, url: str, channel: str, client=None):
+        self.url = url
+        self.channel = channel
+        self._client = client
+        self._listener: Optional[asyncio.Task] = None
+        self.published = 0
+        self.delivered = 0
+        self.failed = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                import redis.asyncio as aioredis
+            except ImportError:
+                raise RuntimeError("NOTIFY_BUS=redis 需要安装 redis：pip install redis")
+            self._client = aioredis.from_url(self.url)
+        return self._client
+
+    async def start(self):
+        # 先建立订阅再返回，避免启动初期的消息丢失
+        pubsub = await self._subscribe()
+        self._listener = asyncio.create_task(self._listen(pubsub))
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        await self.client.aclose()
+
+    async def publish_text(self, role: str, key: Optional[int], text: str,
+                           coalesce_key: Optional[Hashable] = None, seq: Optional[int] = None):
+        envelope = json.dumps({
+            "role": role,
+            "key": key,
+            "coalesce": list(coalesce_key) if isinstance(coalesce_key, tuple) else coalesce_key,
+            "seq": seq,
+            "text": text,
+        }, ensure_ascii=False)
+        try:
+            await self.client.publish(self.channel, envelope)
+            self.published += 1
+        except Exception as e:
+            # 通知失败不影响业务请求
+            self.failed += 1
+            print(f"[NotifyBus] 发布失败: {e}")
+
+    async def _subscribe(self):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.channel)
+        return pubsub
+
+    async def _listen(self, pubsub):
+        while True:
+            try:
+                async for item in pubsub.listen():
+                    if item.get("type") == "message":
+                        self._handle(item["data"])
+            except asyncio.CancelledError:
+                await pubsub.aclose()
+                raise
+            except Exception as e:
+                print(f"[NotifyBus] 订阅中断: {e}，{RESUBSCRIBE_DELAY_SECONDS} 秒后重连")
+            # 连接断开：重新订阅（断开期间的消息会丢失）
+            await asyncio.sleep(RESUBSCRIBE_DELAY_SECONDS)
+            try:
+                await pubsub.aclose()
+                pubsub = await self._subscribe()
+            except Exception as e:
+                print(f"[NotifyBus] 重新订阅失败: {e}")
+
+    def status(self) -> dict:
+        return {
+            "type": "redis",
+            "channel": self.channel,
+            "subscribed": self._listener is not None and not self._listener.done(),
+            "published": self.published,
+            "delivered": self.delivered,
+            "failed": self.failed,
+        }
+
+    def _handle(self, data):
+        try:
+            envelope = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        coalesce_key = envelope.get("coalesce")
+        if isinstance(coalesce_key, list):
+            coalesce_key = tuple(coalesce_key)
+        _deliver(envelope["role"], envelope.get("key"), envelope["text"], coalesce_key, envelope.get("seq"))
+        self.delivered += 1
+
+
+def create_bus() -> NotifyBus:
+    if settings.NOTIFY_BUS == "redis":
+        return RedisBus(settings.REDIS_URL, settings.NOTIFY_CHANNEL)
+    return LocalBus()
+
+
+bus = create_bus()
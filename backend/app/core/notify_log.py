@@ -0,0 +1,127 @@
+"""
+WebSocket 通知序号与断线补发
+
+每个接收者一条通知流（维修人员 / 业主按用户ID，管理员共用一条广播流），
+推送前在数据库中分配单调递增的序号并写入 notification_logs（持久化的尾部），
+消息中带上 seq 字段。各 worker 投递消息时同时放入进程内的环形缓冲区（每条流最近 NOTIFY_RING_SIZE 条）。
+
+客户端记录收到的最大 seq，重连时带 ?since=<seq>：
+- 缓冲区覆盖 since 之后的全部消息时直接从内存补发
+- 否则从 notification_logs 读取（保留 NOTIFY_LOG_RETENTION_HOURS 小时）
+- 缺口超出保留范围或超过 NOTIFY_REPLAY_LIMIT 条时只发送 resync_required，客户端重新拉取列表
+"""
+from collections import OrderedDict, deque
+from datetime import timedelta
+from typing import Deque, List, Optional, Tuple
+
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from app.core.config import settings
+from app.core.ws_manager import encode_message
+from app.models import NotificationStream, NotificationLog
+
+
+def stream_name(role: str, key: Optional[int]) -> str:
+    """通知流名称；key 为 None 表示角色广播"""
+    return f"{role}:{'*' if key is None else key}"
+
+
+class NotificationRing:
+    """各通知流最近消息的环形缓冲区（当前 worker 进程内，流的数量按 LRU 限制）"""
+
+    def __init__(self, size: int, max_streams: int):
+        self.size = size
+        self.max_streams = max_streams
+        self._streams: "OrderedDict[str, Deque[Tuple[int, str]]]" = OrderedDict()
+
+    def remember(self, stream: str, seq: int, text: str):
+        ring = self._streams.get(stream)
+        if ring is None:
+            ring = self._streams[stream] = deque(maxlen=self.size)
+            if len(self._streams) > self.max_streams:
+                self._streams.popitem(last=False)
+        else:
+            self._streams.move_to_end(stream)
+        # 多 worker 时消息可能乱序到达，保持按序号排列
+        if ring and seq <= ring[-1][0]:
+            if any(item_seq == seq for item_seq, _ in ring):
+                return
+            items = sorted(list(ring) + [(seq, text)])
+            ring.clear()
+            ring.extend(items[-self.size:])
+            return
+        ring.append((seq, text))
+
+    def after(self, stream: str, since: int) -> Optional[List[Tuple[int, str]]]:
+        """返回 since 之后的消息；缓冲区不能覆盖 since 之后的全部消息时返回 None"""
+        ring = self._streams.get(stream)
+        if not ring or ring[0][0] > since + 1:
+            return None
+        return [(seq, text) for seq, text in ring if seq > since]
+
+
+ring = NotificationRing(settings.NOTIFY_RING_SIZE, settings.NOTIFY_RING_STREAMS)
+
+# 已确认存在的流（避免每次推送都查询 notification_streams）
+_known_streams = set()
+
+
+async def _ensure_stream(stream: str):
+    if stream in _known_streams:
+        return
+    try:
+        await NotificationStream.get_or_create(name=stream)
+    except IntegrityError:
+        # 并发创建同一条流
+        pass
+    _known_streams.add(stream)
+
+
+async def record(role: str, key: Optional[int], message: dict) -> Tuple[int, str]:
+    """分配序号并持久化，返回 (序号, 带 seq 字段的文本帧)"""
+    stream = stream_name(role, key)
+    await _ensure_stream(stream)
+    async with in_transaction() as conn:
+        # UPDATE 持有行锁直到提交，同一条流的序号不会重复
+        await NotificationStream.filter(name=stream).using_db(conn).update(last_seq=F("last_seq") + 1)
+        seq = (await NotificationStream.filter(name=stream).using_db(conn).values_list("last_seq", flat=True))[0]
+        text = encode_message({**message, "seq": seq})
+        await NotificationLog.create(stream=stream, seq=seq, payload=text, using_db=conn)
+    return seq, text
+
+
+async def replay(role: str, key: Optional[int], since: int) -> Tuple[List[str], Optional[int]]:
+    """
+    取 since 之后需要补发的文本帧
+    返回 (文本帧列表, 需要重新同步时的最新序号)；第二项不为 None 时客户端应丢弃本地状态重新拉取
+    调用方拿到结果后应立即（中间不再 await）登记连接，之后的消息由正常推送送达
+    """
+    stream = stream_name(role, key)
+    entries = ring.after(stream, since)
+    if entries is None:
+        rows = await NotificationLog.filter(stream=stream, seq__gt=since).order_by("seq").limit(
+            settings.NOTIFY_REPLAY_LIMIT + 1
+        ).values_list("seq", "payload")
+        last_seq = await NotificationStream.filter(name=stream).values_list("last_seq", flat=True)
+        last_seq = last_seq[0] if last_seq else 0
+        if since > last_seq or len(rows) > settings.NOTIFY_REPLAY_LIMIT or (
+            since < last_seq and (not rows or rows[0][0] > since + 1)
+        ):
+            return [], last_seq
+        entries = list(rows)
+        # 查询数据库期间新推送的消息已经进入缓冲区，在这里补上
+        newest = entries[-1][0] if entries else since
+        entries.extend(ring.after(stream, newest) or [])
+    elif len(entries) > settings.NOTIFY_REPLAY_LIMIT:
+        return [], entries[-1][0]
+    return [text for _, text in entries], None
+
+
+async def trim_notification_logs():
+    """删除超过保留时间的通知记录（定时任务）"""
+    cutoff = timezone.now() - timedelta(hours=settings.NOTIFY_LOG_RETENTION_HOURS)
+    deleted = await NotificationLog.filter(created_at__lt=cutoff).delete()
+    return {"deleted": deleted}
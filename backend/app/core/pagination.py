@@ -0,0 +1,50 @@
+"""
+列表接口的游标（keyset）分页
+
+按 (created_at, id) 倒序翻页：游标是上一页最后一行的 (created_at, id)，
+下一页查询 WHERE (created_at, id) < 游标，翻到任意深度都只走索引范围扫描。
+下一页游标通过响应头 X-Next-Cursor 返回，列表响应体保持不变；
+不传 cursor 时仍按 skip/limit 分页，兼容旧客户端。
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Sequence
+
+from fastapi import HTTPException, Response
+from tortoise.expressions import Q
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """解析游标，返回 (created_at, id)"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+def paginate(query, cursor: Optional[str], skip: int, limit: int):
+    """按 created_at、id 倒序分页：有 cursor 走 keyset，否则走 offset"""
+    query = query.order_by("-created_at", "-id")
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        return query.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=row_id)
+        ).limit(limit)
+    return query.offset(skip).limit(limit)
+
+
+def set_next_cursor(response: Response, rows: Sequence, limit: int):
+    """本页满 limit 条时，把最后一行作为下一页游标写入响应头"""
+    if rows and len(rows) >= limit:
+        last = rows[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.created_at, last.id)
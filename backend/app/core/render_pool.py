@@ -0,0 +1,112 @@
+"""
+CPU 密集任务的进程池（发票 PDF / 二维码生成、图片缩略图等）
+
+reportlab 绘图、图片缩放和编码都是同步计算，直接在请求里执行会阻塞整个事件循环，
+同一 worker 上的 WebSocket 推送也会被卡住。这里把任务交给独立进程执行：
+- 同时执行的任务数不超过进程数，其余在事件循环中排队等待
+- 排队数超过上限时直接拒绝（接口返回 503），避免月底集中下载把内存堆满
+- 记录排队深度、耗时等指标，供 /api/v1/manager/system/render-pool 查看
+"""
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from app.core.config import settings
+
+
+class RenderPoolBusy(Exception):
+    """排队任务过多"""
+
+
+class RenderPool:
+    """有界进程池"""
+
+    def __init__(self, max_workers: int, max_queue: int):
+        # max_workers 为 0 时在线程中执行（不创建进程，便于调试）
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # 指标
+        self.queued = 0
+        self.running = 0
+        self.max_queue_seen = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait_ms = 0.0
+        self.total_run_ms = 0.0
+
+    def _get_executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.max_workers <= 0:
+            return None
+        if self._executor is None:
+            # spawn 启动的子进程不继承事件循环和数据库连接
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(max(self.max_workers, 1))
+        return self._semaphore
+
+    async def run(self, func, *args):
+        """在进程池中执行 func(*args)，func 和参数必须可以 pickle"""
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise RenderPoolBusy()
+
+        self.queued += 1
+        self.max_queue_seen = max(self.max_queue_seen, self.queued)
+        enqueued_at = time.perf_counter()
+        try:
+            await self._get_semaphore().acquire()
+        finally:
+            self.queued -= 1
+
+        started_at = time.perf_counter()
+        self.total_wait_ms += (started_at - enqueued_at) * 1000
+        self.running += 1
+        try:
+            executor = self._get_executor()
+            if executor is None:
+                result = await asyncio.to_thread(func, *args)
+            else:
+                result = await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self.total_run_ms += (time.perf_counter() - started_at) * 1000
+            self._get_semaphore().release()
+
+    def status(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queued": self.queued,
+            "running": self.running,
+            "max_queue_seen": self.max_queue_seen,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait_ms / finished, 2) if finished else None,
+            "avg_run_ms": round(self.total_run_ms / finished, 2) if finished else None,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+render_pool = RenderPool(settings.RENDER_POOL_WORKERS, settings.RENDER_POOL_MAX_QUEUE)
@@ -0,0 +1,121 @@
+"""
+进程内定时任务调度器
+
+在 main.py 的 lifespan 中启动。每个任务按固定间隔运行，运行前先在
+scheduler_locks 表上抢占/续约租约，多 worker 部署时同一任务只有一个进程执行。
+"""
+import asyncio
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import Q
+
+from app.models import SchedulerLock
+
+
+class Job:
+    """定时任务及其最近一次运行状态"""
+    
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.is_leader = False
+        self.run_count = 0
+        self.last_run_at: Optional[datetime] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_result = None
+        self.last_error: Optional[str] = None
+    
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "interval_seconds": self.interval,
+            "is_leader": self.is_leader,
+            "run_count": self.run_count,
+            "last_run_at": self.last_run_at,
+            "last_duration_ms": self.last_duration_ms,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+class Scheduler:
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+    
+    def add_job(self, name: str, interval: float, func: Callable[[], Awaitable]):
+        self.jobs[name] = Job(name, interval, func)
+    
+    def start(self):
+        for name, job in self.jobs.items():
+            if name not in self._tasks:
+                self._tasks[name] = asyncio.create_task(self._run_forever(job))
+        print(f"[Scheduler] 已启动 {len(self._tasks)} 个定时任务, worker: {self.worker_id}")
+    
+    async def stop(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+        
+        # 释放本进程持有的租约，让其他 worker 尽快接管
+        try:
+            await SchedulerLock.filter(owner=self.worker_id).delete()
+        except Exception as e:
+            print(f"[Scheduler] 释放租约失败: {e}")
+    
+    def status(self) -> list:
+        return [job.status() for job in self.jobs.values()]
+    
+    async def _acquire(self, name: str, ttl: float) -> bool:
+        """抢占或续约租约：本进程持有或租约已过期时成功"""
+        now = datetime.now()
+        expires_at = now + timedelta(seconds=ttl)
+        updated = await SchedulerLock.filter(
+            Q(owner=self.worker_id) | Q(expires_at__lt=now),
+            name=name
+        ).update(owner=self.worker_id, expires_at=expires_at)
+        if updated:
+            return True
+        
+        try:
+            await SchedulerLock.create(name=name, owner=self.worker_id, expires_at=expires_at)
+            return True
+        except IntegrityError:
+            # 其他 worker 持有未过期的租约
+            return False
+    
+    async def _run_forever(self, job: Job):
+        while True:
+            await self._tick(job)
+            await asyncio.sleep(job.interval)
+    
+    async def _tick(self, job: Job):
+        try:
+            # 租约时长为两个周期，leader 异常退出后其他 worker 最迟两个周期后接管
+            job.is_leader = await self._acquire(job.name, job.interval * 2)
+            if not job.is_leader:
+                return
+            
+            started = time.perf_counter()
+            job.last_run_at = datetime.now()
+            job.last_result = await job.func()
+            job.last_duration_ms = round((time.perf_counter() - started) * 1000, 1)
+            job.last_error = None
+            job.run_count += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.last_error = str(e)
+            print(f"[Scheduler] 任务 {job.name} 执行失败: {e}")
+
+
+scheduler = Scheduler()
@@ -0,0 +1,266 @@
+"""
+文件存储后端（上传图片、发票 PDF）
+
+- LocalStorage：保存在 UPLOAD_DIR，由 /uploads 静态路由直接提供
+- S3Storage：任意 S3 协议存储（AWS S3、MinIO 等），需要安装 boto3；
+  /uploads/{key} 重定向到预签名地址，多台后端节点无需共享文件系统
+
+业务数据中保存的地址统一为 /uploads/{key}，切换后端不需要改数据。
+STORAGE_BACKEND=s3 时读取 S3_* 配置，本地可用 MinIO 容器验证：
+    docker run -p 9000:9000 minio/minio server /data
+"""
+import asyncio
+import os
+import uuid
+from typing import AsyncIterator, Optional, Tuple
+
+from app.core.config import settings
+
+URL_PREFIX = "/uploads/"
+
+# 预压缩版本：与原文件同目录的 {文件名}.br / {文件名}.gz，按客户端 Accept-Encoding 选择
+PRECOMPRESSED_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def key_from_url(url: str) -> Optional[str]:
+    """/uploads/{key} -> key；不是本系统上传的地址返回 None"""
+    if not url or not url.startswith(URL_PREFIX):
+        return None
+    return url[len(URL_PREFIX):]
+
+
+class StorageBackend:
+    """存储后端接口"""
+
+    # 本地后端的根目录；对象存储为 None
+    root: Optional[str] = None
+
+    def url(self, key: str) -> str:
+        """写入业务数据的访问地址"""
+        return f"{URL_PREFIX}{key}"
+
+    def local_path(self, key: str) -> Optional[str]:
+        """对象在本机上的路径（可直接用 FileResponse 返回）；对象存储返回 None"""
+        return None
+
+    async def put_file(self, key: str, path: str, content_type: Optional[str] = None):
+        """保存本地文件（调用后 path 不再保留）"""
+        raise NotImplementedError
+
+    async def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None):
+        raise NotImplementedError
+
+    async def get_bytes(self, key: str) -> bytes:
+        raise NotImplementedError
+
+    async def stream(self, key: str, chunk_size: int = 64 * 1024,
+                     start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """读取 [start, end] 字节（end 含在内，None 表示到文件末尾）"""
+        raise NotImplementedError
+        yield b""
+
+    async def stat(self, key: str) -> Optional[Tuple[int, float]]:
+        """返回 (大小, 修改时间戳)，对象不存在返回 None"""
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        return await self.stat(key) is not None
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def presign(self, key: str, expires: Optional[int] = None) -> str:
+        """客户端可直接下载的地址"""
+        raise NotImplementedError
+
+
+class LocalStorage(StorageBackend):
+    """本地文件系统"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def local_path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    async def put_file(self, key: str, path: str, content_type: Optional[str] = None):
+        target = self.local_path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # 同一文件系统内改名是原子的，读方不会看到写了一半的文件
+        os.replace(path, target)
+
+    async def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None):
+        await asyncio.to_thread(self._write_atomic, self.local_path(key), data)
+
+    @staticmethod
+    def _write_atomic(target: str, data: bytes):
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def get_bytes(self, key: str) -> bytes:
+        def read():
+            with open(self.local_path(key), "rb") as f:
+                return f.read()
+        return await asyncio.to_thread(read)
+
+    async def stream(self, key: str, chunk_size: int = 64 * 1024,
+                     start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self.local_path(key), "rb")
+        try:
+            if start:
+                f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    async def stat(self, key: str) -> Optional[Tuple[int, float]]:
+        try:
+            st = os.stat(self.local_path(key))
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime
+
+    async def delete(self, key: str):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    async def presign(self, key: str, expires: Optional[int] = None) -> str:
+        # 本地文件由 /uploads 静态路由公开提供
+        return self.url(key)
+
+
+class S3Storage(StorageBackend):
+    """S3 协议对象存储（boto3 为可选依赖，首次使用时才导入）"""
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, access_key: Optional[str] = None,
+                 secret_key: Optional[str] = None, region: Optional[str] = None, presign_expires: int = 3600):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url or None
+        self.access_key = access_key or None
+        self.secret_key = secret_key or None
+        self.region = region or None
+        self.presign_expires = presign_expires
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                import boto3
+                from botocore.config import Config
+            except ImportError:
+                raise RuntimeError("使用 S3 存储需要安装 boto3：pip install boto3")
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                region_name=self.region,
+                # MinIO 等自建服务使用路径风格地址
+                config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+            )
+        return self._client
+
+    @staticmethod
+    def _is_not_found(error) -> bool:
+        code = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    async def put_file(self, key: str, path: str, content_type: Optional[str] = None):
+        extra = {"ContentType": content_type} if content_type else None
+        await asyncio.to_thread(self.client.upload_file, path, self.bucket, key, ExtraArgs=extra)
+        os.remove(path)
+
+    async def put_bytes(self, key: str, data: bytes, content_type: Optional[str] = None):
+        kwargs = {"Bucket": self.bucket, "Key": key, "Body": data}
+        if content_type:
+            kwargs["ContentType"] = content_type
+        await asyncio.to_thread(self.client.put_object, **kwargs)
+
+    async def get_bytes(self, key: str) -> bytes:
+        response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=key)
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def stream(self, key: str, chunk_size: int = 64 * 1024,
+                     start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        kwargs = {"Bucket": self.bucket, "Key": key}
+        if start or end is not None:
+            kwargs["Range"] = f"bytes={start}-{'' if end is None else end}"
+        response = await asyncio.to_thread(self.client.get_object, **kwargs)
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+    async def stat(self, key: str) -> Optional[Tuple[int, float]]:
+        try:
+            head = await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if self._is_not_found(e):
+                return None
+            raise
+        return head["ContentLength"], head["LastModified"].timestamp()
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def presign(self, key: str, expires: Optional[int] = None) -> str:
+        # 签名在本地计算，不访问网络
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=expires or self.presign_expires,
+        )
+
+
+def create_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "s3":
+        return S3Storage(
+            bucket=settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            access_key=settings.S3_ACCESS_KEY,
+            secret_key=settings.S3_SECRET_KEY,
+            region=settings.S3_REGION,
+            presign_expires=settings.S3_PRESIGN_EXPIRES,
+        )
+    return LocalStorage(settings.UPLOAD_DIR)
+
+
+storage = create_storage()
+
+
+async def storage_response(key: str, media_type: str, headers: dict, filename: Optional[str] = None):
+    """返回存储中的文件：本地文件用 FileResponse（sendfile），对象存储边读边发"""
+    from fastapi.responses import FileResponse, StreamingResponse
+    from app.core.http_cache import content_disposition
+
+    path = storage.local_path(key)
+    if path:
+        return FileResponse(path, media_type=media_type, filename=filename, headers=headers)
+
+    headers = dict(headers)
+    if filename:
+        headers["Content-Disposition"] = content_disposition(filename)
+    return StreamingResponse(storage.stream(key), media_type=media_type, headers=headers)
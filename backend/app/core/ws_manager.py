@@ -0,0 +1,238 @@
+"""
+WebSocket 连接管理
+
+按 角色 -> 键（用户ID / 聊天工单ID）-> 连接 建立索引。
+每个连接有自己的有界发送队列和写任务：推送只是把消息放进队列（不 await 网络写入），
+一个网络差的手机不会拖慢其他接收者，也不会拖慢触发通知的 HTTP 请求。
+- 队列满时：带合并键的消息替换队列中同键的旧消息（如同一工单的状态更新只保留最新一条），
+  否则按 WS_QUEUE_OVERFLOW 丢弃最旧或最新的消息
+- 队首消息积压超过 WS_MAX_LAG_SECONDS、或单次发送超过 WS_SEND_TIMEOUT_SECONDS 的连接视为慢消费者，
+  主动断开（关闭码 1013），客户端重连后重新拉取
+
+消息只序列化一次（安装了 orjson 时使用 orjson），同一份文本帧放入所有接收者的队列，
+广播给大量管理员连接时不再逐个 json.dumps。
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Deque, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+try:
+    import orjson
+except ImportError:  # 可选依赖：pip install orjson
+    orjson = None
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+
+# 连接角色
+ROLE_MAINTENANCE = "maintenance"
+ROLE_MANAGER = "manager"
+ROLE_OWNER = "owner"
+ROLE_CHAT = "chat"
+
+# 慢消费者断开时使用的关闭码（Try Again Later）
+CLOSE_SLOW_CONSUMER = 1013
+
+
+def encode_message(message: dict) -> str:
+    """序列化为 WebSocket 文本帧（与 send_json 的输出格式一致）"""
+    if orjson is not None:
+        return orjson.dumps(message, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class Connection:
+    """单个 WebSocket 连接的状态"""
+
+    __slots__ = (
+        "websocket", "role", "key", "user_id", "connected_at",
+        "queue", "wakeup", "writer", "closed",
+        "sent", "dropped", "coalesced",
+    )
+
+    def __init__(self, websocket: WebSocket, role: str, key: int, user_id: int):
+        self.websocket = websocket
+        self.role = role
+        self.key = key
+        self.user_id = user_id
+        self.connected_at = time.time()
+        # 队列元素：(入队时间, 合并键, 文本帧)
+        self.queue: Deque[Tuple[float, Optional[Hashable], str]] = deque()
+        self.wakeup = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+
+
+class ConnectionManager:
+    """WebSocket 连接管理器（当前 worker 进程内）"""
+
+    def __init__(self, send_timeout: float, queue_size: int, max_lag: float, overflow: str = "drop_oldest"):
+        self.send_timeout = send_timeout
+        self.queue_size = queue_size
+        self.max_lag = max_lag
+        self.overflow = overflow
+        self._connections: Dict[str, Dict[int, Set[Connection]]] = {}
+        # 正在关闭的连接任务，保持引用避免被垃圾回收
+        self._closing: Set[asyncio.Task] = set()
+        self.evicted = 0
+
+    def connect(self, websocket: WebSocket, role: str, key: int, user_id: Optional[int] = None) -> Connection:
+        """登记已 accept 的连接并启动写任务；key 为索引键，默认即用户ID"""
+        conn = Connection(websocket, role, key, key if user_id is None else user_id)
+        conn.writer = asyncio.create_task(self._writer(conn))
+        self._connections.setdefault(role, {}).setdefault(key, set()).add(conn)
+        return conn
+
+    def disconnect(self, conn: Connection):
+        """移出索引并停止写任务（可重复调用）"""
+        if conn.closed:
+            return
+        conn.closed = True
+        conn.queue.clear()
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        keys = self._connections.get(conn.role)
+        if not keys:
+            return
+        conns = keys.get(conn.key)
+        if conns is None:
+            return
+        conns.discard(conn)
+        if not conns:
+            del keys[conn.key]
+
+    def connections(self, role: str, key: int) -> List[Connection]:
+        return list(self._connections.get(role, {}).get(key, ()))
+
+    def role_connections(self, role: str) -> List[Connection]:
+        return [conn for conns in self._connections.get(role, {}).values() for conn in conns]
+
+    def count(self, role: str, key: Optional[int] = None) -> int:
+        if key is not None:
+            return len(self._connections.get(role, {}).get(key, ()))
+        return sum(len(conns) for conns in self._connections.get(role, {}).values())
+
+    def publish(self, role: str, key: int, message: dict, coalesce_key: Optional[Hashable] = None) -> int:
+        """推送给某个键（用户 / 聊天工单）的所有连接，返回放入队列的连接数；不会阻塞"""
+        return self._publish(self.connections(role, key), message, coalesce_key)
+
+    def broadcast(self, role: str, message: dict, coalesce_key: Optional[Hashable] = None) -> int:
+        """推送给某个角色的所有连接，返回放入队列的连接数；不会阻塞"""
+        return self._publish(self.role_connections(role), message, coalesce_key)
+
+    def publish_text(self, role: str, key: Optional[int], text: str, coalesce_key: Optional[Hashable] = None) -> int:
+        """推送已序列化的文本帧；key 为 None 时推送给该角色的所有连接"""
+        conns = self.role_connections(role) if key is None else self.connections(role, key)
+        return sum(self.enqueue(conn, text, coalesce_key) for conn in conns)
+
+    def _publish(self, conns: Iterable[Connection], message: dict, coalesce_key: Optional[Hashable] = None) -> int:
+        conns = list(conns)
+        if not conns:
+            return 0
+        # 只序列化一次，所有连接复用同一个文本帧
+        text = encode_message(message)
+        return sum(self.enqueue(conn, text, coalesce_key) for conn in conns)
+
+    def enqueue(self, conn: Connection, text: str, coalesce_key: Optional[Hashable] = None) -> bool:
+        """把文本帧放入连接的发送队列，返回是否入队"""
+        if conn.closed:
+            return False
+        now = time.monotonic()
+        queue = conn.queue
+        if queue and now - queue[0][0] > self.max_lag:
+            self.evict(conn, f"积压超过 {self.max_lag:g} 秒")
+            return False
+
+        if len(queue) >= self.queue_size:
+            replaced = False
+            if coalesce_key is not None:
+                for item in queue:
+                    if item[1] == coalesce_key:
+                        queue.remove(item)
+                        conn.coalesced += 1
+                        replaced = True
+                        break
+            if not replaced:
+                conn.dropped += 1
+                if self.overflow == "drop_newest":
+                    return False
+                queue.popleft()
+
+        queue.append((now, coalesce_key, text))
+        conn.wakeup.set()
+        return True
+
+    async def _writer(self, conn: Connection):
+        """逐条发送队列中的消息"""
+        try:
+            while True:
+                if not conn.queue:
+                    conn.wakeup.clear()
+                    await conn.wakeup.wait()
+                    continue
+                _, _, text = conn.queue.popleft()
+                async with asyncio.timeout(self.send_timeout):
+                    await conn.websocket.send_text(text)
+                conn.sent += 1
+        except asyncio.CancelledError:
+            if conn.closed:
+                return
+            raise
+        except TimeoutError:
+            self.evict(conn, f"发送超过 {self.send_timeout:g} 秒")
+        except Exception as e:
+            self.evict(conn, f"发送失败: {e!r}")
+
+    def evict(self, conn: Connection, reason: str):
+        """断开慢消费者 / 发送失败的连接（关闭在后台进行）"""
+        if conn.closed:
+            return
+        self.evicted += 1
+        print(f"[WebSocket] 断开 {conn.role} {conn.user_id}: {reason}")
+        self.disconnect(conn)
+        task = asyncio.create_task(self._close(conn))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close(conn: Connection):
+        try:
+            async with asyncio.timeout(1):
+                await conn.websocket.close(code=CLOSE_SLOW_CONSUMER)
+        except Exception:
+            pass
+
+    def status(self) -> dict:
+        roles = {}
+        for role, keys in self._connections.items():
+            conns = [conn for group in keys.values() for conn in group]
+            roles[role] = {
+                "keys": len(keys),
+                "connections": len(conns),
+                "queued": sum(len(conn.queue) for conn in conns),
+                "max_queued": max((len(conn.queue) for conn in conns), default=0),
+                "dropped": sum(conn.dropped for conn in conns),
+                "coalesced": sum(conn.coalesced for conn in conns),
+            }
+        return {
+            "send_timeout": self.send_timeout,
+            "queue_size": self.queue_size,
+            "max_lag": self.max_lag,
+            "overflow": self.overflow,
+            "evicted": self.evicted,
+            "roles": roles,
+        }
+
+
+manager = ConnectionManager(
+    settings.WS_SEND_TIMEOUT_SECONDS,
+    settings.WS_QUEUE_SIZE,
+    settings.WS_MAX_LAG_SECONDS,
+    settings.WS_QUEUE_OVERFLOW,
+)
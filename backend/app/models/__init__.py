@@ -83,12 +83,22 @@ class Bill(Model):
     due_date = fields.DateField(description="截止日期")
     status = fields.CharEnumField(BillStatus, default=BillStatus.UNPAID, description="支付状态")
     paid_at = fields.DatetimeField(null=True, description="支付时间")
-    invoice_url = fields.CharField(max_length=500, null=True, description="发票URL")
+    invoice_url = fields.CharField(max_length=500, null=True, unique=True, description="发票验证码")
     created_at = fields.DatetimeField(auto_now_add=True)
     updated_at = fields.DatetimeField(auto_now=True)
     
     class Meta:
         table = "bills"
+        # 同一房产同一费用类型每个账期只能有一张账单
+        unique_together = (("property", "fee_type", "billing_period"),)
+        indexes = (
+            # 列表游标分页：按 (created_at, id) 倒序翻页
+            ("owner", "created_at", "id"),
+            ("created_at", "id"),
+            # 业主按状态查账单、逾期扫描 / 预警统计
+            ("owner", "status", "created_at"),
+            ("status", "due_date"),
+        )
 
 
 class UrgencyLevel(str, Enum):
@@ -137,6 +147,15 @@ class RepairOrder(Model):
     
     class Meta:
         table = "repair_orders"
+        indexes = (
+            # 列表游标分页：按 (created_at, id) 倒序翻页
+            ("owner", "created_at", "id"),
+            ("maintenance_worker", "created_at", "id"),
+            ("created_at", "id"),
+            # 按状态 + 紧急程度筛选工单、维修人员按状态查工单
+            ("status", "urgency_level"),
+            ("maintenance_worker", "status"),
+        )
 
 
 class Announcement(Model):
@@ -231,6 +250,8 @@ class Complaint(Model):
     class Meta:
         table = "complaints"
         ordering = ["-created_at"]
+        # 按状态筛选投诉列表
+        indexes = (("status", "created_at"),)
 
 
 class RepairPrice(Model):
@@ -247,3 +268,83 @@ class RepairPrice(Model):
     class Meta:
         table = "repair_prices"
         ordering = ["category", "item"]
+
+
+class BillDailyRollup(Model):
+    """账单日汇总表（按创建日期/楼栋/费用类型/状态累计，供统计看板读取）"""
+    id = fields.IntField(pk=True)
+    day = fields.DateField(description="账单创建日期")
+    building_id = fields.IntField(description="楼栋ID")
+    fee_type = fields.CharEnumField(FeeType, description="费用类型")
+    status = fields.CharEnumField(BillStatus, description="支付状态")
+    bill_count = fields.IntField(default=0, description="账单数量")
+    amount = fields.DecimalField(max_digits=14, decimal_places=2, default=0, description="金额合计")
+
+    class Meta:
+        table = "rollup_bill_daily"
+        unique_together = (("day", "building_id", "fee_type", "status"),)
+
+
+class RepairDailyRollup(Model):
+    """报修日汇总表（按创建日期/楼栋/紧急程度/状态累计，供统计看板读取）"""
+    id = fields.IntField(pk=True)
+    day = fields.DateField(description="工单创建日期")
+    building_id = fields.IntField(description="楼栋ID")
+    urgency_level = fields.CharEnumField(UrgencyLevel, description="紧急程度")
+    status = fields.CharEnumField(RepairStatus, description="工单状态")
+    order_count = fields.IntField(default=0, description="工单数量")
+    rating_sum = fields.IntField(default=0, description="评分合计")
+    rating_count = fields.IntField(default=0, description="已评分工单数")
+
+    class Meta:
+        table = "rollup_repair_daily"
+        unique_together = (("day", "building_id", "urgency_level", "status"),)
+
+
+class SchedulerLock(Model):
+    """定时任务 leader 租约（多 worker 部署时同一任务只由持有租约的进程执行）"""
+    name = fields.CharField(max_length=100, pk=True, description="任务名")
+    owner = fields.CharField(max_length=100, description="持有者（主机:进程）")
+    expires_at = fields.DatetimeField(description="租约到期时间")
+
+    class Meta:
+        table = "scheduler_locks"
+
+
+class NotificationStream(Model):
+    """WebSocket 通知流的序号（每个接收者一条流，管理员共用一条广播流）"""
+    name = fields.CharField(max_length=100, pk=True, description="流名称（角色:用户ID，角色:* 为角色广播）")
+    last_seq = fields.BigIntField(default=0, description="最近分配的序号")
+
+    class Meta:
+        table = "notification_streams"
+
+
+class NotificationLog(Model):
+    """已推送的 WebSocket 通知（断线重连时按序号补发，定期清理）"""
+    id = fields.BigIntField(pk=True)
+    stream = fields.CharField(max_length=100, description="流名称")
+    seq = fields.BigIntField(description="流内序号")
+    payload = fields.TextField(description="已序列化的消息")
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:
+        table = "notification_logs"
+        unique_together = (("stream", "seq"),)
+        indexes = (("created_at",),)
+
+
+class UploadObject(Model):
+    """上传文件对象（按内容 sha256 寻址，相同内容只存一份）"""
+    id = fields.IntField(pk=True)
+    sha256 = fields.CharField(max_length=64, description="内容哈希")
+    folder = fields.CharField(max_length=50, description="上传目录")
+    url = fields.CharField(max_length=500, unique=True, description="访问URL")
+    size = fields.BigIntField(description="文件大小（字节）")
+    ref_count = fields.IntField(default=1, description="引用数（上传时累加，GC 时按实际引用重算）")
+    created_at = fields.DatetimeField(auto_now_add=True)
+    last_uploaded_at = fields.DatetimeField(auto_now_add=True, description="最近一次上传（含去重命中）时间")
+
+    class Meta:
+        table = "upload_objects"
+        unique_together = (("folder", "sha256"),)
@@ -1,7 +1,8 @@
-from pydantic import BaseModel, EmailStr, field_validator, field_serializer
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, field_validator, field_serializer, computed_field
+from typing import Optional, List, Dict
 from datetime import datetime, date, timezone, timedelta
 from decimal import Decimal
+from app.services.thumbnails import thumbnail_urls
 
 # 北京时间时区
 BEIJING_TZ = timezone(timedelta(hours=8))
@@ -165,6 +166,22 @@ class BuildingResponse(BuildingBase):
         from_attributes = True
 
 
+class BuildingLayoutFloor(BaseModel):
+    floor: int
+    rooms: List[str]  # 房间号列表
+
+
+class BuildingLayoutUnit(BaseModel):
+    unit: str
+    floors: List[BuildingLayoutFloor]
+
+
+class BuildingPreview(BuildingBase):
+    """楼栋创建预览（不写库）"""
+    total_properties: int
+    layout: List[BuildingLayoutUnit]
+
+
 # ============= 账单相关 =============
 class BillBase(BaseModel):
     fee_type: str
@@ -283,6 +300,17 @@ class RepairOrderResponse(BaseModel):
             return None
         # 直接格式化（已经是北京时间）
         return dt.strftime("%Y-%m-%d %H:%M:%S")
+    
+    # 列表卡片用的缩略图，与原图一一对应
+    @computed_field
+    @property
+    def image_thumbnails(self) -> List[str]:
+        return thumbnail_urls(self.images)
+    
+    @computed_field
+    @property
+    def repair_image_thumbnails(self) -> List[str]:
+        return thumbnail_urls(self.repair_images)
 
 
 class RepairOrderWithDetails(RepairOrderResponse):
@@ -387,20 +415,53 @@ class ChatResponse(BaseModel):
 
 
 # ============= 统计报表相关 =============
+class RevenueBreakdown(BaseModel):
+    """收入分组统计（按费用类型或楼栋）"""
+    key: str  # 费用类型值或楼栋ID
+    label: Optional[str] = None  # 楼栋名称等展示用文字
+    total_revenue: Decimal = Decimal("0")
+    paid_revenue: Decimal = Decimal("0")
+    unpaid_revenue: Decimal = Decimal("0")
+    overdue_revenue: Decimal = Decimal("0")
+    bill_count: int = 0
+    paid_count: int = 0
+    payment_rate: float = 0
+
+
 class RevenueStatistics(BaseModel):
     total_revenue: Decimal
     paid_revenue: Decimal
     unpaid_revenue: Decimal
     overdue_revenue: Decimal
     payment_rate: float
+    # 账单数量统计
+    bill_count: int = 0
+    paid_count: int = 0
+    unpaid_count: int = 0
+    overdue_count: int = 0
+    # 分组明细（group_by=fee_type/building 时返回）
+    breakdown: List[RevenueBreakdown] = []
+
+
+class DurationPercentiles(BaseModel):
+    """耗时分位数（单位：分钟）"""
+    samples: int = 0
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
 
 
 class RepairStatistics(BaseModel):
     total_orders: int
     pending_orders: int
-    in_progress_orders: int
-    completed_orders: int
+    in_progress_orders: int  # 已分配 + 维修中
+    completed_orders: int  # 已完成维修（含待支付、待评价、已完结）
     average_rating: Optional[float]
+    # 每个工单状态的数量
+    status_counts: Dict[str, int] = {}
+    # SLA：创建->分配、创建->完成 的耗时分位数
+    time_to_assign: DurationPercentiles = DurationPercentiles()
+    time_to_complete: DurationPercentiles = DurationPercentiles()
 
 
 class OwnerStatistics(BaseModel):
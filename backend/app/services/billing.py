@@ -0,0 +1,58 @@
+"""
+账单相关的后台任务
+"""
+from datetime import date
+
+from tortoise.transactions import in_transaction
+
+from app.models import Bill, BillStatus, Property
+from app.services import rollup
+
+# 逾期扫描每批处理的账单数
+OVERDUE_SWEEP_CHUNK_SIZE = 1000
+
+
+async def sweep_overdue_bills() -> dict:
+    """把已过截止日期的未支付账单批量标记为逾期
+
+    等价于 UPDATE bills SET status='overdue' WHERE status='unpaid' AND due_date < today，
+    按主键分批执行，每批在同一事务中把状态变化计入统计日汇总。
+    """
+    today = date.today()
+    swept = 0
+    last_id = 0
+    
+    while True:
+        async with in_transaction() as conn:
+            # SELECT ... FOR UPDATE 锁住本批账单直到提交：并发的支付/修改请求会等扫描提交后再读取，
+            # 选中的行一定由未支付变为逾期，汇总增量与实际变更一致
+            bills = await Bill.filter(
+                status=BillStatus.UNPAID,
+                due_date__lt=today,
+                id__gt=last_id
+            ).select_for_update().using_db(conn).order_by("id").limit(OVERDUE_SWEEP_CHUNK_SIZE).only(
+                "id", "created_at", "property_id", "fee_type", "amount"
+            )
+            if not bills:
+                break
+            
+            ids = [bill.id for bill in bills]
+            await Bill.filter(id__in=ids).using_db(conn).update(status=BillStatus.OVERDUE)
+            
+            buildings = dict(await Property.filter(
+                id__in={bill.property_id for bill in bills}
+            ).using_db(conn).values_list("id", "building_id"))
+            before = []
+            after = []
+            for bill in bills:
+                snapshot = (rollup.day_of(bill.created_at), buildings[bill.property_id], rollup.value_of(bill.fee_type))
+                before.append(snapshot + (BillStatus.UNPAID.value, bill.amount))
+                after.append(snapshot + (BillStatus.OVERDUE.value, bill.amount))
+            await rollup.record_bills(before=before, after=after, using_db=conn)
+        
+        swept += len(ids)
+        last_id = ids[-1]
+    
+    if swept:
+        print(f"[逾期扫描] {swept} 条账单已标记为逾期")
+    return {"swept": swept}
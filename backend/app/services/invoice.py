@@ -0,0 +1,333 @@
+"""
+缴费发票 PDF 生成与缓存
+
+已支付账单的发票内容不会再变化，生成一次后通过存储后端缓存在 invoices/ 下：
+文件名为 invoice_{账单ID}_{内容哈希}.pdf，哈希由发票上的全部字段计算，
+字段变化（如业主改名）会自动生成新版本。
+本地存储时删除同一账单的旧版本，目录总大小超过 INVOICE_CACHE_MAX_MB 时按最近访问时间淘汰；
+对象存储请配置桶的生命周期规则清理。
+
+绘制在内存中完成（BytesIO 画布 + 内存中的二维码图片），不落临时文件；
+INVOICE_IN_MEMORY 开启时下载接口直接返回内存中的 PDF，是否回写缓存由
+INVOICE_CACHE_WRITE_THROUGH 控制。
+"""
+import asyncio
+import hashlib
+import io
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from app.core.config import settings
+from app.core.render_pool import render_pool, RenderPoolBusy
+from app.core.storage import storage
+
+FEE_TYPE_TEXT = {
+    "property": "Property Fee",
+    "parking": "Parking Fee",
+    "water": "Water",
+    "electricity": "Electricity"
+}
+
+INVOICE_FOLDER = "invoices"
+
+
+async def ensure_verification_code(bill) -> str:
+    """返回账单的发票验证码，首次生成发票时创建并保存"""
+    if not bill.invoice_url:
+        verification_data = f"{bill.id}-{bill.paid_at.isoformat()}-{uuid.uuid4().hex[:8]}"
+        bill.invoice_url = hashlib.md5(verification_data.encode()).hexdigest()[:16]
+        await bill.save()
+    return bill.invoice_url
+
+
+def build_verify_url(verification_code: str) -> str:
+    """二维码中的验证地址（使用配置的后端地址，支持局域网访问）"""
+    # 修改 .env 中的 BACKEND_HOST 可切换局域网IP（如：192.168.64.24:8088）
+    return f"http://{settings.BACKEND_HOST}/api/v1/owner/bills/verify/{verification_code}"
+
+
+def build_invoice_data(bill, owner, verification_code: str, verify_url: str) -> dict:
+    """发票上用到的全部字段（需先 fetch_related property__building）"""
+    return {
+        "bill_id": bill.id,
+        "owner_name": owner.name,
+        "owner_phone": owner.phone,
+        "property_info": f"{bill.property.building.name} {bill.property.unit}-{bill.property.room_number}",
+        "fee_type": bill.fee_type.value,
+        "billing_period": bill.billing_period,
+        "due_date": str(bill.due_date),
+        "amount": f"{float(bill.amount):.2f}",
+        "paid_date": bill.paid_at.strftime('%Y-%m-%d'),
+        "verification_code": verification_code,
+        "verify_url": verify_url,
+    }
+
+
+def invoice_digest(data: dict) -> str:
+    """发票内容哈希，同时用作缓存文件名和 ETag"""
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def invoice_key(bill_id: int, digest: str) -> str:
+    return f"{INVOICE_FOLDER}/invoice_{bill_id}_{digest}.pdf"
+
+
+async def get_cached_invoice(bill_id: int, digest: str) -> Optional[float]:
+    """命中缓存时返回文件修改时间，并刷新访问时间（用于本地淘汰）；未命中返回 None"""
+    key = invoice_key(bill_id, digest)
+    stat = await storage.stat(key)
+    if stat is None:
+        return None
+    path = storage.local_path(key)
+    if path:
+        try:
+            os.utime(path, (time.time(), stat[1]))
+        except FileNotFoundError:
+            return None
+    return stat[1]
+
+
+async def render_and_store_invoice(data: dict, digest: str) -> bytes:
+    """在进程池中生成发票并写入缓存，返回 PDF 内容"""
+    pdf_bytes = await render_pool.run(render_invoice_pdf, data)
+    await store_invoice(data["bill_id"], digest, pdf_bytes)
+    return pdf_bytes
+
+
+async def store_invoice(bill_id: int, digest: str, pdf_bytes: bytes):
+    """把生成好的 PDF 写入缓存"""
+    key = invoice_key(bill_id, digest)
+    await storage.put_bytes(key, pdf_bytes, "application/pdf")
+    if storage.root is not None:
+        await asyncio.to_thread(_cleanup_local_cache, bill_id, storage.local_path(key))
+
+
+async def load_invoice_pdf(data: dict, digest: str) -> bytes:
+    """读取发票 PDF 内容：优先读缓存，否则在进程池中生成（批量导出用，繁忙时等待而不是失败）"""
+    if await get_cached_invoice(data["bill_id"], digest) is not None:
+        return await storage.get_bytes(invoice_key(data["bill_id"], digest))
+
+    while True:
+        try:
+            pdf_bytes = await render_pool.run(render_invoice_pdf, data)
+            break
+        except RenderPoolBusy:
+            await asyncio.sleep(0.5)
+
+    if settings.INVOICE_CACHE_WRITE_THROUGH:
+        await store_invoice(data["bill_id"], digest, pdf_bytes)
+    return pdf_bytes
+
+
+def _cleanup_local_cache(bill_id: int, keep_path: str):
+    _remove_stale_versions(bill_id, keep_path)
+    evict_invoice_cache()
+
+
+def _remove_stale_versions(bill_id: int, keep_path: str):
+    """删除同一账单的旧版本发票"""
+    prefix = f"invoice_{bill_id}_"
+    keep = os.path.basename(keep_path)
+    for entry in os.scandir(os.path.dirname(keep_path)):
+        if entry.name.startswith(prefix) and entry.name.endswith(".pdf") and entry.name != keep:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+
+def evict_invoice_cache(max_bytes: Optional[int] = None) -> int:
+    """本地缓存目录超出上限时按最近访问时间淘汰，返回删除的文件数"""
+    if storage.root is None:
+        return 0
+    if max_bytes is None:
+        max_bytes = settings.INVOICE_CACHE_MAX_MB * 1024 * 1024
+
+    directory = os.path.join(storage.root, INVOICE_FOLDER)
+    if not os.path.isdir(directory):
+        return 0
+
+    files = []
+    total = 0
+    for entry in os.scandir(directory):
+        if not entry.is_file() or not entry.name.startswith("invoice_") or not entry.name.endswith(".pdf"):
+            continue
+        stat = entry.stat()
+        files.append((stat.st_atime, stat.st_size, entry.path))
+        total += stat.st_size
+
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+
+    if removed:
+        print(f"[Invoice] 缓存淘汰 {removed} 个文件，当前 {total / 1024 / 1024:.1f}MB")
+    return removed
+
+
+def render_invoice_pdf(data: dict) -> bytes:
+    """生成PDF发票（带二维码），返回 PDF 内容"""
+    # 延迟导入qrcode，避免模块初始化时报错
+    try:
+        import qrcode
+    except ImportError:
+        raise RuntimeError("qrcode库未安装，请运行: pip install qrcode[pil]")
+
+    bill_id = data["bill_id"]
+
+    # 生成二维码图片
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data["verify_url"])
+    qr.make(fit=True)
+    qr_img = qr.make_image(fill_color="black", back_color="white")
+
+    # 二维码编码为内存中的 PNG
+    qr_buffer = io.BytesIO()
+    qr_img.save(qr_buffer, format="PNG")
+    qr_buffer.seek(0)
+
+    # 创建PDF
+    pdf_buffer = io.BytesIO()
+    c = canvas.Canvas(pdf_buffer, pagesize=A4)
+    width, height = A4
+
+    # 设置颜色
+    primary_color = (0.4, 0.49, 0.92)  # #667eea
+
+    # 标题区域（渐变背景）
+    c.setFillColorRGB(*primary_color)
+    c.rect(0, height - 120*mm, width, 120*mm, fill=True, stroke=False)
+
+    # 标题
+    c.setFillColorRGB(1, 1, 1)  # 白色
+    c.setFont("Helvetica-Bold", 32)
+    c.drawCentredString(width/2, height - 40*mm, "PAYMENT INVOICE")
+
+    c.setFont("Helvetica", 18)
+    c.drawCentredString(width/2, height - 55*mm, "Payment Receipt")  # 使用英文替代
+
+    # 发票编号
+    c.setFont("Helvetica-Bold", 14)
+    c.drawCentredString(width/2, height - 75*mm, f"Invoice No: INV-{bill_id:06d}")
+
+    # 信息区域
+    y = height - 140*mm
+    x_left = 40*mm
+    x_right = width - 40*mm
+
+    c.setFillColorRGB(0, 0, 0)
+
+    # 左侧：业主信息
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(x_left, y, "Bill To:")
+    y -= 15
+    c.setFont("Helvetica", 10)
+    c.drawString(x_left, y, f"Name: {data['owner_name']}")
+    y -= 12
+    c.drawString(x_left, y, f"Phone: {data['owner_phone']}")
+    y -= 12
+    c.drawString(x_left, y, f"Property: {data['property_info']}")
+
+    # 右侧：物业信息
+    y = height - 140*mm
+    c.setFont("Helvetica-Bold", 12)
+    c.drawRightString(x_right, y, "Property Management:")
+    y -= 15
+    c.setFont("Helvetica", 10)
+    c.drawRightString(x_right, y, "XX Property Management Co.")
+    y -= 12
+    c.drawRightString(x_right, y, "Tel: 400-123-4567")
+    y -= 12
+    c.drawRightString(x_right, y, f"Date: {data['paid_date']}")
+
+    # 分隔线
+    y -= 20
+    c.setStrokeColorRGB(0.9, 0.9, 0.9)
+    c.line(x_left, y, x_right, y)
+
+    # 账单详情表格
+    y -= 30
+    table_y = y
+
+    # 表头
+    c.setFillColorRGB(0.95, 0.95, 0.95)
+    c.rect(x_left, table_y - 20, x_right - x_left, 20, fill=True, stroke=False)
+
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(x_left + 5, table_y - 13, "Fee Type")
+    c.drawString(x_left + 80, table_y - 13, "Billing Period")
+    c.drawString(x_left + 160, table_y - 13, "Due Date")
+    c.drawString(x_left + 240, table_y - 13, "Amount (CNY)")
+
+    # 表格数据
+    table_y -= 20
+    c.setFont("Helvetica", 10)
+
+    fee_type_text = FEE_TYPE_TEXT.get(data["fee_type"], data["fee_type"])
+
+    c.drawString(x_left + 5, table_y - 13, fee_type_text)
+    c.drawString(x_left + 80, table_y - 13, data["billing_period"])
+    c.drawString(x_left + 160, table_y - 13, data["due_date"])
+    c.drawString(x_left + 240, table_y - 13, f"CNY {data['amount']}")
+
+    # 底部分隔线
+    table_y -= 20
+    c.setStrokeColorRGB(0.9, 0.9, 0.9)
+    c.line(x_left, table_y, x_right, table_y)
+
+    # 总计
+    table_y -= 30
+    c.setFont("Helvetica-Bold", 14)
+    c.drawRightString(x_right - 120, table_y, "Total Amount:")
+    c.setFillColorRGB(*primary_color)
+    c.setFont("Helvetica-Bold", 20)
+    c.drawRightString(x_right, table_y, f"CNY {data['amount']}")
+
+    # 二维码区域
+    qr_y = table_y - 100
+
+    # 二维码标题
+    c.setFillColorRGB(0, 0, 0)
+    c.setFont("Helvetica-Bold", 12)
+    c.drawCentredString(width/2, qr_y + 20, "Scan QR Code to Verify Invoice")
+
+    # 插入二维码图片
+    qr_size = 80
+    c.drawImage(ImageReader(qr_buffer), width/2 - qr_size/2, qr_y - qr_size - 20, qr_size, qr_size)
+
+    # 验证码
+    c.setFont("Helvetica", 8)
+    c.setFillColorRGB(0.5, 0.5, 0.5)
+    c.drawCentredString(width/2, qr_y - qr_size - 35, f"Verification Code: {data['verification_code']}")
+
+    # 页脚
+    c.setFont("Helvetica", 8)
+    c.drawCentredString(width/2, 30, "Thank you for your payment!")
+    c.drawCentredString(width/2, 20, f"Generated at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+    # 保存PDF
+    c.save()
+    return pdf_buffer.getvalue()
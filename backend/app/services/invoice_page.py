@@ -0,0 +1,238 @@
+"""
+发票验证页面（扫码后打开的公开页面）
+
+页面模板在模块加载时编译一次；渲染结果按验证码缓存在进程内 LRU 中，
+付款柜台前集中扫码时直接从内存返回，最多只需一次按唯一索引的查询。
+页面中的"验证时间"在每次返回时填入，不随缓存固定。
+"""
+import html
+from datetime import datetime
+from string import Template
+
+from app.core.cache import TTLCache
+
+# 验证码 -> 渲染好的页面；TTL 兜底业主改名等少见的数据变化
+verify_page_cache = TTLCache(ttl=600, maxsize=2048)
+
+VERIFIED_AT_MARK = "<!--verified_at-->"
+
+FEE_TYPE_TEXT = {
+    "property": "物业费",
+    "parking": "停车费",
+    "water": "水费",
+    "electricity": "电费"
+}
+
+NOT_FOUND_TEMPLATE = Template("""\
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>发票验证</title>
+    <style>
+        body {
+            font-family: "Microsoft YaHei", Arial, sans-serif;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            min-height: 100vh;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            padding: 20px;
+        }
+        .result-card {
+            background: white;
+            padding: 40px;
+            border-radius: 12px;
+            box-shadow: 0 10px 40px rgba(0,0,0,0.2);
+            text-align: center;
+            max-width: 500px;
+        }
+        .icon {
+            font-size: 64px;
+            margin-bottom: 20px;
+        }
+        h1 {
+            color: #f56c6c;
+            margin-bottom: 10px;
+        }
+        p {
+            color: #666;
+            line-height: 1.8;
+        }
+        .code {
+            background: #f5f5f5;
+            padding: 10px;
+            border-radius: 4px;
+            margin-top: 20px;
+            color: #999;
+            font-family: monospace;
+        }
+    </style>
+</head>
+<body>
+    <div class="result-card">
+        <div class="icon">❌</div>
+        <h1>发票不存在</h1>
+        <p>抱歉，未找到对应的发票记录。</p>
+        <p>请检查验证码是否正确，或联系物业客服。</p>
+        <div class="code">验证码：$verification_code</div>
+    </div>
+</body>
+</html>
+""")
+
+VERIFIED_TEMPLATE = Template("""\
+<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>发票验证结果</title>
+    <style>
+        body {
+            font-family: "Microsoft YaHei", Arial, sans-serif;
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            min-height: 100vh;
+            padding: 20px;
+        }
+        .result-card {
+            background: white;
+            max-width: 600px;
+            margin: 0 auto;
+            border-radius: 12px;
+            box-shadow: 0 10px 40px rgba(0,0,0,0.2);
+            overflow: hidden;
+        }
+        .header {
+            background: linear-gradient(135deg, #52c41a 0%, #73d13d 100%);
+            color: white;
+            padding: 30px;
+            text-align: center;
+        }
+        .icon {
+            font-size: 64px;
+            margin-bottom: 10px;
+        }
+        h1 {
+            font-size: 28px;
+            margin: 0;
+        }
+        .body {
+            padding: 30px;
+        }
+        .info-row {
+            display: flex;
+            justify-content: space-between;
+            padding: 12px 0;
+            border-bottom: 1px solid #f0f0f0;
+        }
+        .info-row:last-child {
+            border-bottom: none;
+        }
+        .label {
+            color: #999;
+            font-size: 14px;
+        }
+        .value {
+            color: #333;
+            font-weight: 500;
+            font-size: 14px;
+        }
+        .amount-row {
+            background: #f5f5f5;
+            padding: 20px;
+            border-radius: 8px;
+            margin: 20px 0;
+            text-align: center;
+        }
+        .amount {
+            font-size: 32px;
+            color: #52c41a;
+            font-weight: bold;
+        }
+        .footer {
+            text-align: center;
+            padding: 20px;
+            background: #f9f9f9;
+            color: #999;
+            font-size: 12px;
+        }
+    </style>
+</head>
+<body>
+    <div class="result-card">
+        <div class="header">
+            <div class="icon">✅</div>
+            <h1>发票验证成功</h1>
+            <p style="margin-top: 10px; opacity: 0.9;">该发票真实有效</p>
+        </div>
+        <div class="body">
+            <div class="info-row">
+                <span class="label">发票编号</span>
+                <span class="value">$invoice_no</span>
+            </div>
+            <div class="info-row">
+                <span class="label">业主姓名</span>
+                <span class="value">$owner_name</span>
+            </div>
+            <div class="info-row">
+                <span class="label">房产地址</span>
+                <span class="value">$property_info</span>
+            </div>
+            <div class="info-row">
+                <span class="label">费用类型</span>
+                <span class="value">$fee_type_text</span>
+            </div>
+            <div class="info-row">
+                <span class="label">账期</span>
+                <span class="value">$billing_period</span>
+            </div>
+            <div class="info-row">
+                <span class="label">支付时间</span>
+                <span class="value">$paid_at</span>
+            </div>
+
+            <div class="amount-row">
+                <div class="label">支付金额</div>
+                <div class="amount">￥$amount</div>
+            </div>
+
+            <div class="info-row">
+                <span class="label">验证码</span>
+                <span class="value">$verification_code</span>
+            </div>
+        </div>
+        <div class="footer">
+            <p>此发票由XX物业管理有限公司开具</p>
+            <p style="margin-top: 5px;">验证时间：<!--verified_at--></p>
+        </div>
+    </div>
+</body>
+</html>
+""")
+
+
+def render_not_found_page(verification_code: str) -> str:
+    """发票不存在"""
+    return NOT_FOUND_TEMPLATE.substitute(verification_code=html.escape(verification_code))
+
+
+def render_verified_page(bill) -> str:
+    """发票验证成功（需先 fetch_related owner、property__building）"""
+    values = {
+        "invoice_no": f"INV-{bill.id:06d}",
+        "owner_name": bill.owner.name,
+        "property_info": f"{bill.property.building.name} {bill.property.unit}单元{bill.property.room_number}",
+        "fee_type_text": FEE_TYPE_TEXT.get(bill.fee_type.value, bill.fee_type.value),
+        "billing_period": bill.billing_period,
+        "paid_at": bill.paid_at.strftime('%Y年%m月%d日 %H:%M'),
+        "amount": f"{float(bill.amount):.2f}",
+        "verification_code": bill.invoice_url,
+    }
+    return VERIFIED_TEMPLATE.substitute({key: html.escape(str(value)) for key, value in values.items()})
+
+
+def with_verified_at(page: str) -> str:
+    """填入本次验证时间"""
+    return page.replace(VERIFIED_AT_MARK, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 1)
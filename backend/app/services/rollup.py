@@ -0,0 +1,203 @@
+"""
+统计看板日汇总（rollup）
+
+账单按 (创建日期, 楼栋, 费用类型, 状态)、报修工单按 (创建日期, 楼栋, 紧急程度, 状态)
+维护计数器。业务写操作在同一事务中调用 record_bills / record_repairs（传入 using_db）做增量更新，
+汇总更新失败时整个事务回滚，汇总表不会与基础表产生偏差；
+统计接口只读汇总表；backfill_rollups.py 可从基础表全量重建。
+"""
+from datetime import datetime, date, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, Optional, Tuple
+
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+from tortoise.transactions import in_transaction
+
+from app.models import Bill, RepairOrder, Property, BillDailyRollup, RepairDailyRollup
+
+# 分块扫描基础表时每批的行数
+SCAN_CHUNK_SIZE = 2000
+
+# 账单快照：(日期, 楼栋ID, 费用类型, 状态, 金额)
+BillSnapshot = Tuple[date, int, str, str, Decimal]
+# 工单快照：(日期, 楼栋ID, 紧急程度, 状态, 评分)
+RepairSnapshot = Tuple[date, int, str, str, Optional[int]]
+
+BILL_KEY_FIELDS = ("day", "building_id", "fee_type", "status")
+REPAIR_KEY_FIELDS = ("day", "building_id", "urgency_level", "status")
+
+
+def value_of(v):
+    return v.value if hasattr(v, "value") else v
+
+
+def day_of(dt: Optional[datetime]) -> date:
+    """创建时间所在日期（按 UTC，与 created_at 的日期过滤口径一致）"""
+    if dt is None:
+        return datetime.now(timezone.utc).date()
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc)
+    return dt.date()
+
+
+async def building_of(property_id: int) -> int:
+    """查询房产所属楼栋ID"""
+    return await Property.filter(id=property_id).first().values_list("building_id", flat=True)
+
+
+def bill_snapshot(bill: Bill, building_id: int) -> BillSnapshot:
+    return (
+        day_of(bill.created_at), building_id, value_of(bill.fee_type),
+        value_of(bill.status), Decimal(bill.amount or 0)
+    )
+
+
+def repair_snapshot(order: RepairOrder, building_id: int) -> RepairSnapshot:
+    return (
+        day_of(order.created_at), building_id, value_of(order.urgency_level),
+        value_of(order.status), order.rating
+    )
+
+
+def _add_bill(deltas: Dict, snapshot: BillSnapshot, sign: int):
+    day, building_id, fee_type, status, amount = snapshot
+    entry = deltas.setdefault((day, building_id, fee_type, status), {"bill_count": 0, "amount": Decimal("0")})
+    entry["bill_count"] += sign
+    entry["amount"] += sign * amount
+
+
+def _add_repair(deltas: Dict, snapshot: RepairSnapshot, sign: int):
+    day, building_id, urgency_level, status, rating = snapshot
+    entry = deltas.setdefault(
+        (day, building_id, urgency_level, status),
+        {"order_count": 0, "rating_sum": 0, "rating_count": 0}
+    )
+    entry["order_count"] += sign
+    if rating is not None:
+        entry["rating_sum"] += sign * rating
+        entry["rating_count"] += sign
+
+
+async def _apply(model, key_fields, deltas: Dict, using_db=None):
+    """把增量累加到汇总行（UPDATE ... SET col = col + delta，不存在则插入）
+
+    在调用方的事务中执行，失败时抛出异常，由事务整体回滚
+    """
+    # 按键排序，多个事务同时更新若干汇总行时加锁顺序一致，避免死锁
+    for key, counters in sorted(deltas.items(), key=lambda item: tuple(map(str, item[0]))):
+        changes = {field: delta for field, delta in counters.items() if delta}
+        if not changes:
+            continue
+        lookup = dict(zip(key_fields, key))
+        updates = {field: F(field) + delta for field, delta in changes.items()}
+        if await model.filter(**lookup).using_db(using_db).update(**updates):
+            continue
+        try:
+            await model.create(**lookup, **changes, using_db=using_db)
+        except IntegrityError:
+            # 并发请求已插入同一行，改为累加
+            await model.filter(**lookup).using_db(using_db).update(**updates)
+
+
+async def record_bills(before: Iterable[BillSnapshot] = (), after: Iterable[BillSnapshot] = (), using_db=None):
+    """在账单写操作的事务中调用：before 为变更前快照（新建时为空），after 为变更后快照（删除时为空）"""
+    deltas = {}
+    for snapshot in before:
+        _add_bill(deltas, snapshot, -1)
+    for snapshot in after:
+        _add_bill(deltas, snapshot, 1)
+    await _apply(BillDailyRollup, BILL_KEY_FIELDS, deltas, using_db)
+
+
+async def record_repairs(before: Iterable[RepairSnapshot] = (), after: Iterable[RepairSnapshot] = (), using_db=None):
+    """在工单写操作的事务中调用，参数含义同 record_bills"""
+    deltas = {}
+    for snapshot in before:
+        _add_repair(deltas, snapshot, -1)
+    for snapshot in after:
+        _add_repair(deltas, snapshot, 1)
+    await _apply(RepairDailyRollup, REPAIR_KEY_FIELDS, deltas, using_db)
+
+
+async def _scan_bills(query, sign: int, deltas: Dict, using_db=None) -> int:
+    """按主键分块扫描账单，把每行计入 deltas，返回扫描行数"""
+    scanned = 0
+    last_id = 0
+    while True:
+        rows = await query.filter(id__gt=last_id).using_db(using_db).order_by("id").limit(SCAN_CHUNK_SIZE).values_list(
+            "id", "created_at", "property__building_id", "fee_type", "status", "amount"
+        )
+        if not rows:
+            return scanned
+        for _, created_at, building_id, fee_type, status, amount in rows:
+            _add_bill(deltas, (day_of(created_at), building_id, value_of(fee_type), value_of(status), Decimal(amount or 0)), sign)
+        scanned += len(rows)
+        last_id = rows[-1][0]
+
+
+async def _scan_repairs(query, sign: int, deltas: Dict, using_db=None) -> int:
+    """按主键分块扫描工单，把每行计入 deltas，返回扫描行数"""
+    scanned = 0
+    last_id = 0
+    while True:
+        rows = await query.filter(id__gt=last_id).using_db(using_db).order_by("id").limit(SCAN_CHUNK_SIZE).values_list(
+            "id", "created_at", "property__building_id", "urgency_level", "status", "rating"
+        )
+        if not rows:
+            return scanned
+        for _, created_at, building_id, urgency_level, status, rating in rows:
+            _add_repair(deltas, (day_of(created_at), building_id, value_of(urgency_level), value_of(status), rating), sign)
+        scanned += len(rows)
+        last_id = rows[-1][0]
+
+
+async def record_bills_removed(query, using_db=None):
+    """批量删除账单前在同一事务中调用，从汇总中扣除 query 命中的所有账单"""
+    deltas = {}
+    await _scan_bills(query, -1, deltas, using_db)
+    await _apply(BillDailyRollup, BILL_KEY_FIELDS, deltas, using_db)
+
+
+async def record_repairs_removed(query, using_db=None):
+    """批量删除/批量改状态前在同一事务中调用，从汇总中扣除 query 命中的所有工单"""
+    deltas = {}
+    await _scan_repairs(query, -1, deltas, using_db)
+    await _apply(RepairDailyRollup, REPAIR_KEY_FIELDS, deltas, using_db)
+
+
+async def record_repairs_added(query, using_db=None):
+    """批量改状态后在同一事务中调用，把 query 命中的工单按新状态计入汇总"""
+    deltas = {}
+    await _scan_repairs(query, 1, deltas, using_db)
+    await _apply(RepairDailyRollup, REPAIR_KEY_FIELDS, deltas, using_db)
+
+
+async def rebuild() -> dict:
+    """从基础表全量重建汇总表"""
+    bill_deltas = {}
+    repair_deltas = {}
+    bills_scanned = await _scan_bills(Bill.all(), 1, bill_deltas)
+    repairs_scanned = await _scan_repairs(RepairOrder.all(), 1, repair_deltas)
+    
+    bill_rows = [
+        BillDailyRollup(**dict(zip(BILL_KEY_FIELDS, key)), **counters)
+        for key, counters in bill_deltas.items() if counters["bill_count"]
+    ]
+    repair_rows = [
+        RepairDailyRollup(**dict(zip(REPAIR_KEY_FIELDS, key)), **counters)
+        for key, counters in repair_deltas.items() if counters["order_count"]
+    ]
+    
+    async with in_transaction() as conn:
+        await BillDailyRollup.all().using_db(conn).delete()
+        await RepairDailyRollup.all().using_db(conn).delete()
+        await BillDailyRollup.bulk_create(bill_rows, batch_size=500, using_db=conn)
+        await RepairDailyRollup.bulk_create(repair_rows, batch_size=500, using_db=conn)
+    
+    return {
+        "bills_scanned": bills_scanned,
+        "repairs_scanned": repairs_scanned,
+        "bill_rollup_rows": len(bill_rows),
+        "repair_rollup_rows": len(repair_rows),
+    }
@@ -0,0 +1,87 @@
+"""
+上传图片的缩略图 / 中等尺寸 WebP 版本
+
+上传完成后在进程池中后台生成，通过存储后端与原图放在同一目录：
+    /uploads/images/abc.jpg -> abc.thumb.webp（列表卡片）、abc.medium.webp（详情预览）
+衍生图地址可以直接由原图地址推出，接口无需额外查库或存字段；
+生成完成前访问衍生图会 404，客户端应回退到原图。
+"""
+import asyncio
+import io
+import os
+from typing import Dict, List, Optional
+
+from app.core.render_pool import render_pool, RenderPoolBusy
+from app.core.storage import storage
+
+# (名称, 最长边像素)
+VARIANTS = (("thumb", 320), ("medium", 1024))
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+WEBP_QUALITY = 80
+
+# 保持后台任务的引用，避免被垃圾回收
+_background_tasks = set()
+
+
+def is_variant_file(path: str) -> bool:
+    name = os.path.basename(path)
+    return any(name.endswith(f".{variant}.webp") for variant, _ in VARIANTS)
+
+
+def variant_path(path: str, variant: str) -> str:
+    base, _ = os.path.splitext(path)
+    return f"{base}.{variant}.webp"
+
+
+def variant_url(url: Optional[str], variant: str) -> Optional[str]:
+    """原图地址 -> 衍生图地址；非本地上传的图片原样返回"""
+    if not url or not url.startswith("/uploads/"):
+        return url
+    base, ext = os.path.splitext(url)
+    if ext.lower() not in IMAGE_EXTENSIONS or is_variant_file(url):
+        return url
+    return f"{base}.{variant}.webp"
+
+
+def thumbnail_urls(urls: Optional[List[str]]) -> List[str]:
+    return [variant_url(url, "thumb") for url in urls or []]
+
+
+def generate_variants(data: bytes) -> Dict[str, bytes]:
+    """由原图内容生成全部衍生图（在子进程中执行），返回 {名称: WebP 内容}"""
+    from PIL import Image, ImageOps
+
+    outputs = {}
+    with Image.open(io.BytesIO(data)) as img:
+        # 按 EXIF 方向摆正手机照片
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        for variant, max_side in VARIANTS:
+            resized = img.copy()
+            resized.thumbnail((max_side, max_side))
+            buffer = io.BytesIO()
+            resized.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+            outputs[variant] = buffer.getvalue()
+    return outputs
+
+
+async def _generate_in_pool(key: str):
+    try:
+        data = await storage.get_bytes(key)
+        variants = await render_pool.run(generate_variants, data)
+        for variant, webp in variants.items():
+            await storage.put_bytes(variant_path(key, variant), webp, "image/webp")
+    except RenderPoolBusy:
+        print(f"[Thumbnail] 进程池繁忙，跳过: {key}")
+    except Exception as e:
+        print(f"[Thumbnail] 生成失败 {key}: {e}")
+
+
+def schedule_image_variants(key: str):
+    """在后台生成衍生图，不阻塞上传请求"""
+    if os.path.splitext(key)[1].lower() not in IMAGE_EXTENSIONS:
+        return
+    task = asyncio.create_task(_generate_in_pool(key))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
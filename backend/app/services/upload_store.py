@@ -0,0 +1,59 @@
+"""
+按内容寻址的上传存储
+
+文件按 sha256 存放：{目录}/{哈希前两位}/{哈希}.{扩展名}（通过存储后端保存），
+同一目录下内容相同的上传（重复拍照上传、PWA 重试）直接复用已有文件，
+upload_objects 表记录每个对象及其引用数。
+不再被任何业务字段引用的对象由 gc_uploads.py 清理。
+"""
+import os
+from typing import Tuple
+
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+from tortoise.expressions import F
+
+from app.core.storage import storage
+from app.models import UploadObject
+
+
+def object_key(folder: str, digest: str, ext: str) -> str:
+    return f"{folder}/{digest[:2]}/{digest}.{ext}"
+
+
+async def _add_reference(url: str):
+    await UploadObject.filter(url=url).update(
+        ref_count=F("ref_count") + 1,
+        # 与 auto_now_add 写入的时间保持同一时区
+        last_uploaded_at=timezone.now()
+    )
+
+
+async def commit_upload(tmp_path: str, folder: str, digest: str, size: int, ext: str,
+                        content_type: str = None) -> Tuple[str, str, bool]:
+    """
+    把已写好的临时文件放入存储
+    返回 (访问URL, 存储 key, 是否新写入了文件)；内容已存在时删除临时文件并累加引用数
+    """
+    key = object_key(folder, digest, ext)
+    url = storage.url(key)
+
+    exists = await UploadObject.exists(url=url)
+    if exists and await storage.exists(key):
+        os.remove(tmp_path)
+        await _add_reference(url)
+        return url, key, False
+
+    # 同名即同内容，并发上传同一文件时互相覆盖也没有问题
+    await storage.put_file(key, tmp_path, content_type)
+
+    if exists:
+        # 记录在但文件丢失，已用本次上传补回
+        await _add_reference(url)
+    else:
+        try:
+            await UploadObject.create(sha256=digest, folder=folder, url=url, size=size)
+        except IntegrityError:
+            # 并发上传了相同内容，另一请求已建好记录
+            await _add_reference(url)
+    return url, key, True
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+统计日汇总重建脚本：从账单、报修工单基础表全量重建 rollup 汇总表
+首次启用 STATS_USE_ROLLUPS 或发现汇总数据偏差时运行
+运行方式：python3 backfill_rollups.py
+"""
+import asyncio
+import sys
+import os
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tortoise import Tortoise
+from app.core.config import settings
+from app.services import rollup
+
+
+async def backfill():
+    """重建汇总表"""
+    await Tortoise.init(
+        db_url=settings.DATABASE_URL,
+        modules={'models': ['app.models']}
+    )
+    await Tortoise.generate_schemas()
+    
+    try:
+        start_time = time.time()
+        result = await rollup.rebuild()
+        
+        print("=" * 50)
+        print("✅ 汇总表重建完成")
+        print(f"   扫描账单: {result['bills_scanned']} 条 -> 汇总行 {result['bill_rollup_rows']}")
+        print(f"   扫描工单: {result['repairs_scanned']} 条 -> 汇总行 {result['repair_rollup_rows']}")
+        print(f"   耗时: {time.time() - start_time:.2f}s")
+        print("=" * 50)
+    except Exception as e:
+        print("=" * 50)
+        print(f"❌ 重建失败: {str(e)}")
+        print("=" * 50)
+        import traceback
+        traceback.print_exc()
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == '__main__':
+    print("\n开始重建统计汇总表...")
+    asyncio.run(backfill())
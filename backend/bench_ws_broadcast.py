@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+WebSocket 广播微基准：对比逐连接 send_json 与序列化一次后复用文本帧
+三列分别为：最初逐个 await send_json、发送队列但逐连接序列化、发送队列且只序列化一次
+（发送队列的耗时包含放入队列和各连接写任务把消息发完；最后一列只统计放入队列，即触发通知的请求实际等待的时间）
+连接为内存中的假 WebSocket（不走网络），只衡量序列化和调度开销
+运行方式：python3 bench_ws_broadcast.py [轮数]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.ws_manager import ConnectionManager, ROLE_MANAGER, encode_message, orjson
+
+CONNECTION_COUNTS = (1, 100, 5000)
+
+# 与 notify_new_repair 推送的内容规模相当
+MESSAGE = {
+    "type": "new_repair",
+    "data": {
+        "id": 12345,
+        "order_number": "WX202410170001",
+        "title": "厨房水管漏水",
+        "description": "厨房水槽下方的水管接口处持续滴水，地面已经积水，需要尽快上门处理。",
+        "category": "plumbing",
+        "urgency_level": "high",
+        "status": "pending",
+        "owner_name": "张三",
+        "owner_phone": "13800000000",
+        "address": "3栋2单元1502",
+        "images": [f"/uploads/images/{i:02x}/{'a' * 64}.jpg" for i in range(3)],
+        "created_at": "2024-10-17T09:30:00",
+    },
+}
+
+
+class FakeWebSocket:
+    """模拟 Starlette WebSocket 的发送接口"""
+
+    # 所有连接累计发出的帧数，用于判断队列是否已发完
+    frames = 0
+
+    async def send(self, message: dict):
+        FakeWebSocket.frames += 1
+
+    async def send_text(self, data: str):
+        await self.send({"type": "websocket.send", "text": data})
+
+    async def send_json(self, data: dict):
+        # 与 Starlette 的实现一致：每次调用都重新序列化
+        text = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        await self.send({"type": "websocket.send", "text": text})
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class PerSocketEncodeManager(ConnectionManager):
+    """发送队列 + 写任务，但每个连接各自序列化"""
+
+    def _publish(self, conns, message: dict, coalesce_key=None) -> int:
+        return sum(
+            self.enqueue(conn, json.dumps(message, separators=(",", ":"), ensure_ascii=False), coalesce_key)
+            for conn in conns
+        )
+
+
+async def sequential_send_json(sockets, message):
+    """最初的实现：逐个连接 await send_json"""
+    for websocket in sockets:
+        await websocket.send_json(message)
+
+
+async def queued_broadcast(manager: ConnectionManager, message, publish_times: list):
+    """放入所有连接的发送队列，并等待写任务全部发完；publish_times 记录放入队列（调用方等待）的耗时"""
+    start = time.perf_counter()
+    target = FakeWebSocket.frames + manager.broadcast(ROLE_MANAGER, message)
+    publish_times.append(time.perf_counter() - start)
+    while FakeWebSocket.frames < target:
+        await asyncio.sleep(0)
+
+
+async def timed(rounds: int, func, *args) -> float:
+    """单条消息平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await func(*args)
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+async def run_case(count: int, rounds: int):
+    results = [await timed(rounds, sequential_send_json, [FakeWebSocket() for _ in range(count)], MESSAGE)]
+    for manager_class in (PerSocketEncodeManager, ConnectionManager):
+        manager = manager_class(send_timeout=5, queue_size=100, max_lag=30)
+        for user_id in range(count):
+            manager.connect(FakeWebSocket(), ROLE_MANAGER, user_id)
+        publish_times = []
+        results.append(await timed(rounds, queued_broadcast, manager, MESSAGE, publish_times))
+        for conn in manager.role_connections(ROLE_MANAGER):
+            manager.disconnect(conn)
+    results.append(sum(publish_times) / len(publish_times) * 1e6)
+    print(f"{count:>6} | " + " | ".join(f"{us:>10.1f} ({us / count:>6.2f})" for us in results))
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    frame = encode_message(MESSAGE)
+    print("=" * 50)
+    print(f"编码器: {'orjson' if orjson is not None else 'json'}，消息 {len(frame.encode())} 字节，每组 {rounds} 轮")
+    print("=" * 50)
+    print("每条消息耗时 μs（括号内为每连接）")
+    print("连接数 | 逐个 await send_json | 发送队列 + 逐连接序列化 | 发送队列 + 编码一次 | 其中放入队列")
+    for count in CONNECTION_COUNTS:
+        # 连接数多时减少轮数，控制总耗时
+        asyncio.run(run_case(count, max(rounds * 100 // max(count, 100), 1)))
+
+
+if __name__ == "__main__":
+    main()
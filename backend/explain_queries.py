@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+索引诊断脚本：对各列表 / 统计接口的典型查询执行 EXPLAIN，标出全表扫描
+请在已有测试数据的库上运行（表太小时 MySQL 可能直接选择全表扫描，结果不具参考性）
+运行方式：python3 explain_queries.py
+有全表扫描时以退出码 1 结束，可用于上线前检查
+"""
+import asyncio
+import os
+import sys
+from datetime import date
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tortoise import Tortoise
+from tortoise.functions import Count
+from app.core.config import settings
+from app.models import (
+    Bill, BillStatus, RepairOrder, RepairStatus, UrgencyLevel,
+    Complaint, ComplaintStatus
+)
+
+
+def build_queries():
+    """(说明, 查询) 列表，与接口中的查询条件保持一致"""
+    today = date.today()
+    return [
+        ("物业-账单列表（按状态）",
+         Bill.filter(status=BillStatus.UNPAID).order_by("-created_at", "-id").limit(50)),
+        ("业主-我的账单（按状态）",
+         Bill.filter(owner_id=1, status=BillStatus.UNPAID).order_by("-created_at", "-id").limit(20)),
+        ("业主-我的账单（游标翻页）",
+         Bill.filter(owner_id=1).order_by("-created_at", "-id").limit(20)),
+        ("定时任务-逾期账单扫描",
+         Bill.filter(status=BillStatus.UNPAID, due_date__lt=today).order_by("id").limit(1000)),
+        ("统计-逾期账单数",
+         Bill.filter(status=BillStatus.OVERDUE).count()),
+        ("发票验证码查询",
+         Bill.filter(invoice_url="0000000000000000").limit(1)),
+        ("物业-工单列表（状态 + 紧急程度）",
+         RepairOrder.filter(status=RepairStatus.PENDING, urgency_level=UrgencyLevel.URGENT)
+         .order_by("-created_at", "-id").limit(50)),
+        ("维修人员-我的工单（按状态）",
+         RepairOrder.filter(maintenance_worker_id=1, status=RepairStatus.ASSIGNED)
+         .order_by("-created_at", "-id").limit(20)),
+        ("业主-我的工单",
+         RepairOrder.filter(owner_id=1).order_by("-created_at", "-id").limit(20)),
+        ("物业-投诉列表（按状态）",
+         Complaint.filter(status=ComplaintStatus.PENDING).order_by("-created_at").limit(50)),
+        ("统计-投诉分组",
+         Complaint.filter(status=ComplaintStatus.PENDING)
+         .annotate(count=Count("id")).group_by("status", "type")
+         .order_by("status", "type").values("status", "type", "count")),
+    ]
+
+
+def is_full_scan(row):
+    """EXPLAIN 中 type=ALL 即全表扫描"""
+    return row.get("type") == "ALL"
+
+
+async def explain():
+    """执行诊断"""
+    print("=" * 50)
+    print("开始查询诊断")
+    print("=" * 50)
+
+    await Tortoise.init(
+        db_url=settings.DATABASE_URL,
+        modules={'models': ['app.models']}
+    )
+    conn = Tortoise.get_connection("default")
+
+    flagged = []
+    try:
+        for title, query in build_queries():
+            sql = query.sql()
+            _, rows = await conn.execute_query(f"EXPLAIN {sql}")
+            print(f"\n[{title}]")
+            print(f"  SQL: {sql}")
+            for row in rows:
+                row = dict(row)
+                mark = "✗ 全表扫描" if is_full_scan(row) else "✓"
+                print(
+                    f"  {mark} table={row.get('table')} type={row.get('type')} "
+                    f"key={row.get('key')} rows={row.get('rows')} extra={row.get('Extra')}"
+                )
+                if is_full_scan(row):
+                    flagged.append(title)
+
+        print("\n" + "=" * 50)
+        if flagged:
+            print(f"发现 {len(flagged)} 处全表扫描：")
+            for title in flagged:
+                print(f"  - {title}")
+            print("请确认已执行 python3 migrate_indexes.py，且表中有足够数据")
+        else:
+            print("所有查询均命中索引")
+        print("=" * 50)
+    finally:
+        await Tortoise.close_connections()
+
+    return 1 if flagged else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(explain()))
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上传文件垃圾回收：删除不再被任何业务字段引用的上传对象（含缩略图），并重算引用数
+引用来源：用户头像、报修图片、维修现场图片、投诉图片、账单 invoice_url
+最近 UPLOAD_GC_GRACE_HOURS 小时内上传过的对象不会删除（可能刚上传、还没提交表单）
+运行方式：python3 gc_uploads.py [--dry-run]
+"""
+import asyncio
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tortoise import Tortoise
+from app.core.config import settings
+from app.core.storage import storage, key_from_url, PRECOMPRESSED_ENCODINGS
+from app.models import User, Bill, RepairOrder, Complaint, UploadObject
+from app.services.thumbnails import VARIANTS, variant_path
+
+# 每次从数据库读取的行数
+SCAN_CHUNK_SIZE = 2000
+
+
+async def _scan_values(model, *fields):
+    """按 id 分批读取指定字段"""
+    last_id = 0
+    while True:
+        rows = await model.filter(id__gt=last_id).order_by("id").limit(SCAN_CHUNK_SIZE).values_list("id", *fields)
+        if not rows:
+            return
+        for row in rows:
+            yield row[1:]
+        last_id = rows[-1][0]
+
+
+async def collect_references() -> Counter:
+    """统计每个上传 URL 被引用的次数"""
+    refs = Counter()
+    async for (avatar,) in _scan_values(User, "avatar"):
+        if avatar:
+            refs[avatar] += 1
+    async for images, repair_images in _scan_values(RepairOrder, "images", "repair_images"):
+        refs.update(url for url in (images or []) + (repair_images or []) if url)
+    async for (images,) in _scan_values(Complaint, "images"):
+        refs.update(url for url in images or [] if url)
+    # invoice_url 现在保存发票验证码，历史数据中可能是发票文件地址
+    async for (invoice_url,) in _scan_values(Bill, "invoice_url"):
+        if invoice_url:
+            refs[invoice_url] += 1
+    return refs
+
+
+async def remove_object_files(url: str):
+    """删除对象文件及其衍生图、预压缩版本"""
+    key = key_from_url(url)
+    if not key:
+        return
+    targets = [key] + [variant_path(key, variant) for variant, _ in VARIANTS]
+    # 连同预压缩版本一起删除
+    for target in list(targets):
+        targets.extend(target + suffix for _, suffix in PRECOMPRESSED_ENCODINGS)
+    for target in targets:
+        await storage.delete(target)
+
+
+async def gc(dry_run: bool):
+    """执行回收"""
+    print("=" * 50)
+    print(f"开始上传文件回收{'（试运行，不删除）' if dry_run else ''}")
+    print("=" * 50)
+    
+    await Tortoise.init(
+        db_url=settings.DATABASE_URL,
+        modules={'models': ['app.models']}
+    )
+    
+    try:
+        refs = await collect_references()
+        grace_cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.UPLOAD_GC_GRACE_HOURS)
+        
+        removed = updated = kept_recent = 0
+        freed = 0
+        last_id = 0
+        while True:
+            objects = await UploadObject.filter(id__gt=last_id).order_by("id").limit(SCAN_CHUNK_SIZE)
+            if not objects:
+                break
+            last_id = objects[-1].id
+            
+            for obj in objects:
+                count = refs.get(obj.url, 0)
+                if count == 0:
+                    uploaded_at = obj.last_uploaded_at
+                    if uploaded_at.tzinfo is None:
+                        uploaded_at = uploaded_at.replace(tzinfo=timezone.utc)
+                    if uploaded_at > grace_cutoff:
+                        kept_recent += 1
+                        continue
+                    print(f"  ✗ {obj.url} ({obj.size} bytes)")
+                    removed += 1
+                    freed += obj.size
+                    if not dry_run:
+                        await remove_object_files(obj.url)
+                        await obj.delete()
+                elif count != obj.ref_count:
+                    updated += 1
+                    if not dry_run:
+                        await UploadObject.filter(id=obj.id).update(ref_count=count)
+        
+        print("\n" + "=" * 50)
+        print(f"删除对象: {removed} 个，释放 {freed / 1024 / 1024:.1f}MB")
+        print(f"重算引用数: {updated} 个")
+        print(f"宽限期内未引用（保留）: {kept_recent} 个")
+        print("=" * 50)
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(gc("--dry-run" in sys.argv))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+为已有的上传图片补生成缩略图 / 中等尺寸 WebP（新上传的图片会自动生成）
+仅适用于本地存储（STORAGE_BACKEND=local）
+运行方式：python3 generate_thumbnails.py [--force]
+"""
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.services.thumbnails import (
+    VARIANTS, IMAGE_EXTENSIONS, is_variant_file, variant_path, generate_variants
+)
+
+# 需要处理的上传目录
+IMAGE_FOLDERS = ["images", "repair_images"]
+
+
+def find_missing(force: bool):
+    """返回缺少衍生图的原图路径"""
+    for folder in IMAGE_FOLDERS:
+        directory = os.path.join(settings.UPLOAD_DIR, folder)
+        if not os.path.isdir(directory):
+            continue
+        # 按内容寻址的文件在哈希前缀子目录中
+        for root, _, names in os.walk(directory):
+            for name in names:
+                path = os.path.join(root, name)
+                if is_variant_file(path) or os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                    continue
+                if force or not all(os.path.exists(variant_path(path, v)) for v, _ in VARIANTS):
+                    yield path
+
+
+def generate_files(path: str):
+    """生成衍生图并写到原图旁边"""
+    with open(path, "rb") as f:
+        variants = generate_variants(f.read())
+    for variant, webp in variants.items():
+        out_path = variant_path(path, variant)
+        with open(f"{out_path}.part", "wb") as f:
+            f.write(webp)
+        os.replace(f"{out_path}.part", out_path)
+
+
+def main():
+    if settings.STORAGE_BACKEND != "local":
+        print("当前不是本地存储，跳过")
+        return
+    
+    force = "--force" in sys.argv
+    paths = list(find_missing(force))
+    print("=" * 50)
+    print(f"待处理图片: {len(paths)} 张")
+    print("=" * 50)
+    
+    done = failed = 0
+    with ProcessPoolExecutor(max_workers=max(settings.RENDER_POOL_WORKERS, 1)) as executor:
+        futures = {executor.submit(generate_files, path): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                future.result()
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"  ✗ {futures[future]}: {e}")
+    
+    print(f"\n完成：成功 {done} 张，失败 {failed} 张")
+
+
+if __name__ == "__main__":
+    main()
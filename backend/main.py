@@ -1,10 +1,14 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 from tortoise import Tortoise
 from app.core.config import settings
-from app.api.v1 import owner, property_manager, maintenance, auth, common, websocket, chat, ai_assistant, complaint
+from app.core.scheduler import scheduler
+from app.core.render_pool import render_pool
+from app.core.notify_bus import bus
+from app.core.notify_log import trim_notification_logs
+from app.services.billing import sweep_overdue_bills
+from app.api.v1 import owner, property_manager, maintenance, auth, common, websocket, chat, ai_assistant, complaint, uploads
 import os
 import time
 
@@ -21,9 +25,21 @@ async def lifespan(app: FastAPI):
     # 确保上传目录存在
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     
+    # 启动定时任务
+    if settings.SCHEDULER_ENABLED:
+        scheduler.add_job("overdue_bill_sweep", settings.OVERDUE_SWEEP_INTERVAL_SECONDS, sweep_overdue_bills)
+        scheduler.add_job("notification_log_trim", 3600, trim_notification_logs)
+        scheduler.start()
+    
+    # WebSocket 通知总线（NOTIFY_BUS=redis 时订阅 Redis 频道）
+    await bus.start()
+    
     yield
     
     # 关闭时清理
+    await bus.stop()
+    await scheduler.stop()
+    render_pool.shutdown()
     await Tortoise.close_connections()
 
 
@@ -41,6 +57,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # 游标分页的下一页游标
 )
 
 # 添加请求日志中间件
@@ -56,10 +73,6 @@ async def log_requests(request: Request, call_next):
     
     return response
 
-# 静态文件服务（用于图片和发票）
-if os.path.exists(settings.UPLOAD_DIR):
-    app.mount("/uploads", StaticFiles(directory=settings.UPLOAD_DIR), name="uploads")
-
 # 注册路由
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["认证"])
 app.include_router(common.router, prefix="/api/v1/common", tags=["公共"])
@@ -67,6 +80,9 @@ app.include_router(owner.router, prefix="/api/v1/owner", tags=["业主端"])
 app.include_router(property_manager.router, prefix="/api/v1/manager", tags=["物业管理端"])
 app.include_router(maintenance.router, prefix="/api/v1/maintenance", tags=["维修人员端"])
 
+# 上传文件访问（图片和发票，长期缓存 + Range）
+app.include_router(uploads.router, tags=["上传文件"])
+
 # 注册WebSocket路由
 app.include_router(websocket.router, tags=["WebSocket"])
 
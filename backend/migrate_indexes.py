@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库迁移脚本：为已有数据库补齐模型中声明的索引 / 唯一约束
+新库由 Tortoise.generate_schemas() 自动建好，无需执行；已存在的索引会自动跳过
+运行方式：python3 migrate_indexes.py
+"""
+import asyncio
+import os
+import sys
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tortoise import Tortoise
+from app.core.config import settings
+
+# (表名, 索引名, 列, 是否唯一)
+INDEXES = [
+    ("bills", "uid_bills_property_fee_period", ("property_id", "fee_type", "billing_period"), True),
+    # 游标分页
+    ("bills", "idx_bills_owner_created", ("owner_id", "created_at", "id"), False),
+    ("bills", "idx_bills_created", ("created_at", "id"), False),
+    ("repair_orders", "idx_repair_owner_created", ("owner_id", "created_at", "id"), False),
+    ("repair_orders", "idx_repair_worker_created", ("maintenance_worker_id", "created_at", "id"), False),
+    ("repair_orders", "idx_repair_created", ("created_at", "id"), False),
+    # 热点筛选路径
+    ("bills", "idx_bills_owner_status_created", ("owner_id", "status", "created_at"), False),
+    ("bills", "idx_bills_status_due", ("status", "due_date"), False),
+    ("bills", "uid_bills_invoice_url", ("invoice_url",), True),
+    ("repair_orders", "idx_repair_status_urgency", ("status", "urgency_level"), False),
+    ("repair_orders", "idx_repair_worker_status", ("maintenance_worker_id", "status"), False),
+    ("complaints", "idx_complaints_status_created", ("status", "created_at"), False),
+]
+
+
+async def get_index_columns(conn, table):
+    """返回表上已有索引：{列组合: [(索引名, 是否唯一), ...]}"""
+    _, rows = await conn.execute_query(f"SHOW INDEX FROM `{table}`")
+    indexes = {}
+    uniques = {}
+    for row in sorted(rows, key=lambda r: (r["Key_name"], r["Seq_in_index"])):
+        indexes.setdefault(row["Key_name"], []).append(row["Column_name"])
+        uniques[row["Key_name"]] = not row["Non_unique"]
+    existing = {}
+    for name, columns in indexes.items():
+        existing.setdefault(tuple(columns), []).append((name, uniques[name]))
+    return existing
+
+
+async def find_duplicates(conn, table, columns):
+    """唯一索引创建前检查重复数据"""
+    column_sql = ", ".join(f"`{c}`" for c in columns)
+    _, rows = await conn.execute_query(
+        f"SELECT {column_sql}, COUNT(*) AS cnt FROM `{table}` "
+        f"GROUP BY {column_sql} HAVING COUNT(*) > 1 LIMIT 20"
+    )
+    return rows
+
+
+async def migrate():
+    """执行索引迁移"""
+    print("=" * 50)
+    print("开始索引迁移")
+    print("=" * 50)
+    
+    await Tortoise.init(
+        db_url=settings.DATABASE_URL,
+        modules={'models': ['app.models']}
+    )
+    conn = Tortoise.get_connection("default")
+    
+    try:
+        for table, name, columns, unique in INDEXES:
+            existing = (await get_index_columns(conn, table)).get(tuple(columns), [])
+            if any(is_unique or not unique for _, is_unique in existing):
+                print(f"  - 已存在: {table}({', '.join(columns)})")
+                continue
+            
+            if unique:
+                duplicates = await find_duplicates(conn, table, columns)
+                if duplicates:
+                    print(f"  ⚠ 跳过唯一索引 {name}：{table} 存在重复数据，请先清理：")
+                    for row in duplicates:
+                        print(f"      {dict(row)}")
+                    continue
+            
+            column_sql = ", ".join(f"`{c}`" for c in columns)
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            await conn.execute_script(f"CREATE {kind} `{name}` ON `{table}` ({column_sql})")
+            print(f"  ✓ 创建{'唯一' if unique else ''}索引: {name} ON {table}({', '.join(columns)})")
+            
+            # 同列上原有的普通索引已被唯一索引覆盖，删除
+            for old_name, _ in existing:
+                await conn.execute_script(f"DROP INDEX `{old_name}` ON `{table}`")
+                print(f"  ✓ 删除被替代的普通索引: {old_name}")
+        
+        print("\n" + "=" * 50)
+        print("迁移完成！")
+        print("=" * 50)
+    except Exception as e:
+        print(f"\n❌ 迁移失败: {e}")
+        raise
+    finally:
+        await Tortoise.close_connections()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
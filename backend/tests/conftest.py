@@ -0,0 +1,85 @@
+"""
+后端测试公共夹具
+
+使用内存 SQLite 数据库和临时上传目录，不依赖 MySQL；
+环境变量必须在导入 app 之前设置。
+运行方式（在 backend 目录）：python -m pytest
+"""
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+
+UPLOAD_DIR = tempfile.mkdtemp(prefix="pms-test-uploads-")
+os.environ.update({
+    "DATABASE_URL": "sqlite://:memory:",
+    "UPLOAD_DIR": UPLOAD_DIR,
+    "STORAGE_BACKEND": "local",
+    "SCHEDULER_ENABLED": "false",
+    "RENDER_POOL_WORKERS": "0",
+    "NOTIFY_BUS": "local",
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import pytest
+from tortoise import Tortoise
+
+from app.core.security import create_access_token
+from app.models import User, UserRole, Building, Property, Bill, FeeType, BillStatus
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def db():
+    """每个测试一个全新的内存数据库，并清空进程内缓存"""
+    from app.api.v1.complaint import complaint_stats_cache
+    from app.services.invoice_page import verify_page_cache
+
+    await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+    await Tortoise.generate_schemas()
+    complaint_stats_cache.invalidate()
+    verify_page_cache.invalidate()
+    yield
+    await Tortoise.close_connections()
+
+
+@pytest.fixture
+async def client(db):
+    from main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def auth(user: User) -> dict:
+    """请求头：以该用户身份访问"""
+    return {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+
+
+async def create_user(role: UserRole, username: str, name: str = "测试用户") -> User:
+    return await User.create(username=username, password="x", name=name, phone="13800000000", role=role)
+
+
+async def create_property(owner: User = None, building: Building = None, room: str = "101",
+                          area: Decimal = Decimal("100.00")) -> Property:
+    if building is None:
+        building = await Building.create(name="1栋", units=1, floors=10, rooms_per_floor=4)
+    return await Property.create(
+        building=building, unit="1", floor=int(room[:-2] or 1), room_number=room, area=area, owner=owner
+    )
+
+
+async def create_bill(owner: User, property_obj: Property, amount="100.00", status=BillStatus.UNPAID,
+                      fee_type=FeeType.PROPERTY, period="2024年1月", due_date: date = None, **kwargs) -> Bill:
+    return await Bill.create(
+        owner=owner, property=property_obj, fee_type=fee_type, amount=Decimal(amount),
+        billing_period=period, due_date=due_date or date.today() + timedelta(days=30), status=status,
+        **kwargs
+    )
@@ -0,0 +1,128 @@
+"""账单：批量生成、逾期扫描"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from app.models import UserRole, Building, Bill, BillStatus, FeeStandard, FeeType, BillDailyRollup
+from app.services import billing, rollup
+from conftest import auth, create_user, create_property, create_bill
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_batch_bills_by_fee_standard(client, monkeypatch):
+    from app.api.v1 import property_manager
+    # 小批量，确保分块插入走到多个批次
+    monkeypatch.setattr(property_manager, "BILL_BULK_CHUNK_SIZE", 2)
+
+    manager = await create_user(UserRole.MANAGER, "manager")
+    owner_a = await create_user(UserRole.OWNER, "owner_a")
+    owner_b = await create_user(UserRole.OWNER, "owner_b")
+    building = await Building.create(name="1栋", units=1, floors=10, rooms_per_floor=4)
+    await FeeStandard.create(fee_type=FeeType.PROPERTY, name="物业费", unit_price=Decimal("2.50"), unit="元/平方米/月")
+
+    billed = await create_property(owner_a, building, "101", Decimal("80.00"))
+    await create_property(owner_a, building, "102", Decimal("90.00"))
+    await create_property(owner_b, building, "201", Decimal("100.00"))
+    await create_property(owner_b, building, "202", None)
+    await create_property(None, building, "301", Decimal("120.00"))
+    await create_bill(owner_a, billed, "200.00", period="2024年1月")
+
+    response = await client.post("/api/v1/manager/bills/batch", json={
+        "fee_type": "property", "billing_period": "2024年1月", "due_date": "2024-02-15",
+    }, headers=auth(manager))
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["created"] == 2
+    assert result["skipped_existing"] == 1
+    assert result["skipped_no_area"] == 1
+    assert result["total"] == 4
+
+    amounts = dict(await Bill.filter(billing_period="2024年1月").values_list("property__room_number", "amount"))
+    assert amounts == {"101": Decimal("200.00"), "102": Decimal("225.00"), "201": Decimal("250.00")}
+    counted = await BillDailyRollup.filter(fee_type=FeeType.PROPERTY).values_list("bill_count", flat=True)
+    assert sum(counted) == 2
+
+    # 重复生成同一账期：全部跳过
+    response = await client.post("/api/v1/manager/bills/batch", json={
+        "fee_type": "property", "billing_period": "2024年1月", "due_date": "2024-02-15",
+        "owner_ids": [owner_b.id],
+    }, headers=auth(manager))
+    assert response.json()["created"] == 0
+    assert await Bill.all().count() == 3
+
+
+async def test_batch_bills_by_owner(client):
+    manager = await create_user(UserRole.MANAGER, "manager")
+    owner = await create_user(UserRole.OWNER, "owner")
+    other = await create_user(UserRole.OWNER, "other")
+    building = await Building.create(name="1栋", units=1, floors=10, rooms_per_floor=4)
+    room = await create_property(owner, building, "101")
+    others_room = await create_property(other, building, "102")
+    await create_bill(owner, room, fee_type=FeeType.WATER, period="2024年1月")
+
+    line = {"billing_period": "2024年1月", "due_date": "2024-02-15", "amount": "10.00"}
+    response = await client.post("/api/v1/manager/bills/batch-by-owner", json={
+        "owner_id": owner.id,
+        "bills": [
+            {**line, "property_id": room.id, "fee_type": "property"},
+            {**line, "property_id": room.id, "fee_type": "property"},
+            {**line, "property_id": room.id, "fee_type": "water"},
+            {**line, "property_id": room.id, "fee_type": "unknown"},
+            {**line, "property_id": others_room.id, "fee_type": "gas"},
+        ],
+    }, headers=auth(manager))
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["created"] == 1
+    assert result["total"] == 5
+    assert len(result["errors"]) == 4
+    assert await Bill.filter(owner_id=owner.id).count() == 2
+
+
+async def test_sweep_overdue_bills(db, monkeypatch):
+    monkeypatch.setattr(billing, "OVERDUE_SWEEP_CHUNK_SIZE", 2)
+    owner = await create_user(UserRole.OWNER, "owner")
+    room = await create_property(owner)
+    past = date.today() - timedelta(days=1)
+    for month in range(1, 6):
+        await create_bill(owner, room, "10.00", period=f"2024年{month}月", due_date=past)
+    paid = await create_bill(owner, room, "20.00", BillStatus.PAID, period="2024年6月", due_date=past)
+    current = await create_bill(owner, room, "30.00", period="2024年7月")
+    await rollup.rebuild()
+
+    assert await billing.sweep_overdue_bills() == {"swept": 5}
+    assert await Bill.filter(status=BillStatus.OVERDUE).count() == 5
+    assert (await Bill.get(id=paid.id)).status == BillStatus.PAID
+    assert (await Bill.get(id=current.id)).status == BillStatus.UNPAID
+
+    # 增量汇总与全量重建一致
+    incremental = await BillDailyRollup.filter(bill_count__gt=0).order_by("status").values_list(
+        "status", "bill_count", "amount"
+    )
+    assert incremental == [
+        (BillStatus.OVERDUE, 5, Decimal("50.00")),
+        (BillStatus.PAID, 1, Decimal("20.00")),
+        (BillStatus.UNPAID, 1, Decimal("30.00")),
+    ]
+    await rollup.rebuild()
+    assert incremental == await BillDailyRollup.filter(bill_count__gt=0).order_by("status").values_list(
+        "status", "bill_count", "amount"
+    )
+
+    assert await billing.sweep_overdue_bills() == {"swept": 0}
+
+
+async def test_paying_an_overdue_bill_moves_it_out_of_overdue(client):
+    owner = await create_user(UserRole.OWNER, "owner")
+    room = await create_property(owner)
+    bill = await create_bill(owner, room, "10.00", due_date=date.today() - timedelta(days=1))
+    await rollup.rebuild()
+    await billing.sweep_overdue_bills()
+
+    response = await client.post(f"/api/v1/owner/bills/{bill.id}/pay", headers=auth(owner))
+    assert response.status_code == 200, response.text
+    statuses = dict(await BillDailyRollup.all().values_list("status", "bill_count"))
+    assert statuses[BillStatus.OVERDUE] == 0
+    assert statuses[BillStatus.PAID] == 1
@@ -0,0 +1,69 @@
+"""列表接口的游标分页"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models import UserRole, Bill, RepairOrder, UrgencyLevel
+from conftest import auth, create_user, create_property, create_bill
+
+pytestmark = pytest.mark.anyio
+
+
+async def _walk(client, url: str, headers: dict, limit: int, **params):
+    """沿 X-Next-Cursor 翻完所有页，返回 (每页ID列表, 请求次数)"""
+    pages = []
+    cursor = None
+    while True:
+        query = {**params, "limit": limit}
+        if cursor:
+            query["cursor"] = cursor
+        response = await client.get(url, params=query, headers=headers)
+        assert response.status_code == 200, response.text
+        pages.append([row["id"] for row in response.json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return pages
+
+
+async def test_bill_cursor_pagination(client):
+    manager = await create_user(UserRole.MANAGER, "manager")
+    owner = await create_user(UserRole.OWNER, "owner")
+    room = await create_property(owner)
+    base = datetime(2024, 10, 17, 9, 0, 0)
+    for month in range(1, 8):
+        bill = await create_bill(owner, room, period=f"2024年{month}月")
+        # 前三张创建时间相同，检查按 id 打破并列
+        await Bill.filter(id=bill.id).update(created_at=base + timedelta(minutes=max(month - 3, 0)))
+
+    expected = list(await Bill.all().order_by("-created_at", "-id").values_list("id", flat=True))
+    pages = await _walk(client, "/api/v1/manager/bills", auth(manager), limit=3)
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [row_id for page in pages for row_id in page] == expected
+
+    # 业主端同样按游标翻页，与 offset 分页结果一致
+    pages = await _walk(client, "/api/v1/owner/bills", auth(owner), limit=2)
+    assert [row_id for page in pages for row_id in page] == expected
+    response = await client.get("/api/v1/owner/bills", params={"skip": 2, "limit": 2}, headers=auth(owner))
+    assert [row["id"] for row in response.json()] == expected[2:4]
+
+
+async def test_repair_cursor_pagination(client):
+    owner = await create_user(UserRole.OWNER, "owner")
+    room = await create_property(owner)
+    for number in range(5):
+        await RepairOrder.create(
+            order_number=f"WX{number}", owner=owner, property=room, description="报修",
+            urgency_level=UrgencyLevel.LOW
+        )
+
+    expected = list(await RepairOrder.all().order_by("-created_at", "-id").values_list("id", flat=True))
+    pages = await _walk(client, "/api/v1/owner/repairs", auth(owner), limit=2)
+    assert [row_id for page in pages for row_id in page] == expected
+    # 最后一页恰好满页时多一次空页请求
+    assert [len(page) for page in pages] == [2, 2, 1]
+
+
+async def test_invalid_cursor(client):
+    manager = await create_user(UserRole.MANAGER, "manager")
+    response = await client.get("/api/v1/manager/bills", params={"cursor": "not-a-cursor"}, headers=auth(manager))
+    assert response.status_code == 400
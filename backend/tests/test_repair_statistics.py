@@ -0,0 +1,74 @@
+"""维修统计：状态计数、平均评分与 SLA 分位数"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models import UserRole, RepairOrder, RepairStatus, UrgencyLevel
+from app.services import rollup
+from conftest import auth, create_user, create_property
+
+pytestmark = pytest.mark.anyio
+
+# created_at 按 UTC 存储，分配/完成时间是北京时间
+BEIJING_OFFSET = timedelta(hours=8)
+
+
+@pytest.fixture(params=[True, False], ids=["rollups", "base-tables"])
+def use_rollups(request, monkeypatch):
+    monkeypatch.setattr(settings, "STATS_USE_ROLLUPS", request.param)
+    return request.param
+
+
+async def _create_order(owner, property_obj, number: int, status: RepairStatus, rating: int = None,
+                        assign_minutes: int = None, complete_minutes: int = None):
+    order = await RepairOrder.create(
+        order_number=f"WX{number:04d}", owner=owner, property=property_obj, description="报修",
+        urgency_level=UrgencyLevel.MEDIUM, status=status, rating=rating
+    )
+    created_at = datetime(2024, 10, 17, 1, 0, 0)
+    updates = {"created_at": created_at}
+    if assign_minutes is not None:
+        updates["assigned_at"] = created_at + BEIJING_OFFSET + timedelta(minutes=assign_minutes)
+    if complete_minutes is not None:
+        updates["completed_at"] = created_at + BEIJING_OFFSET + timedelta(minutes=complete_minutes)
+    await RepairOrder.filter(id=order.id).update(**updates)
+    return order
+
+
+async def test_repair_statistics(client, use_rollups):
+    manager = await create_user(UserRole.MANAGER, "manager")
+    owner = await create_user(UserRole.OWNER, "owner")
+    room = await create_property(owner)
+
+    await _create_order(owner, room, 1, RepairStatus.PENDING)
+    await _create_order(owner, room, 2, RepairStatus.ASSIGNED, assign_minutes=10)
+    await _create_order(owner, room, 3, RepairStatus.IN_PROGRESS, assign_minutes=20)
+    await _create_order(owner, room, 4, RepairStatus.PENDING_PAYMENT, assign_minutes=30, complete_minutes=120)
+    await _create_order(owner, room, 5, RepairStatus.FINISHED, rating=5, assign_minutes=40, complete_minutes=240)
+    await _create_order(owner, room, 6, RepairStatus.FINISHED, rating=4, assign_minutes=50, complete_minutes=360)
+    await rollup.rebuild()
+
+    response = await client.get("/api/v1/manager/statistics/repairs", headers=auth(manager))
+    assert response.status_code == 200, response.text
+    stats = response.json()
+    assert stats["total_orders"] == 6
+    assert stats["pending_orders"] == 1
+    assert stats["in_progress_orders"] == 2
+    assert stats["completed_orders"] == 3
+    assert stats["average_rating"] == 4.5
+    assert stats["status_counts"]["finished"] == 2
+    assert stats["status_counts"]["cancelled"] == 0
+
+    assert stats["time_to_assign"] == {"samples": 5, "p50": 30.0, "p90": 50.0, "p99": 50.0}
+    assert stats["time_to_complete"] == {"samples": 3, "p50": 240.0, "p90": 360.0, "p99": 360.0}
+
+
+async def test_repair_statistics_empty(client, use_rollups):
+    manager = await create_user(UserRole.MANAGER, "manager")
+
+    response = await client.get("/api/v1/manager/statistics/repairs", headers=auth(manager))
+    stats = response.json()
+    assert stats["total_orders"] == 0
+    assert stats["average_rating"] is None
+    assert stats["time_to_assign"] == {"samples": 0, "p50": None, "p90": None, "p99": None}
@@ -0,0 +1,64 @@
+"""统计日汇总：增量更新与业务写操作在同一事务中"""
+import pytest
+
+from app.models import UserRole, Bill, BillStatus, BillDailyRollup, RepairDailyRollup
+from app.services import rollup
+from conftest import auth, create_user, create_property, create_bill
+
+pytestmark = pytest.mark.anyio
+
+
+async def _rollup_rows():
+    bills = await BillDailyRollup.filter(bill_count__gt=0).order_by("day", "building_id", "fee_type", "status").values(
+        "day", "building_id", "fee_type", "status", "bill_count", "amount"
+    )
+    repairs = await RepairDailyRollup.filter(order_count__gt=0).order_by(
+        "day", "building_id", "urgency_level", "status"
+    ).values("day", "building_id", "urgency_level", "status", "order_count", "rating_sum", "rating_count")
+    return bills, repairs
+
+
+async def test_incremental_rollups_match_rebuild(client):
+    manager = await create_user(UserRole.MANAGER, "manager")
+    owner = await create_user(UserRole.OWNER, "owner")
+    room = await create_property(owner)
+
+    response = await client.post("/api/v1/manager/bills", json={
+        "owner_id": owner.id, "property_id": room.id, "fee_type": "property",
+        "amount": "120.50", "billing_period": "2024年1月", "due_date": "2030-01-31",
+    }, headers=auth(manager))
+    assert response.status_code == 200, response.text
+    bill_id = response.json()["id"]
+    response = await client.post(f"/api/v1/owner/bills/{bill_id}/pay", headers=auth(owner))
+    assert response.status_code == 200, response.text
+
+    response = await client.post("/api/v1/owner/repairs", json={
+        "property_id": room.id, "description": "厨房漏水", "urgency_level": "high",
+    }, headers=auth(owner))
+    assert response.status_code == 200, response.text
+    response = await client.delete(f"/api/v1/manager/repairs/{response.json()['id']}", headers=auth(manager))
+    assert response.status_code == 200, response.text
+
+    incremental = await _rollup_rows()
+    await rollup.rebuild()
+    assert incremental == await _rollup_rows()
+    assert incremental[0][0]["status"] == BillStatus.PAID
+    assert incremental[1] == []
+
+
+async def test_rollup_failure_rolls_back_the_write(client, monkeypatch):
+    owner = await create_user(UserRole.OWNER, "owner")
+    room = await create_property(owner)
+    bill = await create_bill(owner, room)
+
+    async def broken_apply(*args, **kwargs):
+        raise RuntimeError("rollup unavailable")
+
+    monkeypatch.setattr(rollup, "_apply", broken_apply)
+    with pytest.raises(RuntimeError):
+        await client.post(f"/api/v1/owner/bills/{bill.id}/pay", headers=auth(owner))
+
+    # 汇总更新失败，支付也没有提交，两边不会产生偏差
+    await bill.refresh_from_db()
+    assert bill.status == BillStatus.UNPAID
+    assert bill.paid_at is None
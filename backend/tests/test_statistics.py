@@ -0,0 +1,78 @@
+"""统计看板：收入统计、维修统计与日汇总表"""
+from decimal import Decimal
+
+import pytest
+
+from app.core.config import settings
+from app.models import UserRole, Building, BillStatus, FeeType, RepairOrder, RepairStatus, UrgencyLevel
+from app.services import rollup
+from conftest import auth, create_user, create_property, create_bill
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=[True, False], ids=["rollups", "base-tables"])
+def use_rollups(request, monkeypatch):
+    """同一组断言分别跑读汇总表和直接聚合基础表两种口径"""
+    monkeypatch.setattr(settings, "STATS_USE_ROLLUPS", request.param)
+    return request.param
+
+
+async def _seed_bills():
+    manager = await create_user(UserRole.MANAGER, "manager")
+    owner = await create_user(UserRole.OWNER, "owner")
+    building_a = await Building.create(name="1栋", units=1, floors=10, rooms_per_floor=4)
+    building_b = await Building.create(name="2栋", units=1, floors=10, rooms_per_floor=4)
+    room_a = await create_property(owner, building_a, "101")
+    room_b = await create_property(owner, building_b, "201")
+
+    await create_bill(owner, room_a, "100.00", BillStatus.PAID, FeeType.PROPERTY)
+    await create_bill(owner, room_a, "50.00", BillStatus.UNPAID, FeeType.PARKING)
+    await create_bill(owner, room_b, "200.00", BillStatus.OVERDUE, FeeType.PROPERTY)
+    await create_bill(owner, room_b, "30.00", BillStatus.PAID, FeeType.WATER)
+    await rollup.rebuild()
+    return manager, building_a, building_b
+
+
+async def test_revenue_totals(client, use_rollups):
+    manager, _, _ = await _seed_bills()
+
+    response = await client.get("/api/v1/manager/statistics/revenue", headers=auth(manager))
+    assert response.status_code == 200, response.text
+    stats = response.json()
+    assert Decimal(stats["total_revenue"]) == Decimal("380.00")
+    assert Decimal(stats["paid_revenue"]) == Decimal("130.00")
+    assert Decimal(stats["unpaid_revenue"]) == Decimal("50.00")
+    assert Decimal(stats["overdue_revenue"]) == Decimal("200.00")
+    assert (stats["bill_count"], stats["paid_count"], stats["unpaid_count"], stats["overdue_count"]) == (4, 2, 1, 1)
+    assert stats["payment_rate"] == 34.21
+    assert stats["breakdown"] == []
+
+
+async def test_revenue_breakdown(client, use_rollups):
+    manager, building_a, building_b = await _seed_bills()
+
+    response = await client.get(
+        "/api/v1/manager/statistics/revenue", params={"group_by": "fee_type"}, headers=auth(manager)
+    )
+    by_fee_type = {row["key"]: row for row in response.json()["breakdown"]}
+    assert set(by_fee_type) == {"property", "parking", "water"}
+    assert Decimal(by_fee_type["property"]["total_revenue"]) == Decimal("300.00")
+    assert Decimal(by_fee_type["property"]["overdue_revenue"]) == Decimal("200.00")
+    assert by_fee_type["water"]["payment_rate"] == 100
+
+    response = await client.get(
+        "/api/v1/manager/statistics/revenue", params={"group_by": "building"}, headers=auth(manager)
+    )
+    by_building = {row["key"]: row for row in response.json()["breakdown"]}
+    assert by_building[str(building_a.id)]["label"] == "1栋"
+    assert Decimal(by_building[str(building_a.id)]["total_revenue"]) == Decimal("150.00")
+    assert by_building[str(building_b.id)]["bill_count"] == 2
+
+
+async def test_revenue_rejects_unknown_group(client):
+    manager = await create_user(UserRole.MANAGER, "manager")
+    response = await client.get(
+        "/api/v1/manager/statistics/revenue", params={"group_by": "owner"}, headers=auth(manager)
+    )
+    assert response.status_code == 400
@@ -72,6 +72,14 @@ export const propertyAPI = {
       data
     })
   },
+  // 预览楼栋房间布局（不写库）
+  previewBuilding(data) {
+    return request({
+      url: '/manager/buildings/preview',
+      method: 'post',
+      data
+    })
+  },
   // 获取房产列表
   getList(params) {
     return request({
@@ -168,6 +176,16 @@ export const billAPI = {
       url: `/manager/bills/${id}`,
       method: 'delete'
     })
+  },
+  // 批量导出已支付发票（ZIP）
+  exportInvoices(params) {
+    return request({
+      url: '/manager/bills/invoices/export',
+      method: 'get',
+      params,
+      responseType: 'blob',
+      timeout: 0
+    })
   }
 }
 